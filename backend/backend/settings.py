@@ -33,6 +33,20 @@ DEBUG = os.getenv("DEBUG", "0").lower() in ["true", "yes", "1"]
 
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "").split()
 
+# Responses of the simulator API are cached in an SQLite file shared by all worker
+# processes. The cache is disabled if the path is an empty string.
+RESPONSE_CACHE_PATH = os.getenv(
+    "RESPONSE_CACHE_PATH", str(BASE_DIR / "response_cache.sqlite3")
+)
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 7 * 24 * 3600))
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 256 * 1024**2))
+
+# Maximum size (in bytes) of a request to the catalogue endpoint. The targets are
+# uploaded as a file, so that DATA_UPLOAD_MAX_MEMORY_SIZE doesn't apply to them.
+CATALOGUE_MAX_BYTES = int(os.getenv("CATALOGUE_MAX_BYTES", 32 * 1024**2))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -77,6 +91,11 @@ CORS_ALLOW_HEADERS = [
     "content-type",
 ]
 
+# Headers which the frontend may read
+CORS_EXPOSE_HEADERS = [
+    "X-Response-Cache",
+]
+
 ROOT_URLCONF = "backend.urls"
 
 TEMPLATES = [
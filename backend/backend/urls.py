@@ -1,11 +1,23 @@
 from django.contrib import admin
 from django.urls import path
 
-from nirwals.views import spectrum_view, throughput_view, exposure_view
+from nirwals.views import (
+    spectrum_view,
+    throughput_view,
+    exposure_view,
+    grating_angle_view,
+    magnitude_view,
+    redshift_sweep_view,
+    catalogue_view,
+)
 
 urlpatterns = [
     path("api/admin/", admin.site.urls),
+    path("api/catalogue/", catalogue_view, name="catalogue"),
     path("api/exposure", exposure_view, name="exposure"),
+    path("api/grating-angle/", grating_angle_view, name="grating-angle"),
+    path("api/magnitude/", magnitude_view, name="magnitude"),
+    path("api/redshift-sweep/", redshift_sweep_view, name="redshift-sweep"),
     path("api/spectra/", spectrum_view, name="spectrum"),
     path("api/throughput/", throughput_view, name="throughput"),
 ]
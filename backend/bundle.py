@@ -0,0 +1,28 @@
+# Script for packing the data files into a single curve bundle.
+#
+# The script searches for .npz files in the directory specified by the environment
+# variable FILE_BASE_DIR and its subdirectories, and packs them into a single file
+# curves.bundle in that directory. Existing bundles are overwritten.
+#
+# The bundle stores the data uncompressed, and each array starts at a page boundary,
+# so that the Simulator can memory-map the curves rather than reading and inflating
+# each .npz file separately. See the build_bundle function in the nirwals.physics.data
+# module for details about the file format.
+#
+# The bundle must be rebuilt whenever a data file is changed. Until then the changed
+# .npz file is used instead of the outdated bundle content.
+
+import os
+import pathlib
+
+from nirwals.physics.data import build_bundle
+
+
+def main() -> None:
+    base_dir = pathlib.Path(os.environ["FILE_BASE_DIR"])
+    bundle_path = build_bundle(base_dir)
+    print(f"Created {bundle_path}.")
+
+
+if __name__ == "__main__":
+    main()
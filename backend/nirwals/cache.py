@@ -0,0 +1,167 @@
+"""In-memory caches for results of the simulator."""
+
+import collections
+import dataclasses
+import threading
+from typing import Callable, Generic, Hashable, TypeVar
+
+import numpy as np
+
+V = TypeVar("V")
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheInfo:
+    """
+    Statistics for an LRU cache.
+
+    Parameters
+    ----------
+    hits: int
+        Number of requests which were served from the cache.
+    misses: int
+        Number of requests which required computing the value.
+    size: int
+        Number of values currently in the cache.
+    nbytes: int
+        Total size (in bytes) of the values currently in the cache.
+    """
+
+    hits: int
+    misses: int
+    size: int
+    nbytes: int
+
+
+def array_nbytes(value: np.ndarray) -> int:
+    """
+    Return the size of a NumPy array in bytes.
+
+    Parameters
+    ----------
+    value: np.ndarray
+        The array.
+
+    Returns
+    -------
+    int
+        The array size.
+    """
+    return int(value.nbytes)
+
+
+class LRUCache(Generic[V]):
+    """
+    A thread-safe cache with least-recently-used eviction.
+
+    The cache holds at most `maxsize` values. If `max_bytes` is given, the total size
+    of the cached values, as determined by the `sizeof` function, is at most
+    `max_bytes` as well. The least recently used values are evicted whenever either
+    limit is exceeded. A value which is larger than `max_bytes` is returned, but not
+    cached.
+
+    Values are shared between all callers and should not be modified.
+
+    Parameters
+    ----------
+    maxsize: int
+        Maximum number of cached values.
+    max_bytes: int, optional
+        Maximum total size (in bytes) of the cached values.
+    sizeof: callable, optional
+        Function returning the size (in bytes) of a value. This must be given if
+        `max_bytes` is given.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        max_bytes: int | None = None,
+        sizeof: Callable[[V], int] | None = None,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("The maximum cache size must be positive.")
+        if max_bytes is not None and sizeof is None:
+            raise ValueError("A size function is required if max_bytes is given.")
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._values: collections.OrderedDict[
+            Hashable, tuple[V, int]
+        ] = collections.OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable, compute: Callable[[], V]) -> V:
+        """
+        Return the value for a key, computing and caching it if necessary.
+
+        The value is computed without holding the cache lock, so that concurrent
+        requests for other keys are not blocked. Concurrent requests for the same
+        missing key may hence compute the value more than once.
+
+        Parameters
+        ----------
+        key: Hashable
+            The key.
+        compute: callable
+            Function without arguments computing the value.
+
+        Returns
+        -------
+        V
+            The value.
+        """
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None:
+                self._values.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        value = compute()
+        nbytes = self._sizeof(value) if self._sizeof is not None else 0
+        if self.max_bytes is not None and nbytes > self.max_bytes:
+            return value
+
+        with self._lock:
+            previous = self._values.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous[1]
+            self._values[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while len(self._values) > self.maxsize or (
+                self.max_bytes is not None and self._nbytes > self.max_bytes
+            ):
+                _, (_, evicted_nbytes) = self._values.popitem(last=False)
+                self._nbytes -= evicted_nbytes
+
+        return value
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Return the hit and miss counts and the size of the cache.
+
+        Returns
+        -------
+        CacheInfo
+            The cache statistics.
+        """
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                size=len(self._values),
+                nbytes=self._nbytes,
+            )
+
+    def clear(self) -> None:
+        """Remove all values from the cache and reset the statistics."""
+        with self._lock:
+            self._values.clear()
+            self._nbytes = 0
+            self._hits = 0
+            self._misses = 0
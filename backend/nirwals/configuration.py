@@ -315,38 +315,54 @@ def _parse_source(data: dict[str, Any]) -> Source | None:
         return None
 
     source_extension = data["source"]["type"]
-    spectrum_parts: list[Spectrum] = []
-    for s in data["source"]["spectrum"]:
-        spectrum_type = s["spectrumType"]
-        match spectrum_type:
-            case "Blackbody":
-                spectrum: Spectrum = Blackbody(
-                    magnitude=float(s["magnitude"]),
-                    temperature=float(s["temperature"]) * u.K,
-                )
-            case "Emission Line":
-                spectrum = EmissionLine(
-                    central_wavelength=float(s["centralWavelength"]) * u.AA,
-                    fwhm=float(s["fwhm"]) * u.AA,
-                    redshift=float(s["redshift"]),
-                    total_flux=float(s["flux"]) * u.erg / (u.cm**2 * u.s),
-                )
-            case "Galaxy":
-                spectrum = Galaxy(
-                    age=s["age"],
-                    galaxy_type=s["type"],
-                    magnitude=float(s["magnitude"]),
-                    redshift=float(s["redshift"]),
-                    with_emission_lines=s["withEmissionLines"],
-                )
-            case _:
-                raise ValueError(f"Unsupported spectrum type: {spectrum_type}")
-
-        spectrum_parts.append(spectrum)
+    spectrum_parts = [spectrum(s) for s in data["source"]["spectrum"]]
 
     return Source(extension=source_extension, spectrum=spectrum_parts)
 
 
+def spectrum(data: dict[str, Any]) -> Spectrum:
+    """
+    Return the spectrum component defined in the given data.
+
+    The data must be in the format used for the items of the source spectrum in the
+    POST data.
+
+    Parameters
+    ----------
+    data: dict
+        Spectrum data.
+
+    Returns
+    -------
+    Spectrum
+        The spectrum component.
+    """
+    spectrum_type = data["spectrumType"]
+    match spectrum_type:
+        case "Blackbody":
+            return Blackbody(
+                magnitude=float(data["magnitude"]),
+                temperature=float(data["temperature"]) * u.K,
+            )
+        case "Emission Line":
+            return EmissionLine(
+                central_wavelength=float(data["centralWavelength"]) * u.AA,
+                fwhm=float(data["fwhm"]) * u.AA,
+                redshift=float(data["redshift"]),
+                total_flux=float(data["flux"]) * u.erg / (u.cm**2 * u.s),
+            )
+        case "Galaxy":
+            return Galaxy(
+                age=data["age"],
+                galaxy_type=data["type"],
+                magnitude=float(data["magnitude"]),
+                redshift=float(data["redshift"]),
+                with_emission_lines=data["withEmissionLines"],
+            )
+        case _:
+            raise ValueError(f"Unsupported spectrum type: {spectrum_type}")
+
+
 def configuration(data: dict[str, Any]) -> Configuration:
     """
     Return the configuration defined in the given POST data.
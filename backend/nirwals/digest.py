@@ -0,0 +1,411 @@
+"""Canonical, hashable forms of configurations for memoising simulator stages."""
+
+import dataclasses
+import hashlib
+import json
+from typing import Any, Literal, get_args
+
+from astropy import units as u
+from astropy.units import Quantity
+
+from nirwals.configuration import (
+    Blackbody,
+    Configuration,
+    EmissionLine,
+    Galaxy,
+    Spectrum,
+    UserDefinedSpectrum,
+)
+from nirwals.physics.data import data_version
+
+Stage = Literal["source", "sky", "bandpass", "sky_bandpass", "detector"]
+
+_BANDPASS_FIELDS = (
+    "filter_name",
+    "grating_name",
+    "grating_angle",
+    "seeing",
+    "zenith_distance",
+    "source_extension",
+)
+
+STAGE_FIELDS: dict[Stage, tuple[str, ...]] = {
+    "source": ("spectrum",),
+    "sky": (),
+    "bandpass": _BANDPASS_FIELDS,
+    "sky_bandpass": tuple(
+        name for name in _BANDPASS_FIELDS if name != "source_extension"
+    ),
+    "detector": ("full_well", "gain", "read_noise", "samplings", "sampling_mode"),
+}
+"""
+The fields of a canonical configuration on which the pipeline stages depend.
+
+The data version is part of the inputs of every stage. The sky background does not
+depend on the configuration at all, and the sky bandpass is the bandpass for a
+diffuse source, so that it does not depend on the source extension.
+"""
+
+# Number of significant digits to which floats are rounded.
+_SIGNIFICANT_DIGITS = 12
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CanonicalBlackbody:
+    """
+    A blackbody spectrum in canonical form.
+
+    Parameters
+    ----------
+    magnitude: float
+        The apparent magnitude for a Johnson-J filter.
+    temperature: float
+        The temperature, in Kelvin.
+    """
+
+    magnitude: float
+    temperature: float
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CanonicalEmissionLine:
+    """
+    An emission line spectrum in canonical form.
+
+    Parameters
+    ----------
+    central_wavelength: float
+        The wavelength of the line center, in Angstrom.
+    fwhm: float
+        The full width half maximum, in Angstrom.
+    redshift: float
+        The redshift z.
+    total_flux: float
+        The total flux, in erg / (cm^2 s).
+    """
+
+    central_wavelength: float
+    fwhm: float
+    redshift: float
+    total_flux: float
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CanonicalGalaxy:
+    """
+    A galaxy spectrum in canonical form.
+
+    Parameters
+    ----------
+    age: str
+        The age of the galaxy, such as "Old".
+    galaxy_type: str
+        The type of galaxy, such as "E" or "Sb".
+    magnitude: float
+        The apparent magnitude for a Johnson-J filter.
+    redshift: float
+        The redshift z.
+    with_emission_lines: bool
+        Whether the spectrum includes emission lines.
+    """
+
+    age: str
+    galaxy_type: str
+    magnitude: float
+    redshift: float
+    with_emission_lines: bool
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CanonicalUserDefinedSpectrum:
+    """
+    A user-defined spectrum in canonical form.
+
+    Only the file path is included, so the file content should not change while the
+    path is in use.
+
+    Parameters
+    ----------
+    file: str
+        Path of the file with the wavelengths and fluxes.
+    """
+
+    file: str
+
+
+CanonicalSpectrum = (
+    CanonicalBlackbody
+    | CanonicalEmissionLine
+    | CanonicalGalaxy
+    | CanonicalUserDefinedSpectrum
+)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CanonicalConfiguration:
+    """
+    A configuration in canonical form.
+
+    A canonical configuration is immutable and hashable, and two configurations which
+    differ only in the units of their quantities, or in floats by less than the
+    rounding to 12 significant digits, have equal canonical forms. Quantities are
+    stored as floats in fixed units, as listed below, and undefined values are None.
+
+    The digest method returns a stable digest of the inputs of a pipeline stage (see
+    STAGE_FIELDS) or of the whole configuration. The digest includes the data version,
+    so that it changes whenever the data files change.
+
+    Use the canonical_configuration function for creating a canonical configuration.
+
+    Parameters
+    ----------
+    data_version: str
+        The version of the data files.
+    source_extension: str, optional
+        The source extension ("Diffuse" or "Point").
+    spectrum: tuple of CanonicalSpectrum
+        The constituent spectra of the source spectrum.
+    seeing: float, optional
+        The full width half maximum of the seeing disk, in arcseconds.
+    zenith_distance: float, optional
+        The zenith distance of the source, in degrees.
+    effective_mirror_area: float, optional
+        The effective telescope mirror area, in square centimetres.
+    filter_name: str, optional
+        The filter.
+    grating_name: str, optional
+        The grating name.
+    grating_angle: float, optional
+        The grating angle, in degrees.
+    full_well: int, optional
+        CCD full well.
+    gain: float, optional
+        Gain, i.e. electrons per ADU.
+    read_noise: float, optional
+        Readout noise for a single read.
+    samplings: int, optional
+        Number of samplings.
+    sampling_mode: str, optional
+        Sampling mode, such as "Fowler".
+    exposures: int, optional
+        The number of exposures.
+    exposure_time: float, optional
+        The exposure time for a single exposure, in seconds.
+    snr: float, optional
+        The requested signal-to-noise ratio.
+    snr_wavelength: float, optional
+        The wavelength for the requested signal-to-noise ratio, in Angstrom.
+    lunar_elongation: float, optional
+        The lunar elongation, in degrees.
+    lunar_phase: float, optional
+        The lunar phase, in degrees.
+    moon_zenith_distance: float, optional
+        The zenith distance of the Moon, in degrees.
+    ecliptic_latitude: float, optional
+        The ecliptic latitude of the source, in degrees.
+    solar_elongation: float, optional
+        The solar elongation, in degrees.
+    year: int, optional
+        The year of observation.
+    """
+
+    data_version: str
+    source_extension: str | None
+    spectrum: tuple[CanonicalSpectrum, ...]
+    seeing: float | None
+    zenith_distance: float | None
+    effective_mirror_area: float | None
+    filter_name: str | None
+    grating_name: str | None
+    grating_angle: float | None
+    full_well: int | None
+    gain: float | None
+    read_noise: float | None
+    samplings: int | None
+    sampling_mode: str | None
+    exposures: int | None
+    exposure_time: float | None
+    snr: float | None
+    snr_wavelength: float | None
+    lunar_elongation: float | None
+    lunar_phase: float | None
+    moon_zenith_distance: float | None
+    ecliptic_latitude: float | None
+    solar_elongation: float | None
+    year: int | None
+
+    def digest(self, stage: Stage | None = None) -> str:
+        """
+        Return the digest of the inputs of a pipeline stage.
+
+        The digest is the SHA-256 hash of a canonical JSON representation of the stage
+        name, the data version and the values of the fields on which the stage
+        depends. It is the same in all processes and Python versions. If no stage is
+        given, the digest of the whole configuration is returned.
+
+        Parameters
+        ----------
+        stage: Stage, optional
+            The pipeline stage.
+
+        Returns
+        -------
+        str
+            The digest, as a hexadecimal string.
+        """
+        if stage is None:
+            names = tuple(
+                f.name for f in dataclasses.fields(self) if f.name != "data_version"
+            )
+        elif stage in STAGE_FIELDS:
+            names = STAGE_FIELDS[stage]
+        else:
+            raise ValueError(f"Unsupported stage: {stage}")
+        content = {
+            "stage": stage,
+            "data_version": self.data_version,
+            "values": {name: _json_value(getattr(self, name)) for name in names},
+        }
+        serialised = json.dumps(content, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(serialised.encode("utf-8")).hexdigest()
+
+    def stage_digests(self) -> dict[Stage, str]:
+        """
+        Return the digests of all pipeline stages.
+
+        Returns
+        -------
+        dict
+            The digest for each stage.
+        """
+        return {stage: self.digest(stage) for stage in get_args(Stage)}
+
+
+def canonical_configuration(
+    configuration: Configuration, data_version_key: str | None = None
+) -> CanonicalConfiguration:
+    """
+    Return the canonical form of a configuration.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    data_version_key: str, optional
+        The version of the data files. By default, the version returned by the
+        data_version function is used.
+
+    Returns
+    -------
+    CanonicalConfiguration
+        The canonical configuration.
+    """
+    if data_version_key is None:
+        data_version_key = data_version()
+    source = configuration.source
+    telescope = configuration.telescope
+    grating = telescope.grating
+    detector = configuration.detector
+    exposure = configuration.exposure
+    snr = exposure.snr if exposure is not None else None
+    moon = configuration.moon
+    sun = configuration.sun
+
+    return CanonicalConfiguration(
+        data_version=data_version_key,
+        source_extension=source.extension if source is not None else None,
+        spectrum=tuple(_canonical_spectrum(s) for s in source.spectrum)
+        if source is not None
+        else (),
+        seeing=_value(configuration.seeing, u.arcsec),
+        zenith_distance=_value(configuration.zenith_distance, u.deg),
+        effective_mirror_area=_value(telescope.effective_mirror_area, u.cm**2),
+        filter_name=telescope.filter,
+        grating_name=grating.name if grating is not None else None,
+        grating_angle=_value(grating.grating_angle, u.deg)
+        if grating is not None
+        else None,
+        full_well=int(detector.full_well) if detector is not None else None,
+        gain=_quantise(detector.gain) if detector is not None else None,
+        read_noise=_quantise(detector.read_noise) if detector is not None else None,
+        samplings=int(detector.samplings) if detector is not None else None,
+        sampling_mode=detector.sampling_mode if detector is not None else None,
+        exposures=int(exposure.exposures) if exposure is not None else None,
+        exposure_time=_value(exposure.exposure_time, u.s)
+        if exposure is not None
+        else None,
+        snr=_quantise(snr.snr) if snr is not None else None,
+        snr_wavelength=_value(snr.wavelength, u.AA) if snr is not None else None,
+        lunar_elongation=_value(moon.lunar_elongation, u.deg)
+        if moon is not None
+        else None,
+        lunar_phase=_value(moon.phase, u.deg) if moon is not None else None,
+        moon_zenith_distance=_value(moon.zenith_distance, u.deg)
+        if moon is not None
+        else None,
+        ecliptic_latitude=_value(sun.ecliptic_latitude, u.deg)
+        if sun is not None
+        else None,
+        solar_elongation=_value(sun.solar_elongation, u.deg)
+        if sun is not None
+        else None,
+        year=int(sun.year) if sun is not None else None,
+    )
+
+
+def _canonical_spectrum(spectrum: Spectrum) -> CanonicalSpectrum:
+    # The canonical form of a constituent spectrum.
+    if isinstance(spectrum, Blackbody):
+        return CanonicalBlackbody(
+            magnitude=_quantise(spectrum.magnitude),
+            temperature=_quantity_value(spectrum.temperature, u.K),
+        )
+    if isinstance(spectrum, EmissionLine):
+        return CanonicalEmissionLine(
+            central_wavelength=_quantity_value(spectrum.central_wavelength, u.AA),
+            fwhm=_quantity_value(spectrum.fwhm, u.AA),
+            redshift=_quantise(spectrum.redshift),
+            total_flux=_quantity_value(spectrum.total_flux, u.erg / (u.cm**2 * u.s)),
+        )
+    if isinstance(spectrum, Galaxy):
+        return CanonicalGalaxy(
+            age=spectrum.age,
+            galaxy_type=spectrum.galaxy_type,
+            magnitude=_quantise(spectrum.magnitude),
+            redshift=_quantise(spectrum.redshift),
+            with_emission_lines=bool(spectrum.with_emission_lines),
+        )
+    if isinstance(spectrum, UserDefinedSpectrum):
+        return CanonicalUserDefinedSpectrum(file=str(spectrum.file))
+    raise ValueError(f"Unsupported spectrum type: {type(spectrum)}")
+
+
+def _value(quantity: Quantity | None, unit: u.Unit) -> float | None:
+    # The rounded value of an optional quantity in a unit.
+    if quantity is None:
+        return None
+    return _quantity_value(quantity, unit)
+
+
+def _quantity_value(quantity: Quantity, unit: u.Unit) -> float:
+    # The rounded value of a quantity in a unit.
+    return _quantise(quantity.to(unit).value)
+
+
+def _quantise(value: float) -> float:
+    # Rounds a float to a fixed number of significant digits. Adding 0 turns -0.0 into
+    # 0.0.
+    return float(f"{float(value):.{_SIGNIFICANT_DIGITS}g}") + 0.0
+
+
+def _json_value(value: Any) -> Any:
+    # A JSON serialisable representation of a field value. Canonical spectra are
+    # represented by their type name and field values.
+    if isinstance(value, tuple):
+        return [_json_value(v) for v in value]
+    if dataclasses.is_dataclass(value):
+        return {
+            "type": type(value).__name__,
+            **{f.name: getattr(value, f.name) for f in dataclasses.fields(value)},
+        }
+    return value
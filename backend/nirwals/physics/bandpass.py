@@ -1,14 +1,16 @@
 """Functions related to throughput calculations."""
 
-import math
+import functools
 import pathlib
-from typing import get_args, cast
+from typing import cast
 
 import numpy as np
 from astropy import units as u
+from astropy.units import Quantity
+from numpy.typing import ArrayLike
 from synphot import SpectralElement, Empirical1D, ConstFlux1D
 
-from constants import get_file_base_dir, TELESCOPE_SEEING, FIBRE_RADIUS
+from constants import get_file_base_dir
 from nirwals.configuration import (
     GratingName,
     Filter,
@@ -17,7 +19,9 @@ from nirwals.configuration import (
     Grating,
     Source,
 )
-from nirwals.physics.utils import read_from_file
+from nirwals.cache import LRUCache, CacheInfo, array_nbytes
+from nirwals.physics import kernels
+from nirwals.physics.data import data_version, read_curve
 
 
 @u.quantity_input
@@ -34,17 +38,63 @@ def atmospheric_transmission(zenith_distance: u.deg) -> SpectralElement:
     SpectralElement
         The transmission curve.
     """
+    wavelengths, transmissions = atmospheric_transmissions(
+        zenith_distances=zenith_distance
+    )
+
+    # Return the extinction.
+    return SpectralElement(
+        Empirical1D, points=wavelengths, lookup_table=transmissions[0]
+    )
+
+
+@u.quantity_input
+def atmospheric_transmissions(
+    zenith_distances: u.deg, wavelengths: Quantity | None = None
+) -> tuple[Quantity, np.ndarray]:
+    """
+    Return the atmospheric transmission values for an array of zenith distances.
+
+    The transmission t for the zenith distance z and the extinction coefficient kappa
+    is given by t = 10^(-0.4 kappa sec z). As lg t is proportional to sec z, the
+    transmission values for all zenith distances are calculated in a single array
+    operation, without creating any bandpass objects.
+
+    If no wavelengths are given, the transmissions are calculated for the wavelengths
+    of the extinction coefficient file. Otherwise, the extinction coefficients are
+    linearly interpolated for the given wavelengths.
+
+    Parameters
+    ----------
+    zenith_distances: Angle
+        Zenith distance or array of zenith distances.
+    wavelengths: Quantity, optional
+        Wavelengths for which to calculate the transmissions.
+
+    Returns
+    -------
+    tuple
+        The wavelengths and an array of shape (number of zenith distances, number of
+        wavelengths) with the corresponding transmissions.
+    """
     # Get the extinction coefficients.
     path = pathlib.Path(get_file_base_dir() / "atmospheric_extinction_coefficients.npz")
-    with open(path, "rb") as f:
-        wavelengths, kappa_values = read_from_file(f)
+    file_wavelengths, kappa_values = read_curve(path)
+    if wavelengths is None:
+        wavelengths = file_wavelengths
+        kappas = kappa_values.value
+    else:
+        kappas = np.interp(
+            wavelengths.to(u.AA).value,
+            file_wavelengths.to(u.AA).value,
+            kappa_values.value,
+        )
 
     # Calculate the transmission values.
-    sec_z = 1 / math.cos(zenith_distance.to(u.rad).value)
-    transmissions = np.power(10, -0.4 * kappa_values * sec_z)
+    sec_z = 1 / np.cos(np.atleast_1d(zenith_distances.to(u.rad).value))
+    transmissions = np.power(10, -0.4 * np.outer(sec_z, kappas))
 
-    # Return the extinction.
-    return SpectralElement(Empirical1D, points=wavelengths, lookup_table=transmissions)
+    return wavelengths, transmissions
 
 
 def detector_quantum_efficiency() -> SpectralElement:
@@ -57,9 +107,12 @@ def detector_quantum_efficiency() -> SpectralElement:
         The quantum efficiency.
     """
     path = pathlib.Path(get_file_base_dir() / "detector_quantum_efficiency.npz")
-    with open(path, "rb") as f:
-        wavelengths, efficiencies = read_from_file(f)
-    return SpectralElement(Empirical1D, points=wavelengths, lookup_table=efficiencies)
+    wavelengths, efficiencies = read_curve(path)
+
+    # The cached curve is read-only, but synphot may modify the lookup table in place.
+    return SpectralElement(
+        Empirical1D, points=wavelengths, lookup_table=efficiencies.copy()
+    )
 
 
 def filter_transmission(filter_name: Filter) -> SpectralElement:
@@ -86,9 +139,10 @@ def filter_transmission(filter_name: Filter) -> SpectralElement:
 
     # Get the filter transmission.
     path = pathlib.Path(get_file_base_dir() / "filters" / filename)
-    with open(path, "rb") as f:
-        wavelengths, transmissions = read_from_file(f)
-    return SpectralElement(Empirical1D, points=wavelengths, lookup_table=transmissions)
+    wavelengths, transmissions = read_curve(path)
+    return SpectralElement(
+        Empirical1D, points=wavelengths, lookup_table=transmissions.copy()
+    )
 
 
 @u.quantity_input
@@ -118,28 +172,11 @@ def fibre_throughput(
     SpectralElement
         The fibre throughput.
     """
-    # Sanity check
-    if source_extension not in get_args(SourceExtension):
-        raise ValueError(f"Unsupported source extension {source_extension}")
-
-    # There is no throughput loss for diffuse sources.
-    if source_extension == "Diffuse":
-        return SpectralElement(ConstFlux1D, amplitude=1)
-
-    # Get the standard deviation for atmospheric seeing.
-    sec_z = 1 / math.cos(zenith_distance.to(u.rad).value)
-    sigma_atm = seeing * sec_z ** (3 / 5) / (2 * math.sqrt(2 * math.log(2)))
-
-    # Get the standard deviation for the telescope seeing.
-    sigma_tel = TELESCOPE_SEEING / (2 * math.sqrt(2 * math.log(2)))
-
-    # Get the square of the total standard deviation for the seeing disk
-    sigma_squared = sigma_atm**2 + sigma_tel**2
-
-    # Calculate the fraction of the seeing disk flux covered by the fibre.
-    covered_fraction = 1 - math.exp(-(FIBRE_RADIUS**2) / (2 * sigma_squared))
-
-    # Return the throughput.
+    covered_fraction = kernels.fibre_throughput(
+        seeing=seeing.to(u.arcsec).value,
+        source_extension=source_extension,
+        zenith_distance=zenith_distance.to(u.deg).value,
+    )
     return SpectralElement(ConstFlux1D, amplitude=covered_fraction)
 
 
@@ -153,6 +190,9 @@ def grating_efficiency(
     The grating angle is the angle between the incoming light rays and the grating
     normal.
 
+    See the GratingEfficiencyBank class for details about how the efficiency is
+    calculated.
+
     Parameters
     ----------
     grating_angle: Angle
@@ -166,76 +206,229 @@ def grating_efficiency(
         The grating efficiency.
 
     """
+    bank = grating_efficiency_bank(grating_name)
+    wavelengths, efficiencies = bank.efficiencies(grating_angles=grating_angle)
+
+    # Return the grating efficiency.
+    return SpectralElement(
+        Empirical1D, points=wavelengths, lookup_table=efficiencies[0]
+    )
 
-    import numpy as np
 
-    # Grating angles for which a grating efficiency file exists and the wavelengths for
-    # the maxima of the corresponding grating efficiency curves.
-    grating_parameters = [
-        (30 * u.deg, 10795.6 * u.AA),
-        (35 * u.deg, 12081.6 * u.AA),
-        (40 * u.deg, 13400.4 * u.AA),
-        (45 * u.deg, 14700.0 * u.AA),
-        (50 * u.deg, 15907.2 * u.AA),
+# Grating angles (in degrees) for which a grating efficiency file exists and the
+# wavelengths (in Angstrom) for the maxima of the corresponding grating efficiency
+# curves.
+_GRATING_PARAMETERS: dict[str, list[tuple[float, float]]] = {
+    "950": [
+        (30, 10795.6),
+        (35, 12081.6),
+        (40, 13400.4),
+        (45, 14700.0),
+        (50, 15907.2),
     ]
-    angles = [gp[0] for gp in grating_parameters]
-    maxima = {gp[0]: gp[1] for gp in grating_parameters}
-
-    # Avoid rounding issues.
-    eps = 0.000001
-    if angles[0] - eps * u.deg < grating_angle < angles[0] + eps * u.deg:
-        grating_angle = angles[0] + eps * u.deg
-    if angles[-1] - eps * u.deg < grating_angle < angles[-1] + eps * u.deg:
-        grating_angle = angles[-1] - eps * u.deg
-
-    # Find the smallest interval [alpha1, alpha2] in angles with
-    # alpha1 <= alpha <= alpha2.
-    if angles[0] > grating_angle or grating_angle > angles[-1]:
-        raise ValueError(
-            f"Only grating angles between {angles[0]} and {angles[1]} are "
-            f"supported."
+}
+
+# Canonical wavelengths (in Angstrom). These are the default wavelengths for which
+# grating efficiencies are calculated, and compiled throughputs are evaluated on them.
+_CANONICAL_WAVELENGTHS = np.arange(4000, 22000, 0.2)
+_CANONICAL_WAVELENGTHS.flags.writeable = False
+
+
+class GratingEfficiencyBank:
+    """
+    Grating efficiencies for the whole supported range of grating angles.
+
+    Efficiency curves are only available for a few grating angles (30, 35, 40, 45 and
+    50 degrees). For any other angle alpha, the smallest interval [alpha1, alpha2]
+    with alpha1 <= alpha <= alpha2 is found, and the curve for the angle closer to
+    alpha is shifted, so that its maximum is at the wavelength obtained by linearly
+    interpolating between the maxima of the curves for alpha1 and alpha2.
+
+    As the shifted curve is obtained by evaluating one of the available curves at
+    shifted wavelengths, the efficiencies for any number of grating angles can be
+    calculated with a single interpolation per available curve, and no intermediate
+    synphot objects are created. The available curves are taken from the process-wide
+    curve cache.
+
+    Parameters
+    ----------
+    grating_name: GratingName
+        Grating name. This is equal to the grating frequency, i.e. grooves per mm.
+    """
+
+    def __init__(self, grating_name: GratingName) -> None:
+        if grating_name not in _GRATING_PARAMETERS:
+            raise ValueError(f"Unsupported grating: {grating_name}")
+        parameters = np.array(_GRATING_PARAMETERS[grating_name], dtype=float)
+        self.grating_name = grating_name
+        self._angles = parameters[:, 0]
+        self._maxima = parameters[:, 1]
+
+    @property
+    def min_grating_angle(self) -> u.deg:
+        """Angle: The minimum supported grating angle."""
+        return self._angles[0] * u.deg
+
+    @property
+    def max_grating_angle(self) -> u.deg:
+        """Angle: The maximum supported grating angle."""
+        return self._angles[-1] * u.deg
+
+    @u.quantity_input
+    def efficiencies(
+        self, grating_angles: u.deg, wavelengths: Quantity | None = None
+    ) -> tuple[Quantity, np.ndarray]:
+        """
+        Return the grating efficiencies for an array of grating angles.
+
+        By default, the efficiencies are calculated for wavelengths from 4000 A to
+        22000 A, with a spacing of 0.2 A.
+
+        The wavelengths may be given as a one-dimensional array, which is used for
+        all grating angles, or as an array of shape (number of grating angles, number
+        of wavelengths), whose rows are used for the corresponding grating angles.
+
+        Parameters
+        ----------
+        grating_angles: Angle
+            Grating angle or array of grating angles.
+        wavelengths: Quantity, optional
+            Wavelengths for which to calculate the efficiencies.
+
+        Returns
+        -------
+        tuple
+            The wavelengths and an array of shape (number of grating angles, number of
+            wavelengths) with the corresponding efficiencies.
+        """
+        if wavelengths is None:
+            wavelengths = _CANONICAL_WAVELENGTHS * u.AA
+        efficiencies = self.efficiency_values(
+            grating_angles.to(u.deg).value, wavelengths.to(u.AA).value
+        )
+        return wavelengths, efficiencies
+
+    def efficiency_values(
+        self, grating_angles: ArrayLike, wavelengths: np.ndarray
+    ) -> np.ndarray:
+        """
+        Return the grating efficiencies for grating angles and wavelengths.
+
+        This is the unit-free equivalent of the efficiencies method, with the grating
+        angles in degrees and the wavelengths in Angstrom.
+
+        Parameters
+        ----------
+        grating_angles: array-like
+            Grating angle or array of grating angles, in degrees.
+        wavelengths: np.ndarray
+            Wavelengths (in Angstrom), as a one-dimensional array or as an array of
+            shape (number of grating angles, number of wavelengths).
+
+        Returns
+        -------
+        np.ndarray
+            An array of shape (number of grating angles, number of wavelengths) with
+            the efficiencies.
+        """
+        wavelength_values = np.asarray(wavelengths, dtype=float)
+        alphas = np.atleast_1d(np.asarray(grating_angles, dtype=float))
+        curve_indices, shifts = self._shifts(alphas)
+        if wavelength_values.ndim == 2 and len(wavelength_values) != len(alphas):
+            raise ValueError(
+                "There must be one row of wavelengths for every grating angle."
+            )
+
+        # Evaluate each of the available curves at the shifted wavelengths of all the
+        # grating angles for which it is used.
+        efficiencies = np.empty((len(alphas), wavelength_values.shape[-1]))
+        for curve_index in np.unique(curve_indices):
+            uses_curve = curve_indices == curve_index
+            curve_wavelengths, curve_efficiencies = read_curve(
+                self._path(self._angles[curve_index])
+            )
+            rows = (
+                wavelength_values[uses_curve]
+                if wavelength_values.ndim == 2
+                else wavelength_values
+            )
+            efficiencies[uses_curve] = np.interp(
+                rows + shifts[uses_curve, np.newaxis],
+                curve_wavelengths.to(u.AA).value,
+                curve_efficiencies.value,
+            )
+
+        return efficiencies
+
+    def _shifts(self, alphas: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        angles = self._angles
+        maxima = self._maxima
+
+        # Avoid rounding issues.
+        eps = 0.000001
+        alphas = np.where(np.abs(alphas - angles[0]) < eps, angles[0] + eps, alphas)
+        alphas = np.where(np.abs(alphas - angles[-1]) < eps, angles[-1] - eps, alphas)
+
+        # Find the smallest interval [alpha1, alpha2] in angles with
+        # alpha1 <= alpha <= alpha2.
+        if np.any((alphas < angles[0]) | (alphas > angles[-1])):
+            raise ValueError(
+                f"Only grating angles between {angles[0]} deg and {angles[-1]} deg "
+                f"are supported."
+            )
+        lower = np.searchsorted(angles, alphas, side="right") - 1
+        alpha1 = angles[lower]
+        alpha2 = angles[lower + 1]
+        lmax1 = maxima[lower]
+        lmax2 = maxima[lower + 1]
+
+        # Figure out whether to shift the efficiency curve for alpha1 to the right or
+        # the curve for alpha2 to the left, and perform the shift.
+        shift_to_right = alphas <= (alpha1 + alpha2) / 2
+        curve_indices = np.where(shift_to_right, lower, lower + 1)
+        shifts = np.where(
+            shift_to_right,
+            -((alphas - alpha1) / (alpha2 - alpha1)) * (lmax2 - lmax1),
+            ((alpha2 - alphas) / (alpha2 - alpha1)) * (lmax2 - lmax1),
         )
-    alpha1 = max([a for a in angles if a <= grating_angle])
-    alpha2 = min([a for a in angles if grating_angle < a])
-
-    # Figure out whether to shift the efficiency curve for alpha1 to the right or the
-    # curve for alpha2 to the left.
-    if grating_angle <= (alpha1 + alpha2) / 2:
-        angle = alpha1
-        shift_to_right = True
-    else:
-        angle = alpha2
-        shift_to_right = False
-
-    # Get the efficiency curve to shift.
-    angle_value = round(angle.to(u.deg).value)
-    path = pathlib.Path(
-        get_file_base_dir()
-        / "gratings"
-        / grating_name
-        / f"grating_{grating_name}_{angle_value}deg.npz"
-    )
-    with open(path, "rb") as f:
-        wavelengths_, efficiencies_ = read_from_file(f)
-    efficiency = SpectralElement(
-        Empirical1D, points=wavelengths_, lookup_table=efficiencies_
-    )
 
-    # Perform the shift
-    lmax1 = maxima[alpha1]
-    lmax2 = maxima[alpha2]
-    if shift_to_right:
-        shift = -((grating_angle - alpha1) / (alpha2 - alpha1)) * (lmax2 - lmax1)
-    else:
-        shift = ((alpha2 - grating_angle) / (alpha2 - alpha1)) * (lmax2 - lmax1)
-    wavelengths = np.arange(4000, 22000, 0.2) * u.AA
-    shifted_wavelengths = wavelengths + shift
-    shifted_efficiencies = efficiency(shifted_wavelengths)
+        return curve_indices, shifts
 
-    # Return the grating efficiency.
-    return SpectralElement(
-        Empirical1D, points=wavelengths, lookup_table=shifted_efficiencies
-    )
+    def _path(self, angle: float) -> pathlib.Path:
+        angle_value = round(angle)
+        return pathlib.Path(
+            get_file_base_dir()
+            / "gratings"
+            / self.grating_name
+            / f"grating_{self.grating_name}_{angle_value}deg.npz"
+        )
+
+
+def grating_efficiency_bank(grating_name: GratingName) -> GratingEfficiencyBank:
+    """
+    Return the grating efficiency bank for a grating.
+
+    The bank is cached, and it is created anew if the data version changes.
+
+    Parameters
+    ----------
+    grating_name: GratingName
+        Grating name. This is equal to the grating frequency, i.e. grooves per mm.
+
+    Returns
+    -------
+    GratingEfficiencyBank
+        The grating efficiency bank.
+    """
+    return _grating_efficiency_bank(grating_name, data_version())
+
+
+@functools.lru_cache(maxsize=8)
+def _grating_efficiency_bank(
+    grating_name: GratingName, version: str
+) -> GratingEfficiencyBank:
+    # The grating efficiency bank for a grating and data version.
+    return GratingEfficiencyBank(grating_name)
 
 
 def telescope_throughput() -> SpectralElement:
@@ -252,13 +445,12 @@ def telescope_throughput() -> SpectralElement:
         The telescope throughput.
     """
     path = pathlib.Path(get_file_base_dir() / "telescope_throughput.npz")
-    with open(path, "rb") as f:
-        wavelengths, throughputs = read_from_file(f)
+    wavelengths, throughputs = read_curve(path)
     # Apply a throughput fudge factor, as suggested in
     # Encarni's email from 14 June 2024
     # The throughput fudge factor has beed update as per meeting held on the 8th May 2025 to be 0.75
     # see meeting minutes for more details
-    throughputs *= 0.75
+    throughputs = 0.75 * throughputs
     return SpectralElement(Empirical1D, points=wavelengths, lookup_table=throughputs)
 
 
@@ -287,20 +479,230 @@ def throughput(configuration: Configuration) -> SpectralElement:
     """
     grating = cast(Grating, configuration.telescope.grating)
     configuration_source = cast(Source, configuration.source)
-    bandpass = (
-        atmospheric_transmission(zenith_distance=configuration.zenith_distance)
-        * telescope_throughput()
-        * fibre_throughput(
+    return compiled_throughput(
+        atmospheric_transmission(zenith_distance=configuration.zenith_distance),
+        instrument_bandpass(
+            filter_name=cast(Filter, configuration.telescope.filter),
+            grating_name=grating.name,
+            grating_angle=grating.grating_angle,
             seeing=configuration.seeing,
-            source_extension=configuration_source.extension,
             zenith_distance=configuration.zenith_distance,
+            source_extension=configuration_source.extension,
+        ),
+    )
+
+
+# Resolution of the cache keys for grating angles and zenith distances (in degrees)
+# and seeing values (in arcseconds). Values are rounded to this resolution before
+# they are used.
+_KEY_RESOLUTION = 1e-6
+
+# Cache for the product of the telescope throughput, filter transmission, grating
+# efficiency and detector quantum efficiency. Each value requires about 720 kB.
+_instrument_throughput_cache: LRUCache[np.ndarray] = LRUCache(
+    maxsize=32, max_bytes=32 * 1024**2, sizeof=array_nbytes
+)
+
+# Cache for the product of the telescope throughput, filter transmission and detector
+# quantum efficiency.
+_grating_independent_cache: LRUCache[np.ndarray] = LRUCache(
+    maxsize=8, max_bytes=8 * 1024**2, sizeof=array_nbytes
+)
+
+# Cache for instrument bandpasses including the fibre throughput.
+_instrument_bandpass_cache: LRUCache[np.ndarray] = LRUCache(
+    maxsize=128, max_bytes=96 * 1024**2, sizeof=array_nbytes
+)
+
+
+@u.quantity_input
+def instrument_bandpass(
+    filter_name: Filter,
+    grating_name: GratingName,
+    grating_angle: u.deg,
+    seeing: u.arcsec,
+    zenith_distance: u.deg,
+    source_extension: SourceExtension,
+) -> SpectralElement:
+    """
+    Return the instrument bandpass.
+
+    The instrument bandpass is the throughput without the atmospheric transmission,
+    i.e. it includes the following:
+
+    - The mirror efficiency
+    - The fibre throughput
+    - The filter transmission
+    - The grating efficiency
+    - The detector quantum efficiency
+
+    The bandpass is evaluated on the same fixed wavelength grid as a compiled
+    throughput (see the compiled_throughput function).
+
+    Bandpasses are cached with least-recently-used eviction. The cache key consists of
+    the filter name, grating name, grating angle, seeing, zenith distance, source
+    extension and data version, where the grating angle, seeing and zenith distance
+    are rounded to 1e-6 degrees or arcseconds. The product of the components which
+    don't depend on seeing, zenith distance and source extension is cached
+    separately, so that it is shared between the source and the sky background.
+
+    Parameters
+    ----------
+    filter_name: Filter
+        Filter name.
+    grating_name: GratingName
+        Grating name. This is equal to the grating frequency, i.e. grooves per mm.
+    grating_angle: Angle
+        Grating angle.
+    seeing: Angle
+        The full width half maximum of the seeing disk for a zenith distance of 0.
+    zenith_distance: Angle
+        The zenith distance of the source.
+    source_extension: SourceExtension
+        The source extension ("Point" or "Diffuse").
+
+    Returns
+    -------
+    SpectralElement
+        The instrument bandpass.
+    """
+    version = data_version()
+    angle_key = _quantise(grating_angle.to(u.deg).value)
+    key = (
+        filter_name,
+        grating_name,
+        angle_key,
+        _quantise(seeing.to(u.arcsec).value),
+        _quantise(zenith_distance.to(u.deg).value),
+        source_extension,
+        version,
+    )
+
+    def compute() -> np.ndarray:
+        instrument_throughputs = _instrument_throughput_cache.get(
+            (filter_name, grating_name, angle_key, version),
+            lambda: _instrument_throughputs(filter_name, grating_name, angle_key),
         )
-        * filter_transmission(filter_name=cast(Filter, configuration.telescope.filter))
-        * grating_efficiency(
-            grating_angle=grating.grating_angle,
-            grating_name=grating.name,
+        fibre = fibre_throughput(
+            seeing=key[3] * _KEY_RESOLUTION * u.arcsec,
+            source_extension=source_extension,
+            zenith_distance=key[4] * _KEY_RESOLUTION * u.deg,
+        )
+        throughputs = (
+            instrument_throughputs
+            * fibre(_CANONICAL_WAVELENGTHS * u.AA).to(u.dimensionless_unscaled).value
         )
-        * detector_quantum_efficiency()
+        throughputs.flags.writeable = False
+        return cast(np.ndarray, throughputs)
+
+    throughputs = _instrument_bandpass_cache.get(key, compute)
+    return SpectralElement(
+        Empirical1D, points=_CANONICAL_WAVELENGTHS * u.AA, lookup_table=throughputs
+    )
+
+
+def instrument_bandpass_cache_info() -> CacheInfo:
+    """
+    Return the statistics for the instrument bandpass cache.
+
+    Returns
+    -------
+    CacheInfo
+        The cache statistics.
+    """
+    return _instrument_bandpass_cache.cache_info()
+
+
+def clear_instrument_bandpass_cache() -> None:
+    """Remove all instrument bandpasses from the cache."""
+    _instrument_bandpass_cache.clear()
+    _instrument_throughput_cache.clear()
+    _grating_independent_cache.clear()
+
+
+def _quantise(value: float) -> int:
+    return round(value / _KEY_RESOLUTION)
+
+
+def _instrument_throughputs(
+    filter_name: Filter, grating_name: GratingName, angle_key: int
+) -> np.ndarray:
+    efficiency = grating_efficiency(
+        grating_angle=angle_key * _KEY_RESOLUTION * u.deg,
+        grating_name=grating_name,
+    )
+    throughputs = (
+        _grating_independent_throughputs(filter_name)
+        * efficiency(_CANONICAL_WAVELENGTHS * u.AA).to(u.dimensionless_unscaled).value
+    )
+    throughputs.flags.writeable = False
+    return cast(np.ndarray, throughputs)
+
+
+def grating_independent_throughput(filter_name: Filter) -> SpectralElement:
+    """
+    Return the part of the instrument throughput which is independent of the grating.
+
+    This is the product of the telescope throughput, the filter transmission and the
+    detector quantum efficiency. It is evaluated on the same fixed wavelength grid as
+    a compiled throughput (see the compiled_throughput function), and it is cached
+    for every filter and data version.
+
+    Parameters
+    ----------
+    filter_name: Filter
+        Filter name.
+
+    Returns
+    -------
+    SpectralElement
+        The grating-independent throughput.
+    """
+    return SpectralElement(
+        Empirical1D,
+        points=_CANONICAL_WAVELENGTHS * u.AA,
+        lookup_table=_grating_independent_throughputs(filter_name),
     )
 
-    return bandpass
+
+def _grating_independent_throughputs(filter_name: Filter) -> np.ndarray:
+    def compute() -> np.ndarray:
+        product = compiled_throughput(
+            telescope_throughput(),
+            filter_transmission(filter_name=filter_name),
+            detector_quantum_efficiency(),
+        )
+        throughputs = product(_CANONICAL_WAVELENGTHS * u.AA).value
+        throughputs.flags.writeable = False
+        return cast(np.ndarray, throughputs)
+
+    return _grating_independent_cache.get((filter_name, data_version()), compute)
+
+
+def compiled_throughput(*components: SpectralElement) -> SpectralElement:
+    """
+    Return the product of throughput components, evaluated on a fixed grid.
+
+    Each component is evaluated once on the canonical wavelength grid, which covers the
+    range from 4000 A to 22000 A with a spacing of 0.2 A, and the product of the
+    component values is stored as a single lookup table. Evaluating the returned
+    throughput hence requires a single interpolation, whereas a compound synphot model
+    evaluates all of its components whenever it is called.
+
+    Outside the canonical wavelength range the throughput is constant.
+
+    Parameters
+    ----------
+    components: SpectralElement
+        The throughput components.
+
+    Returns
+    -------
+    SpectralElement
+        The product of the throughput components.
+    """
+    wavelengths = _CANONICAL_WAVELENGTHS * u.AA
+    throughputs = np.ones(len(_CANONICAL_WAVELENGTHS))
+    for component in components:
+        throughputs *= component(wavelengths).to(u.dimensionless_unscaled).value
+    return SpectralElement(Empirical1D, points=wavelengths, lookup_table=throughputs)
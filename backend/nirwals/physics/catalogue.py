@@ -0,0 +1,272 @@
+"""Functions for calculating signal-to-noise ratios for catalogues of sources."""
+
+import dataclasses
+import itertools
+import math
+from typing import Iterable, Iterator, cast
+
+import numpy as np
+from astropy import units as u
+from astropy.units import Quantity
+
+from constants import get_minimum_wavelength, get_maximum_wavelength
+from nirwals.configuration import (
+    Blackbody,
+    Configuration,
+    Detector,
+    EmissionLine,
+    Exposure,
+    Galaxy,
+    Grating,
+    Spectrum,
+)
+from nirwals.physics import kernels
+from nirwals.physics.exposure import ObservationPlan
+from nirwals.physics.spectrum import (
+    blackbody_fluxes,
+    emission_lines_pixel_fluxes,
+    galaxy_fluxes,
+    galaxy_j_band_grid,
+    galaxy_template_bank,
+)
+from nirwals.physics.utils import binning_factor
+
+DEFAULT_MAX_BYTES = 64 * 1024**2
+"""Default maximum size (in bytes) of the arrays used for a block of targets."""
+
+# Number of arrays per target (with one value per pixel) which exist at the same time
+# while a block is processed.
+_ARRAYS_PER_TARGET = 10
+
+# Number of arrays per target (with one value per wavelength of the galaxy J band
+# grid) which exist at the same time while galaxy spectra are normalised.
+_J_BAND_ARRAYS_PER_TARGET = 8
+
+
+@dataclasses.dataclass(frozen=True)
+class CatalogueResult:
+    """
+    The results for a single target of a catalogue.
+
+    Parameters
+    ----------
+    index: int
+        Index of the target in the catalogue.
+    snr: float
+        Signal-to-noise ratio at the reference wavelength, for the exposure time and
+        number of exposures defined in the configuration.
+    exposure_time: Quantity
+        Exposure time (per exposure) required for reaching the target signal-to-noise
+        ratio at the reference wavelength. This is infinite if the target has no flux
+        at the reference wavelength.
+    saturated: bool
+        Whether the detector is saturated for the exposure time defined in the
+        configuration.
+    """
+
+    index: int
+    snr: float
+    exposure_time: Quantity
+    saturated: bool
+
+
+@u.quantity_input
+def catalogue_results(
+    configuration: Configuration,
+    targets: Iterable[Spectrum],
+    wavelength: u.AA,
+    snr: float,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> Iterator[CatalogueResult]:
+    """
+    Calculate signal-to-noise ratios and exposure times for a catalogue of targets.
+
+    Every target is given by a single spectrum component, which may be a blackbody,
+    galaxy or emission line spectrum. Everything else, including the source
+    extension, is taken from the configuration, and the source spectrum of the
+    configuration is ignored.
+
+    The throughput and the sky rates are calculated only once. The targets are then
+    processed in blocks, and the flux densities of all blackbodies and of all
+    galaxies in a block are calculated in one go, without creating synphot models.
+    The block size is chosen so that the arrays for a block take up at most
+    `max_bytes` bytes (approximately).
+
+    The results are yielded as soon as a block has been processed, and the targets
+    are consumed block by block, so that arbitrarily large catalogues can be
+    processed with bounded memory.
+
+    A target is considered to saturate the detector if, for any wavelength resolution
+    element in the requested wavelength range, the average number of electrons per
+    pixel (due to source and sky) in a single exposure exceeds the full well of the
+    detector.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration. It must define an exposure time.
+    targets: iterable of Spectrum
+        The targets.
+    wavelength: Quantity
+        Reference wavelength for the signal-to-noise ratio and exposure time.
+    snr: float
+        Target signal-to-noise ratio for calculating the exposure time.
+    max_bytes: int
+        Maximum size (in bytes) of the arrays used for a block of targets.
+
+    Returns
+    -------
+    Iterator
+        The results for the targets, in the order of the targets.
+    """
+    exposure = cast(Exposure, configuration.exposure)
+    if exposure.exposure_time is None:
+        raise ValueError("The configuration must define an exposure time.")
+    plan = ObservationPlan(configuration)
+    j_band_wavelengths, _ = galaxy_j_band_grid()
+    target_bytes = 8 * (
+        _ARRAYS_PER_TARGET * len(plan.pixel_wavelengths)
+        + _J_BAND_ARRAYS_PER_TARGET * len(j_band_wavelengths)
+    )
+    block_size = max(1, max_bytes // target_bytes)
+    return _catalogue_results(plan, iter(targets), wavelength, snr, block_size)
+
+
+def validate_target(target: Spectrum) -> None:
+    """
+    Check that a spectrum is supported as a target of a catalogue.
+
+    A ValueError is raised if the spectrum is not a blackbody, galaxy or emission line
+    spectrum, or if there is no template for a galaxy spectrum.
+
+    Parameters
+    ----------
+    target: Spectrum
+        The target.
+    """
+    if type(target) not in (Blackbody, EmissionLine, Galaxy):
+        raise ValueError(f"Unsupported spectrum type: {type(target)}")
+    if isinstance(target, Galaxy):
+        galaxy_template_bank().index(
+            target.age, target.galaxy_type, target.with_emission_lines
+        )
+
+
+def _catalogue_results(
+    plan: ObservationPlan,
+    targets: Iterator[Spectrum],
+    wavelength: Quantity,
+    snr: float,
+    block_size: int,
+) -> Iterator[CatalogueResult]:
+    configuration = plan.configuration
+    exposure = cast(Exposure, configuration.exposure)
+    detector = cast(Detector, configuration.detector)
+    grating = cast(Grating, configuration.telescope.grating)
+    e = exposure.exposures
+    t = cast(Quantity, exposure.exposure_time).to(u.s).value
+    r = plan.readout_noise
+
+    # Get the sky rates and the weights for interpolating at the reference wavelength.
+    bin_wavelengths, sky_rates = plan.sky_rates
+    bin_wavelength_values = bin_wavelengths.to(u.AA).value
+    sky_rate_values = sky_rates.to(u.photon / u.s).value
+    lower, fraction = _interpolation_weights(
+        bin_wavelength_values, wavelength.to(u.AA).value
+    )
+    rate_sky = (1 - fraction) * sky_rate_values[lower] + fraction * sky_rate_values[
+        lower + 1
+    ]
+
+    # Get the number of pixels per resolution element and the bins to check for
+    # saturation.
+    grating_angle = grating.grating_angle.to(u.deg).value
+    grating_constant = grating.grating_constant.to(u.AA).value
+    binning = binning_factor(
+        float(kernels.wavelength_resolution_element(grating_angle, grating_constant)),
+        float(kernels.pixel_wavelength_range(grating_angle, grating_constant)),
+    )
+    in_range = (bin_wavelength_values >= get_minimum_wavelength().to(u.AA).value) & (
+        bin_wavelength_values <= get_maximum_wavelength().to(u.AA).value
+    )
+    max_sky_pixel_electrons = np.max(sky_rate_values[in_range]) * t / binning
+
+    index = 0
+    while block := list(itertools.islice(targets, block_size)):
+        flux_values, pixel_flux_values = _flux_values(block, plan.pixel_wavelengths)
+        _, rates = plan.source_rate_values(flux_values, pixel_flux_values)
+
+        # Calculate the SNR and required exposure time at the reference wavelength.
+        rate_source = (1 - fraction) * rates[:, lower] + fraction * rates[:, lower + 1]
+        snr_values = kernels.snr(rate_source, rate_sky, e, t, r)
+        exposure_times = kernels.exposure_times(snr, rate_source, rate_sky, e, r)
+
+        # Check for saturation.
+        pixel_electrons = (rates[:, in_range] + sky_rate_values[in_range]) * t / binning
+        saturated = np.max(pixel_electrons, axis=-1) > detector.full_well
+        if max_sky_pixel_electrons > detector.full_well:
+            saturated[:] = True
+
+        for i in range(len(block)):
+            yield CatalogueResult(
+                index=index,
+                snr=float(snr_values[i]),
+                exposure_time=exposure_times[i] * u.s,
+                saturated=bool(saturated[i]),
+            )
+            index += 1
+
+
+def _flux_values(
+    targets: list[Spectrum], wavelengths: Quantity
+) -> tuple[np.ndarray, np.ndarray]:
+    # Returns the flux densities (in PHOTLAM) of the targets at the given pixel
+    # wavelengths and the pixel fluxes (in PHOTLAM * A) of the targets. Emission lines
+    # only have pixel fluxes, and all other targets only have flux densities.
+    for s in targets:
+        validate_target(s)
+
+    flux_values = np.zeros((len(targets), len(wavelengths)))
+    pixel_flux_values = np.zeros((len(targets), len(wavelengths)))
+
+    blackbodies = [i for i, s in enumerate(targets) if type(s) is Blackbody]
+    if blackbodies:
+        flux_values[blackbodies] = blackbody_fluxes(
+            temperatures=u.Quantity(
+                [cast(Blackbody, targets[i]).temperature for i in blackbodies]
+            ),
+            magnitudes=[cast(Blackbody, targets[i]).magnitude for i in blackbodies],
+            wavelengths=wavelengths,
+        )
+
+    galaxies = [i for i, s in enumerate(targets) if type(s) is Galaxy]
+    if galaxies:
+        bank = galaxy_template_bank()
+        selected = [cast(Galaxy, targets[i]) for i in galaxies]
+        flux_values[galaxies] = galaxy_fluxes(
+            indices=[
+                bank.index(g.age, g.galaxy_type, g.with_emission_lines)
+                for g in selected
+            ],
+            redshifts=[g.redshift for g in selected],
+            magnitudes=[g.magnitude for g in selected],
+            wavelengths=wavelengths,
+        )
+
+    lines = [i for i, s in enumerate(targets) if type(s) is EmissionLine]
+    if lines:
+        pixel_flux_values[lines] = emission_lines_pixel_fluxes(
+            [cast(EmissionLine, targets[i]) for i in lines], wavelengths
+        )
+
+    return flux_values, pixel_flux_values
+
+
+def _interpolation_weights(x: np.ndarray, x0: float) -> tuple[int, float]:
+    # Returns the index i and the weight w for linearly interpolating values y given
+    # at the equidistant, ascending values x at x0, so that the interpolated value is
+    # (1 - w) * y[i] + w * y[i + 1]. As for np.interp, the boundary values are used
+    # outside the range of x.
+    lower = min(max(int(math.floor((x0 - x[0]) / (x[1] - x[0]))), 0), len(x) - 2)
+    fraction = min(max((x0 - x[lower]) / (x[lower + 1] - x[lower]), 0), 1)
+    return lower, fraction
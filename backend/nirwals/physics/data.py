@@ -0,0 +1,445 @@
+"""Access to the instrument data files."""
+
+import dataclasses
+import json
+import os
+import pathlib
+import struct
+import tempfile
+import threading
+from typing import Tuple, Any
+
+import numpy as np
+from astropy import units as u
+from astropy.units import Quantity, Unit
+
+from constants import get_file_base_dir
+from nirwals.physics.utils import read_from_file
+
+
+BUNDLE_FILENAME = "curves.bundle"
+"""
+Name of the curve bundle file in the data directory.
+"""
+
+MANIFEST_FILENAME = "manifest.json"
+"""
+Name of the manifest file created by the numpyfy.py script in the data directory.
+"""
+
+MANIFEST_VERSION = 1
+"""
+Version of the manifest file format.
+"""
+
+UNVERSIONED_DATA = "unversioned"
+"""
+Data version used if there is no manifest file.
+"""
+
+_BUNDLE_MAGIC = b"NIRWBNDL"
+
+_BUNDLE_VERSION = 1
+
+_BUNDLE_ALIGNMENT = 4096
+
+_BUNDLE_DTYPE = "<f8"
+
+
+def build_bundle(
+    base_dir: pathlib.Path, bundle_path: pathlib.Path | None = None
+) -> pathlib.Path:
+    """
+    Pack all .npz data files in a directory into a single curve bundle.
+
+    The directory and its subdirectories are searched for .npz files, and each file
+    is read with the read_from_file function, so that the bundled arrays include the
+    boundary extensions described there. The arrays are stored uncompressed as
+    little-endian 64-bit floats, and each array starts at a multiple of 4096 bytes.
+    This allows the CurveBundle class to memory-map them without copying.
+
+    The bundle starts with an 8 byte magic string, followed by the length of the
+    index as an unsigned 64-bit little-endian integer and the index itself, which is
+    a UTF-8 encoded JSON object. The index maps the curve names (the path of the
+    .npz file relative to the base directory, such as "filters/lwbf_transmission.npz")
+    to the offset, length, dtype and unit of the curve's "x" and "y" arrays. Offsets
+    are relative to the start of the data section, which is the first multiple of
+    4096 bytes after the index. The unit of the y array is not known when the bundle
+    is built, and it is recorded as null.
+
+    The bundle is written to a temporary file first, which then replaces any
+    existing bundle.
+
+    Parameters
+    ----------
+    base_dir: Path
+        Directory containing the .npz files.
+    bundle_path: Path, optional
+        Path of the bundle file. By default, the bundle is created in the base
+        directory.
+
+    Returns
+    -------
+    Path
+        The path of the bundle file.
+    """
+    if bundle_path is None:
+        bundle_path = base_dir / BUNDLE_FILENAME
+
+    # Collect the curves and their position in the data section.
+    arrays: list[tuple[int, np.ndarray]] = []
+    curves: dict[str, Any] = {}
+    offset = 0
+    for npz_file in sorted(base_dir.glob("**/*.npz")):
+        with open(npz_file, "rb") as f:
+            wavelengths, values = read_from_file(f)
+        entry: dict[str, Any] = {}
+        for array_name, array, unit in (
+            ("x", wavelengths.to(u.AA).value, "Angstrom"),
+            ("y", values.value, None),
+        ):
+            data = np.ascontiguousarray(array, dtype=_BUNDLE_DTYPE)
+            entry[array_name] = {
+                "offset": offset,
+                "length": len(data),
+                "dtype": _BUNDLE_DTYPE,
+                "unit": unit,
+            }
+            arrays.append((offset, data))
+            offset = _align(offset + data.nbytes)
+        curves[npz_file.relative_to(base_dir).as_posix()] = entry
+
+    index = json.dumps({"version": _BUNDLE_VERSION, "curves": curves}).encode("utf-8")
+    header = _BUNDLE_MAGIC + struct.pack("<Q", len(index)) + index
+    data_start = _align(len(header))
+
+    # Write the bundle to a temporary file and replace the existing one, so that
+    # readers never see a partially written bundle.
+    with tempfile.NamedTemporaryFile(
+        dir=bundle_path.parent, prefix=bundle_path.name, delete=False
+    ) as bundle_file:
+        bundle_file.write(header)
+        for array_offset, array in arrays:
+            bundle_file.seek(data_start + array_offset)
+            bundle_file.write(array.tobytes())
+        bundle_file.truncate(data_start + offset)
+    os.chmod(bundle_file.name, 0o644)
+    os.replace(bundle_file.name, bundle_path)
+
+    return bundle_path
+
+
+def _align(n: int) -> int:
+    return -(-n // _BUNDLE_ALIGNMENT) * _BUNDLE_ALIGNMENT
+
+
+class CurveBundle:
+    """
+    A memory-mapped curve bundle, as created by the build_bundle function.
+
+    The arrays returned by the bundle are read-only views of the memory-mapped file,
+    so that processes using the same bundle share the same physical memory pages.
+
+    Parameters
+    ----------
+    path: Path
+        Path of the bundle file.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        with open(path, "rb") as f:
+            magic = f.read(len(_BUNDLE_MAGIC))
+            if magic != _BUNDLE_MAGIC:
+                raise ValueError(f"Not a curve bundle: {path}")
+            (index_length,) = struct.unpack("<Q", f.read(8))
+            index = json.loads(f.read(index_length).decode("utf-8"))
+        if index["version"] != _BUNDLE_VERSION:
+            raise ValueError(f"Unsupported curve bundle version: {index['version']}")
+
+        self.path = path
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        self._curves: dict[str, Any] = index["curves"]
+        self._data_start = _align(len(_BUNDLE_MAGIC) + 8 + index_length)
+        self._memmap = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._curves
+
+    @property
+    def names(self) -> list[str]:
+        """list of str: The names of the bundled curves."""
+        return list(self._curves.keys())
+
+    def curve(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the wavelengths (in Angstrom) and values of a bundled curve.
+
+        Parameters
+        ----------
+        name: str
+            Curve name, i.e. the path of the original .npz file relative to the data
+            directory.
+
+        Returns
+        -------
+        tuple of np.ndarray
+            The wavelengths and values.
+        """
+        entry = self._curves[name]
+        return self._array(entry["x"]), self._array(entry["y"])
+
+    def _array(self, array_entry: dict[str, Any]) -> np.ndarray:
+        dtype = np.dtype(array_entry["dtype"])
+        start = self._data_start + array_entry["offset"]
+        end = start + array_entry["length"] * dtype.itemsize
+        return self._memmap[start:end].view(dtype)
+
+
+@dataclasses.dataclass(frozen=True)
+class CurveCacheInfo:
+    """
+    Statistics for a curve registry.
+
+    Parameters
+    ----------
+    hits: int
+        Number of requests which were served from the cache.
+    misses: int
+        Number of requests which required reading a file.
+    size: int
+        Number of curves currently in the cache.
+    """
+
+    hits: int
+    misses: int
+    size: int
+
+
+@dataclasses.dataclass(frozen=True)
+class _CurveEntry:
+    mtime_ns: int
+    file_size: int
+    wavelengths: Quantity
+    values: Quantity
+
+
+class CurveRegistry:
+    """
+    A thread-safe cache for data curves read from .npz files.
+
+    Curves are read with the read_from_file function and are cached by file path and
+    unit. Whenever a curve is requested, the modification time and size of the file
+    are compared with those at the time the file was read, and the file is read again
+    if either of them has changed.
+
+    If a curve bundle (see the build_bundle function) is given, curves are taken from
+    the bundle rather than read from their .npz file, unless the bundle does not
+    include the curve or the .npz file has been modified after the bundle was
+    created.
+
+    The wavelength and value arrays returned by the registry are shared between all
+    callers and are therefore read-only. You must copy them if you need to modify
+    them. Note that this includes passing them as lookup table to synphot's Empirical1D
+    model, which sets negative values to zero in place.
+
+    Parameters
+    ----------
+    bundle_path: Path, optional
+        Path of the curve bundle. The bundle is ignored if it does not exist.
+    """
+
+    def __init__(self, bundle_path: pathlib.Path | None = None) -> None:
+        self._lock = threading.Lock()
+        self._curves: dict[tuple[str, Unit], _CurveEntry] = {}
+        self._hits = 0
+        self._misses = 0
+        self._bundle_path = bundle_path
+        self._bundle: CurveBundle | None = None
+
+    def get(
+        self, path: pathlib.Path | str, unit: Unit = u.dimensionless_unscaled
+    ) -> Tuple[Quantity, Quantity]:
+        """
+        Return the wavelengths and values for a data file.
+
+        Parameters
+        ----------
+        path: Path or str
+            Path of the data file, in .npz format.
+        unit: Unit, optional
+            The unit to use for the values in the file's y array.
+
+        Returns
+        -------
+        tuple of Quantity
+            The (read-only) wavelengths and corresponding values.
+        """
+        resolved_path = str(pathlib.Path(path).resolve())
+        key = (resolved_path, unit)
+        with self._lock:
+            stat = os.stat(resolved_path)
+            entry = self._curves.get(key)
+            if (
+                entry is not None
+                and entry.mtime_ns == stat.st_mtime_ns
+                and entry.file_size == stat.st_size
+            ):
+                self._hits += 1
+                return entry.wavelengths, entry.values
+
+            self._misses += 1
+            wavelengths, values = self._read(
+                pathlib.Path(resolved_path), stat.st_mtime_ns, unit
+            )
+            wavelengths.flags.writeable = False
+            values.flags.writeable = False
+            self._curves[key] = _CurveEntry(
+                mtime_ns=stat.st_mtime_ns,
+                file_size=stat.st_size,
+                wavelengths=wavelengths,
+                values=values,
+            )
+            return wavelengths, values
+
+    def _read(
+        self, path: pathlib.Path, mtime_ns: int, unit: Unit
+    ) -> Tuple[Quantity, Quantity]:
+        # Use the bundle if it includes the curve and is not outdated.
+        bundle = self._current_bundle()
+        if bundle is not None and bundle.mtime_ns >= mtime_ns:
+            bundle_dir = bundle.path.parent.resolve()
+            if path.is_relative_to(bundle_dir):
+                name = path.relative_to(bundle_dir).as_posix()
+                if name in bundle:
+                    x, y = bundle.curve(name)
+                    return (
+                        u.Quantity(x, u.AA, copy=False),
+                        u.Quantity(y, unit, copy=False),
+                    )
+
+        with open(path, "rb") as f:
+            return read_from_file(f, unit)
+
+    def _current_bundle(self) -> CurveBundle | None:
+        if self._bundle_path is None:
+            return None
+        try:
+            mtime_ns = os.stat(self._bundle_path).st_mtime_ns
+        except FileNotFoundError:
+            self._bundle = None
+            return None
+        if self._bundle is None or self._bundle.mtime_ns != mtime_ns:
+            self._bundle = CurveBundle(self._bundle_path)
+        return self._bundle
+
+    def cache_info(self) -> CurveCacheInfo:
+        """
+        Return the hit and miss counts and the number of cached curves.
+
+        Returns
+        -------
+        CurveCacheInfo
+            The cache statistics.
+        """
+        with self._lock:
+            return CurveCacheInfo(
+                hits=self._hits, misses=self._misses, size=len(self._curves)
+            )
+
+    def clear(self) -> None:
+        """Remove all curves from the cache and reset the statistics."""
+        with self._lock:
+            self._curves.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+_curve_registry = CurveRegistry(bundle_path=get_file_base_dir() / BUNDLE_FILENAME)
+
+
+def read_curve(
+    path: pathlib.Path | str, unit: Unit = u.dimensionless_unscaled
+) -> Tuple[Quantity, Quantity]:
+    """
+    Return the wavelengths and values for a data file, using the process-wide cache.
+
+    See the read_from_file function for details about the file format and the
+    returned arrays. The returned arrays are read-only.
+
+    Parameters
+    ----------
+    path: Path or str
+        Path of the data file, in .npz format.
+    unit: Unit, optional
+        The unit to use for the values in the file's y array.
+
+    Returns
+    -------
+    tuple of Quantity
+        The wavelengths and corresponding values.
+    """
+    return _curve_registry.get(path, unit)
+
+
+def curve_cache_info() -> CurveCacheInfo:
+    """
+    Return the statistics for the process-wide curve cache.
+
+    Returns
+    -------
+    CurveCacheInfo
+        The cache statistics.
+    """
+    return _curve_registry.cache_info()
+
+
+def clear_curve_cache() -> None:
+    """Clear the process-wide curve cache."""
+    _curve_registry.clear()
+
+
+_data_versions: dict[str, tuple[int, str]] = {}
+
+_data_versions_lock = threading.Lock()
+
+
+def data_version(base_dir: pathlib.Path | None = None) -> str:
+    """
+    Return the version of the data files.
+
+    The version is read from the manifest file created by the numpyfy.py script, and
+    it changes whenever any of the data files created by that script changes. It may
+    thus be used as part of cache keys. If there is no manifest file, the value of
+    UNVERSIONED_DATA is returned.
+
+    The manifest is only read again if its modification time has changed.
+
+    Parameters
+    ----------
+    base_dir: Path, optional
+        The data directory. By default, the directory returned by get_file_base_dir is
+        used.
+
+    Returns
+    -------
+    str
+        The data version.
+    """
+    if base_dir is None:
+        base_dir = get_file_base_dir()
+    path = str((base_dir / MANIFEST_FILENAME).resolve())
+    with _data_versions_lock:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return UNVERSIONED_DATA
+        cached = _data_versions.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        with open(path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version: {manifest.get('version')}")
+        version = str(manifest["data_version"])
+        _data_versions[path] = (mtime_ns, version)
+        return version
@@ -1,24 +1,20 @@
 """Functions for signal-to-noise ratio calculations."""
 
+import dataclasses
+import functools
 import math
 from typing import cast
 
 import numpy as np
 from astropy import units as u
 from astropy.units import Quantity
-from synphot import Observation, units, SpectralElement, Empirical1D
-
-from constants import (
-    FIBRE_RADIUS,
-    TELESCOPE_FOCAL_LENGTH,
-    COLLIMATOR_FOCAL_LENGTH,
-    CCD_PIXEL_SIZE,
-    CAMERA_FOCAL_LENGTH,
-    get_minimum_wavelength,
-    get_maximum_wavelength,
-)
+from numpy.typing import ArrayLike
+from synphot import Observation, SpectralElement, units
+
 from nirwals.configuration import (
+    Blackbody,
     Configuration,
+    Galaxy,
     Filter,
     Source,
     Grating,
@@ -27,16 +23,21 @@ from nirwals.configuration import (
     Detector,
     SNR,
 )
+from nirwals.physics import kernels
 from nirwals.physics.bandpass import (
     atmospheric_transmission,
-    telescope_throughput,
-    fibre_throughput,
-    filter_transmission,
-    grating_efficiency,
-    detector_quantum_efficiency,
+    compiled_throughput,
+    instrument_bandpass,
 )
-from nirwals.physics.spectrum import sky_spectrum, source_spectrum
-from nirwals.physics.utils import shift
+from nirwals.physics.kernels import Rebinner
+from nirwals.physics.spectrum import (
+    composite_source_spectrum,
+    sky_spectrum,
+    source_spectrum,
+)
+
+RATE_UNIT = units.PHOTLAM * u.AA * u.cm**2
+"""Unit of detection rates, i.e. photons per second."""
 
 
 def source_observation(configuration: Configuration) -> Observation:
@@ -73,26 +74,10 @@ def source_observation(configuration: Configuration) -> Observation:
     """
     source = source_spectrum(configuration=configuration)
     grating = cast(Grating, configuration.telescope.grating)
-    configuration_source = cast(Source, configuration.source)
-    bandpass = (
-        atmospheric_transmission(zenith_distance=configuration.zenith_distance)
-        * telescope_throughput()
-        * fibre_throughput(
-            seeing=configuration.seeing,
-            source_extension=configuration_source.extension,
-            zenith_distance=configuration.zenith_distance,
-        )
-        * filter_transmission(filter_name=cast(Filter, configuration.telescope.filter))
-        * grating_efficiency(
-            grating_angle=grating.grating_angle,
-            grating_name=grating.name,
-        )
-        * detector_quantum_efficiency()
-    )
     return Observation(
         source,
-        bandpass,
-        binset=_binset(
+        source_bandpass(configuration),
+        binset=binset(
             grating_angle=grating.grating_angle,
             grating_constant=grating.grating_constant,
         ),
@@ -100,6 +85,38 @@ def source_observation(configuration: Configuration) -> Observation:
     )
 
 
+def source_bandpass(configuration: Configuration) -> SpectralElement:
+    """
+    Return the product of all the throughputs applied to the source flux.
+
+    This is the bandpass of the source observation, i.e. the product of the
+    atmospheric transmission and the instrument bandpass for the source extension.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        Simulator configuration.
+
+    Returns
+    -------
+    SpectralElement
+        The bandpass for the source.
+    """
+    grating = cast(Grating, configuration.telescope.grating)
+    source = cast(Source, configuration.source)
+    return compiled_throughput(
+        atmospheric_transmission(zenith_distance=configuration.zenith_distance),
+        instrument_bandpass(
+            filter_name=cast(Filter, configuration.telescope.filter),
+            grating_name=grating.name,
+            grating_angle=grating.grating_angle,
+            seeing=configuration.seeing,
+            zenith_distance=configuration.zenith_distance,
+            source_extension=source.extension,
+        ),
+    )
+
+
 def sky_observation(configuration: Configuration) -> Observation:
     """
     Returns the sky background observation for a given configuration.
@@ -137,27 +154,99 @@ def sky_observation(configuration: Configuration) -> Observation:
     """
     sky = sky_spectrum()
     grating = cast(Grating, configuration.telescope.grating)
-    bandpass = (
-        telescope_throughput()
-        * fibre_throughput(
-            seeing=configuration.seeing,
-            source_extension="Diffuse",
-            zenith_distance=configuration.zenith_distance,
-        )
-        * filter_transmission(filter_name=cast(Filter, configuration.telescope.filter))
-        * grating_efficiency(
-            grating_angle=grating.grating_angle,
-            grating_name=grating.name,
-        )
-        * detector_quantum_efficiency()
-    )
     return Observation(
         sky,
-        bandpass,
-        binset=_binset(grating.grating_angle, grating.grating_constant),
+        sky_bandpass(configuration),
+        binset=binset(grating.grating_angle, grating.grating_constant),
+    )
+
+
+def sky_bandpass(configuration: Configuration) -> SpectralElement:
+    """
+    Return the product of all the throughputs applied to the sky background.
+
+    This is the bandpass of the sky observation, i.e. the instrument bandpass for a
+    diffuse source. No atmospheric transmission is included.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        Simulator configuration.
+
+    Returns
+    -------
+    SpectralElement
+        The bandpass for the sky background.
+    """
+    grating = cast(Grating, configuration.telescope.grating)
+    return instrument_bandpass(
+        filter_name=cast(Filter, configuration.telescope.filter),
+        grating_name=grating.name,
+        grating_angle=grating.grating_angle,
+        seeing=configuration.seeing,
+        zenith_distance=configuration.zenith_distance,
+        source_extension="Diffuse",
     )
 
 
+def source_fluxes(
+    configuration: Configuration, wavelengths: Quantity
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the detected source flux at pixel wavelengths.
+
+    This is the native counterpart of the source_observation function: The source
+    spectrum (see the composite_source_spectrum function) is evaluated at the pixel
+    wavelengths and multiplied with the same throughputs as for the source
+    observation. Emission lines are not sampled but integrated over the pixels, so
+    they are returned as pixel fluxes.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        Simulator configuration.
+    wavelengths: Quantity
+        Equidistant pixel midpoints.
+
+    Returns
+    -------
+    tuple
+        The detected flux densities (in PHOTLAM) of all components other than the
+        emission lines, and the detected pixel fluxes (in PHOTLAM * Angstrom) of the
+        emission lines.
+    """
+    source = composite_source_spectrum(configuration)
+    throughputs = source_bandpass(configuration)(wavelengths).value
+    return (
+        source.continuum(wavelengths) * throughputs,
+        source.line_pixel_fluxes(wavelengths) * throughputs,
+    )
+
+
+def sky_fluxes(configuration: Configuration, wavelengths: Quantity) -> np.ndarray:
+    """
+    Return the detected sky background flux densities at pixel wavelengths.
+
+    This is the native counterpart of the sky_observation function: The sky
+    background is evaluated at the pixel wavelengths and multiplied with the same
+    throughputs as for the sky observation.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        Simulator configuration.
+    wavelengths: Quantity
+        Pixel wavelengths.
+
+    Returns
+    -------
+    np.ndarray
+        The detected flux densities (in PHOTLAM).
+    """
+    sky = sky_spectrum()(wavelengths, flux_unit=units.PHOTLAM).value
+    return cast(np.ndarray, sky * sky_bandpass(configuration)(wavelengths).value)
+
+
 def wavelength_resolution_element(
     grating_angle: u.deg, grating_constant: u.micron
 ) -> u.AA:
@@ -176,15 +265,10 @@ def wavelength_resolution_element(
     Quantity
         The wavelength resolution element.
     """
-    # Angle of a fibre on the sky, in radians
-    phi_fibre = 2 * FIBRE_RADIUS.to(u.rad).value
-
-    return (
-        phi_fibre
-        * (TELESCOPE_FOCAL_LENGTH / COLLIMATOR_FOCAL_LENGTH)
-        * grating_constant
-        * math.cos(grating_angle.to(u.rad).value)
+    resolution_element = kernels.wavelength_resolution_element(
+        grating_angle.to(u.deg).value, grating_constant.to(u.AA).value
     )
+    return resolution_element * u.AA
 
 
 def pixel_wavelength_range(grating_angle: u.deg, grating_constant: u.micron) -> u.AA:
@@ -203,12 +287,10 @@ def pixel_wavelength_range(grating_angle: u.deg, grating_constant: u.micron) ->
     Quantity
         The wavelength range covered by a single pixel.
     """
-    return (
-        grating_constant
-        * CCD_PIXEL_SIZE
-        * math.cos(grating_angle.to(u.rad).value)
-        / CAMERA_FOCAL_LENGTH
+    pixel_width = kernels.pixel_wavelength_range(
+        grating_angle.to(u.deg).value, grating_constant.to(u.AA).value
     )
+    return pixel_width * u.AA
 
 
 def detection_rates(
@@ -259,49 +341,18 @@ def detection_rates(
     wavelengths = observation.binset
     wavelength_values = wavelengths.to(u.AA).value
     flux_values = observation(wavelengths).to(units.PHOTLAM).value
-    delta_lambda = wavelengths[1] - wavelengths[0]
-    delta_lambda_value = delta_lambda.to(u.AA).value
-    pixel_flux_values = _bin_integrals(wavelength_values, flux_values)
-
-    # Find the binning so that each bin covers the wavelength resolution element as
-    # tightly as possible.
-    binning = 1
     wre = wavelength_resolution_element(
         grating_angle=grating_angle, grating_constant=grating_constant
     )
-    while binning * delta_lambda < wre:
-        binning += 1
-
-    # Get the wavelengths for the bin wavelengths and the fluxes in the bins.
-    bin_wavelength_values: list[float] = []
-    bin_flux_values: list[float] = []
-    pixel = 0
-    while pixel < len(wavelengths):
-        # Get the wavelength in the middle of the bin. The current pixel is the first in
-        # the bin and the distance between the midpoints of the bin's outer pixels is
-        # the binsize less one pixel.
-        bin_wavelength_value = (
-            wavelength_values[0] + (pixel + 0.5 * (binning - 1)) * delta_lambda_value
-        )
-        bin_wavelength_values.append(bin_wavelength_value)
-
-        # Add up the fluxes of the pixels in the bin. If we are running out of pixels
-        # for the last bin, we assume a flux of 0 for the "missing" pixels.
-        bin_flux_value = 0
-        for _ in range(binning):
-            pixel_flux = (
-                pixel_flux_values[pixel] if pixel < len(pixel_flux_values) else 0
-            )
-            bin_flux_value += pixel_flux
-            pixel += 1
-        bin_flux_values.append(bin_flux_value)
-
-    # Add the units, and convert fluxes to rates.
-    bin_wavelengths = np.array(bin_wavelength_values) * u.AA
-    rates = np.array(bin_flux_values) * area * u.AA * units.PHOTLAM
+    bin_wavelength_values, rate_values = kernels.detection_rates(
+        wavelength_values,
+        flux_values,
+        wre.to(u.AA).value,
+        area.to(u.cm**2).value,
+    )
 
-    # Returns wavelengths and rates.
-    return bin_wavelengths, rates
+    # Add the units and return the wavelengths and rates.
+    return bin_wavelength_values * u.AA, rate_values * RATE_UNIT
 
 
 def electrons(
@@ -346,7 +397,10 @@ def electrons(
         grating_constant=grating_constant,
         observation=observation,
     )
-    return wavelengths, exposures * exposure_time * rates
+    electron_values = kernels.electrons(
+        _rate_values(rates), exposures, exposure_time.to(u.s).value
+    )
+    return wavelengths, electron_values * u.photon
 
 
 def source_electrons(configuration: Configuration) -> tuple[Quantity, Quantity]:
@@ -368,20 +422,7 @@ def source_electrons(configuration: Configuration) -> tuple[Quantity, Quantity]:
         A tuple with an array of wavelengths and an array of the corresponding electron
         counts.
     """
-    # Collect the required parameters.
-    area = configuration.telescope.effective_mirror_area
-    exposure = cast(Exposure, configuration.exposure)
-    grating = cast(Grating, configuration.telescope.grating)
-    observation = source_observation(configuration)
-
-    return electrons(
-        area=area,
-        exposures=exposure.exposures,
-        exposure_time=exposure.exposure_time,
-        grating_angle=grating.grating_angle,
-        grating_constant=grating.grating_constant,
-        observation=observation,
-    )
+    return ObservationPlan(configuration).source_electrons()
 
 
 def readout_noise(
@@ -411,104 +452,474 @@ def readout_noise(
             return read_noise**2 / (samplings / 12)
 
 
-def _binset(grating_angle: u.deg, grating_constant: Quantity) -> Quantity:
-    # Get the step size for the bin set.
-    delta_lambda = pixel_wavelength_range(grating_angle, grating_constant)
+def binset(grating_angle: u.deg, grating_constant: Quantity) -> Quantity:
+    """
+    Return the pixel wavelengths used as the bin set of observations.
 
-    # Calculate the bin set values in Angstrom
-    binset_start_value = get_minimum_wavelength().to(u.AA).value - 100
-    binset_end_value = get_maximum_wavelength().to(u.AA).value + 100.1
-    delta_lambda_value = delta_lambda.to(u.AA).value
-    binset_values = np.arange(binset_start_value, binset_end_value, delta_lambda_value)
+    The bin set covers the wavelength range from lambda_min - 100 A to at least
+    lambda_max + 100 A, where lambda_min and lambda_max are the minimum and maximum
+    requested wavelengths, and its spacing is the wavelength range covered by a single
+    pixel.
+
+    Parameters
+    ----------
+    grating_angle: Angle
+        The grating angle.
+    grating_constant: Quantity
+        The grating constant, i.e. the groove spacing.
 
-    # Return the bin set.
-    return binset_values * u.AA
+    Returns
+    -------
+    Quantity
+        The bin set.
+    """
+    delta_lambda = pixel_wavelength_range(grating_angle, grating_constant)
+    return kernels.binset(delta_lambda.to(u.AA).value) * u.AA
 
 
-def _bin_integrals(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+class ObservationPlan:
     """
-    Calculate the integral per bin for given x and y values.
+    The detection rates for a configuration, and the quantities derived from them.
 
-    The given x values must be equidistant, i.e. x[k] - x[k - 1] must be the same for
-    all 1 < k < len(k). This is not checked, though. x[k] is the midpoint of the bin
-    [x[k] - dx/2, x[k] + dx/2], where dx is the distance between adjacent x values.
+    The source and sky detection rates are calculated when they are first needed,
+    and they are cached for the lifetime of the plan. The signal-to-noise ratio,
+    exposure time and electron counts are derived from the cached rates, so that the
+    rates are calculated only once, however many of these quantities are requested.
 
-    The given y values are assumed to be function values at the corresponding x value,
-    y[k] = f(x[k]).
+    The rates are calculated natively rather than with synphot Observation objects.
+    The detected flux densities are evaluated at the pixel wavelengths (see the
+    source_fluxes and sky_fluxes functions), and they are integrated over the pixels
+    and binned with a rebinner, which is created only once for the plan. This gives
+    the same rates as the detection_rates function for the source and sky
+    observations, but without the overhead of synphot's binning and tapering.
 
-    The function calculates the integral over f for each bin using trapezoidal
-    integration and returns the result. For the first and last bin the assumption is
-    made that f(x[0] - dx/2) = f(x[-1] + dx/2) = 0.
+    The exposure time and number of exposures are read from the configuration
+    whenever a derived quantity is requested, so that they may be changed after the
+    plan has been created. Other changes of the configuration are ignored once the
+    rates have been calculated.
 
     Parameters
     ----------
-    x: np.ndarray
-        Array of bin midpoints.
-    y: np.ndarray
-        Array of y values corresponding to the bin midpoints.
-
-    Returns
-    -------
-    np.ndarray
-        The integral value for each bin.
+    configuration: Configuration
+        Simulator configuration.
     """
 
-    # Sanity checks
-    if len(x) < 2:
-        raise ValueError("There must be at least two x values.")
-    if x.shape != y.shape:
-        raise ValueError("The shapes of x and y must be the same.")
+    def __init__(self, configuration: Configuration) -> None:
+        self.configuration = configuration
+
+    @functools.cached_property
+    def source_rates(self) -> tuple[Quantity, Quantity]:
+        """tuple: The wavelengths and detection rates for the source."""
+        flux_values, pixel_flux_values = source_fluxes(
+            self.configuration, self.pixel_wavelengths
+        )
+        return self._detection_rates(flux_values, pixel_flux_values)
+
+    @functools.cached_property
+    def sky_rates(self) -> tuple[Quantity, Quantity]:
+        """tuple: The wavelengths and detection rates for the sky background."""
+        return self._detection_rates(
+            sky_fluxes(self.configuration, self.pixel_wavelengths)
+        )
+
+    @functools.cached_property
+    def pixel_wavelengths(self) -> Quantity:
+        """Quantity: The pixel wavelengths, which are the bin set of observations."""
+        grating = cast(Grating, self.configuration.telescope.grating)
+        return binset(grating.grating_angle, grating.grating_constant)
+
+    @functools.cached_property
+    def source_throughputs(self) -> np.ndarray:
+        """np.ndarray: The throughput for the source at the pixel wavelengths."""
+        bandpass = source_bandpass(self.configuration)
+        return cast(np.ndarray, bandpass(self.pixel_wavelengths).value)
+
+    @functools.cached_property
+    def rebinner(self) -> Rebinner:
+        """Rebinner: The rebinner for the pixel wavelengths."""
+        grating = cast(Grating, self.configuration.telescope.grating)
+        resolution_element = wavelength_resolution_element(
+            grating_angle=grating.grating_angle,
+            grating_constant=grating.grating_constant,
+        )
+        return Rebinner(
+            self.pixel_wavelengths.to(u.AA).value, resolution_element.to(u.AA).value
+        )
+
+    @functools.cached_property
+    def readout_noise(self) -> float:
+        """float: The readout noise for a single exposure."""
+        detector = cast(Detector, self.configuration.detector)
+        return readout_noise(
+            read_noise=detector.read_noise,
+            samplings=detector.samplings,
+            sampling_mode=detector.sampling_mode,
+        )
+
+    def source_electrons(self) -> tuple[Quantity, Quantity]:
+        """
+        Return the number of electrons accumulated due to source photons.
+
+        Returns
+        -------
+        tuple[Quantity, Quantity]
+            A tuple with an array of wavelengths and an array of the corresponding
+            electron counts.
+        """
+        exposure = cast(Exposure, self.configuration.exposure)
+        exposure_time = cast(Quantity, exposure.exposure_time)
+        wavelengths, rates = self.source_rates
+        electron_values = kernels.electrons(
+            _rate_values(rates), exposure.exposures, exposure_time.to(u.s).value
+        )
+        return wavelengths, electron_values * u.photon
+
+    def snr(self) -> tuple[Quantity, Quantity]:
+        """
+        Return the signal-to-noise ratio as a function of wavelength.
+
+        Returns
+        -------
+        tuple
+            A tuple of wavelengths and corresponding signal-to-noise ratios.
+        """
+        exposure = cast(Exposure, self.configuration.exposure)
+        wavelengths, snr_values = self.snr_grid(
+            exposure_times=cast(Quantity, exposure.exposure_time),
+            exposures=exposure.exposures,
+        )
+        return wavelengths, snr_values[0, 0]
+
+    @u.quantity_input
+    def snr_grid(
+        self, exposure_times: u.s, exposures: ArrayLike
+    ) -> tuple[Quantity, Quantity]:
+        """
+        Return the signal-to-noise ratio for a grid of exposure times and exposures.
+
+        The signal-to-noise ratio is calculated for every combination of an exposure
+        time (per exposure) and a number of exposures.
+
+        Parameters
+        ----------
+        exposure_times: Quantity
+            Exposure time or one-dimensional array of exposure times per exposure.
+        exposures: array-like
+            Number or one-dimensional array of numbers of exposures.
+
+        Returns
+        -------
+        tuple
+            The wavelengths and an array of shape (number of exposure times, number of
+            exposures, number of wavelengths) with the corresponding signal-to-noise
+            ratios.
+        """
+        t = np.atleast_1d(exposure_times.to(u.s).value)
+        e = np.atleast_1d(np.asarray(exposures))
+        if t.ndim != 1 or e.ndim != 1:
+            raise ValueError(
+                "The exposure times and exposures must be scalars or one-dimensional."
+            )
+        wavelengths, rates_source = self.source_rates
+        _, rates_sky = self.sky_rates
+        r = self.readout_noise
+
+        # Calculate the SNR, with the axes for exposure time, number of exposures and
+        # wavelength.
+        t = t[:, np.newaxis, np.newaxis]
+        e = e[np.newaxis, :, np.newaxis]
+        snr_values = kernels.snr(
+            _rate_values(rates_source), _rate_values(rates_sky), e, t, r
+        )
+
+        # Return the wavelengths and SNR values.
+        return wavelengths, snr_values * u.dimensionless_unscaled
+
+    def exposure_time(self) -> tuple[Quantity, Quantity]:
+        """
+        Calculate the exposure time as a function of the signal-to-noise ratio.
+
+        See the exposure_time function for details.
+
+        Returns
+        -------
+        tuple
+            A tuple of 101 signal-to-noise ratios and corresponding exposure times.
+        """
+        exposure = cast(Exposure, self.configuration.exposure)
+        e = exposure.exposures
+        snr_ = cast(SNR, exposure.snr)
+        r = self.readout_noise
+
+        # Define the SNR values for which to calculate the exposure time.
+        sigma = np.linspace(0, 2 * float(snr_.snr), 101)
+
+        # Find the source and sky rate for the requested wavelength.
+        rate_source, rate_sky = self._rates_at(snr_.wavelength)
+
+        t = kernels.exposure_times(sigma, rate_source, rate_sky, e, r)
+
+        # Add units and return the result.
+        return sigma * u.dimensionless_unscaled, t * u.s
+
+    def exposure_time_map(
+        self, snrs: ArrayLike, exposures: int | None = None
+    ) -> tuple[Quantity, Quantity]:
+        """
+        Return the exposure time required for target signal-to-noise ratios.
+
+        The exposure time (per exposure) is calculated for every combination of a
+        target signal-to-noise ratio and a wavelength bin. It is infinite for bins
+        without source flux, unless the target signal-to-noise ratio is 0.
+
+        Parameters
+        ----------
+        snrs: array-like
+            Target signal-to-noise ratio or one-dimensional array of target
+            signal-to-noise ratios.
+        exposures: int, optional
+            Number of exposures. By default the number of exposures defined in the
+            configuration is used.
+
+        Returns
+        -------
+        tuple
+            The wavelengths and an array of shape (number of signal-to-noise ratios,
+            number of wavelengths) with the corresponding exposure times.
+        """
+        sigma = np.atleast_1d(np.asarray(snrs, dtype=float))
+        if sigma.ndim != 1:
+            raise ValueError(
+                "The signal-to-noise ratios must be a scalar or one-dimensional."
+            )
+        if exposures is None:
+            exposures = cast(Exposure, self.configuration.exposure).exposures
+        wavelengths, rates_source = self.source_rates
+        _, rates_sky = self.sky_rates
+
+        t = kernels.exposure_times(
+            sigma[:, np.newaxis],
+            _rate_values(rates_source),
+            _rate_values(rates_sky),
+            exposures,
+            self.readout_noise,
+        )
+
+        return wavelengths, t * u.s
+
+    @u.quantity_input
+    def snr_for_magnitudes(self, magnitudes: ArrayLike, wavelength: u.AA) -> Quantity:
+        """
+        Return the signal-to-noise ratio at a wavelength for source magnitudes.
+
+        The source must consist of a single spectrum normalised to a magnitude, i.e. a
+        blackbody or galaxy spectrum. As the source rates are proportional to
+        10^(-0.4 m) for such a source, the rates for any magnitude m follow from those
+        for the magnitude defined in the configuration, and no further observation is
+        needed.
+
+        The exposure time and number of exposures defined in the configuration are
+        used.
+
+        Parameters
+        ----------
+        magnitudes: array-like
+            Magnitude or array of magnitudes.
+        wavelength: Quantity
+            Wavelength for which to calculate the signal-to-noise ratio.
+
+        Returns
+        -------
+        Quantity
+            The signal-to-noise ratios, with the same shape as the magnitudes.
+        """
+        e, t = self._exposure_values()
+        rate_source, rate_sky = self._rates_at(wavelength)
+        scale = 10 ** (-0.4 * (np.asarray(magnitudes) - self.source_magnitude))
+        snr_values = kernels.snr(
+            scale * rate_source, rate_sky, e, t, self.readout_noise
+        )
+        return snr_values * u.dimensionless_unscaled
+
+    @u.quantity_input
+    def limiting_magnitude(self, snr: float, wavelength: u.AA) -> float:
+        """
+        Return the faintest magnitude for which a signal-to-noise ratio is reached.
+
+        The limiting magnitude is calculated for the exposure time and number of
+        exposures defined in the configuration. See the snr_for_magnitudes method for
+        the requirements on the source.
+
+        Parameters
+        ----------
+        snr: float
+            The signal-to-noise ratio.
+        wavelength: Quantity
+            Wavelength for which to calculate the limiting magnitude.
+
+        Returns
+        -------
+        float
+            The limiting magnitude.
+        """
+        if snr <= 0:
+            raise ValueError("The signal-to-noise ratio must be positive.")
+        e, t = self._exposure_values()
+        rate_source, rate_sky = self._rates_at(wavelength)
+        if rate_source <= 0:
+            raise ValueError("There is no source flux at the wavelength.")
+
+        # Solve sigma = S / sqrt(S + B + R) for the number S of source counts, where B
+        # is the number of sky counts and R is the total readout noise.
+        sigma_squared = float(snr) ** 2
+        noise = rate_sky * e * t + self.readout_noise * e
+        source_counts = 0.5 * (
+            sigma_squared + math.sqrt(sigma_squared**2 + 4 * sigma_squared * noise)
+        )
 
-    dx = x[1] - x[0]
-    n = np.concatenate((np.array([0]), y, np.array([0])))
-    n_shifted_left = shift(n, -1)
-    n_shifted_right = shift(n, +1)
-    integrals = 0.25 * dx * (n_shifted_left + 2 * n + n_shifted_right)
+        return self.source_magnitude - 2.5 * math.log10(
+            source_counts / (rate_source * e * t)
+        )
 
-    return cast(np.ndarray, integrals[1:-1])
+    @functools.cached_property
+    def source_magnitude(self) -> float:
+        """float: The magnitude to which the source spectrum is normalised."""
+        source = cast(Source, self.configuration.source)
+        if len(source.spectrum) != 1 or not isinstance(
+            source.spectrum[0], (Blackbody, Galaxy)
+        ):
+            raise ValueError(
+                "The source must consist of a single blackbody or galaxy spectrum."
+            )
+        return float(source.spectrum[0].magnitude)
+
+    def _exposure_values(self) -> tuple[int, float]:
+        # The number of exposures and the exposure time (in seconds) per exposure.
+        exposure = cast(Exposure, self.configuration.exposure)
+        if exposure.exposure_time is None:
+            raise ValueError("The configuration must define an exposure time.")
+        return exposure.exposures, exposure.exposure_time.to(u.s).value
+
+    def _rates_at(self, wavelength: Quantity) -> tuple[float, float]:
+        # The source and sky rates (in photons per second) at a wavelength.
+        wavelength_value = wavelength.to(u.AA).value
+        wavelengths_source, rates_source = self.source_rates
+        rate_source = np.interp(
+            wavelength_value,
+            wavelengths_source.to(u.AA).value,
+            _rate_values(rates_source),
+        )
+        wavelengths_sky, rates_sky = self.sky_rates
+        rate_sky = np.interp(
+            wavelength_value,
+            wavelengths_sky.to(u.AA).value,
+            _rate_values(rates_sky),
+        )
+        return float(rate_source), float(rate_sky)
+
+    def source_rate_values(
+        self, flux_values: np.ndarray, pixel_flux_values: np.ndarray | None = None
+    ) -> tuple[Quantity, np.ndarray]:
+        """
+        Return the detection rates for arrays of source flux densities.
+
+        The flux densities are treated like the source spectrum of the source
+        observation, i.e. the throughput for the source is applied and the resulting
+        fluxes are binned as by the detection_rates function. The throughput is
+        evaluated only once for the plan, so that rates for many source spectra can be
+        calculated without creating any synphot models.
+
+        Emission lines should be passed as pixel fluxes (see the
+        emission_lines_pixel_fluxes function) rather than as flux densities. The
+        throughput is applied to them at the pixel midpoints.
+
+        Parameters
+        ----------
+        flux_values: np.ndarray
+            Flux densities (in PHOTLAM) at the pixel wavelengths, as an array of shape
+            (..., number of pixels).
+        pixel_flux_values: np.ndarray, optional
+            Pixel fluxes (in PHOTLAM * Angstrom), as an array which can be broadcast
+            against the flux densities.
+
+        Returns
+        -------
+        tuple
+            The bin wavelengths and an array of shape (..., number of bins) with the
+            detection rates (in photons per second).
+        """
+        fluxes = np.asarray(flux_values) * self.source_throughputs
+        pixel_fluxes = None
+        if pixel_flux_values is not None:
+            pixel_fluxes = np.asarray(pixel_flux_values) * self.source_throughputs
+            fluxes, pixel_fluxes = np.broadcast_arrays(fluxes, pixel_fluxes)
+        wavelengths, rates = self._detection_rates(fluxes, pixel_fluxes)
+        return wavelengths, _rate_values(rates)
+
+    def _detection_rates(
+        self, flux_values: np.ndarray, pixel_flux_values: np.ndarray | None = None
+    ) -> tuple[Quantity, Quantity]:
+        # The binned rates for detected flux densities and pixel fluxes.
+        area = cast(Quantity, self.configuration.telescope.effective_mirror_area)
+        rebinner = self.rebinner
+        bin_flux_values = rebinner(flux_values, pixel_flux_values)
+        rate_values = area.to(u.cm**2).value * bin_flux_values
+        return rebinner.bin_wavelength_values * u.AA, rate_values * RATE_UNIT
+
+
+def _rate_values(rates: Quantity) -> np.ndarray:
+    # Detection rates as photons per second.
+    return cast(np.ndarray, rates.to(RATE_UNIT).value)
 
 
 def snr(configuration: Configuration) -> tuple[Quantity, Quantity]:
-    # Get the source and sky observation.
-    source = source_observation(configuration)
-    sky = sky_observation(configuration)
+    """
+    Calculate the signal-to-noise ratio as a function of wavelength.
 
-    # Get the source and sky detection rates,
-    grating = cast(Grating, configuration.telescope.grating)
-    wavelengths_source, rates_source = detection_rates(
-        area=configuration.telescope.effective_mirror_area,
-        grating_angle=grating.grating_angle,
-        grating_constant=grating.grating_constant,
-        observation=source,
-    )
-    wavelengths_sky, rates_sky = detection_rates(
-        area=configuration.telescope.effective_mirror_area,
-        grating_angle=grating.grating_angle,
-        grating_constant=grating.grating_constant,
-        observation=sky,
-    )
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
 
-    # Collect the remaining relevant configuration parameters.
-    exposure = cast(Exposure, configuration.exposure)
-    e = exposure.exposures
-    t = exposure.exposure_time
-    detector = cast(Detector, configuration.detector)
-    read_noise = detector.read_noise
-    samplings = detector.samplings
-    sampling_mode = detector.sampling_mode
-    r = readout_noise(
-        read_noise=read_noise, samplings=samplings, sampling_mode=sampling_mode
-    )
+    Returns
+    -------
+    tuple
+        A tuple of wavelengths and corresponding signal-to-noise ratios.
+    """
+    return ObservationPlan(configuration).snr()
 
-    # Calculate the SNR.
-    source_counts = (
-        (rates_source * e * t).to(units.PHOTLAM * u.AA * u.cm**2 * u.s).value
-    )
-    sky_counts = (rates_sky * e * t).to(units.PHOTLAM * u.AA * u.cm**2 * u.s).value
-    snr_values = source_counts / np.sqrt(source_counts + sky_counts + r * e)
 
-    # Return the wavelengths and SNR values.
-    return wavelengths_source, snr_values * u.dimensionless_unscaled
+def snr_grid(
+    configuration: Configuration, exposure_times: Quantity, exposures: ArrayLike
+) -> tuple[Quantity, Quantity]:
+    """
+    Calculate the signal-to-noise ratio for a grid of exposure times and exposures.
+
+    The exposure time and number of exposures defined in the configuration are
+    ignored. See the snr_grid method of the ObservationPlan class for details.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    exposure_times: Quantity
+        Exposure time or one-dimensional array of exposure times per exposure.
+    exposures: array-like
+        Number or one-dimensional array of numbers of exposures.
+
+    Returns
+    -------
+    tuple
+        The wavelengths and an array of shape (number of exposure times, number of
+        exposures, number of wavelengths) with the corresponding signal-to-noise
+        ratios.
+    """
+    return cast(
+        tuple[Quantity, Quantity],
+        ObservationPlan(configuration).snr_grid(
+            exposure_times=exposure_times, exposures=exposures
+        ),
+    )
 
 
 def exposure_time(configuration: Configuration) -> tuple[Quantity, Quantity]:
@@ -533,59 +944,105 @@ def exposure_time(configuration: Configuration) -> tuple[Quantity, Quantity]:
     tuple
         A tuple of 101 signal-to-noise ratios and corresponding exposure times.
     """
-    # Get the source and sky observation.
-    source = source_observation(configuration)
-    sky = sky_observation(configuration)
+    return ObservationPlan(configuration).exposure_time()
 
-    # Get the source and sky detection rates,
-    grating = cast(Grating, configuration.telescope.grating)
-    wavelengths_source, rates_source = detection_rates(
-        area=configuration.telescope.effective_mirror_area,
-        grating_angle=grating.grating_angle,
-        grating_constant=grating.grating_constant,
-        observation=source,
-    )
-    wavelengths_sky, rates_sky = detection_rates(
-        area=configuration.telescope.effective_mirror_area,
-        grating_angle=grating.grating_angle,
-        grating_constant=grating.grating_constant,
-        observation=sky,
-    )
 
-    # Collect the remaining relevant configuration parameters.
-    exposure = cast(Exposure, configuration.exposure)
-    e = exposure.exposures
-    snr_ = cast(SNR, exposure.snr)
-    requested_wavelength = snr_.wavelength
-    detector = cast(Detector, configuration.detector)
-    read_noise = detector.read_noise
-    samplings = detector.samplings
-    sampling_mode = detector.sampling_mode
-    r = readout_noise(
-        read_noise=read_noise, samplings=samplings, sampling_mode=sampling_mode
-    )
+def exposure_time_map(
+    configuration: Configuration, snrs: ArrayLike
+) -> tuple[Quantity, Quantity]:
+    """
+    Calculate the exposure time required for target SNRs in every wavelength bin.
 
-    # Define the SNR values for which to calculate the exposure time.
-    sigma = np.linspace(0, 2 * float(snr_.snr), 101)
+    The number of exposures defined in the configuration is used. See the
+    exposure_time_map method of the ObservationPlan class for details.
 
-    # Find the source and sky rate for the requested wavelength.
-    rates_source_spectrum = SpectralElement(
-        Empirical1D,
-        points=wavelengths_source,
-        lookup_table=rates_source.to(units.PHOTLAM * u.cm**2 * u.AA).value,
-    )
-    rate_source = rates_source_spectrum(requested_wavelength)
-    rates_sky_spectrum = SpectralElement(
-        Empirical1D,
-        points=wavelengths_sky,
-        lookup_table=rates_sky.to(units.PHOTLAM * u.cm**2 * u.AA).value,
-    )
-    rate_sky = rates_sky_spectrum(requested_wavelength)
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    snrs: array-like
+        Target signal-to-noise ratio or one-dimensional array of target
+        signal-to-noise ratios.
+
+    Returns
+    -------
+    tuple
+        The wavelengths and an array of shape (number of signal-to-noise ratios,
+        number of wavelengths) with the corresponding exposure times.
+    """
+    return ObservationPlan(configuration).exposure_time_map(snrs)
+
+
+@dataclasses.dataclass(frozen=True)
+class MagnitudeCurve:
+    """
+    The signal-to-noise ratio as a function of the source magnitude.
+
+    Parameters
+    ----------
+    wavelength: Quantity
+        Wavelength for which the signal-to-noise ratios are given.
+    magnitudes: np.ndarray
+        Source magnitudes.
+    snr_values: Quantity
+        Signal-to-noise ratio for each magnitude.
+    snr: float
+        Signal-to-noise ratio for which the limiting magnitude is given.
+    limiting_magnitude: float
+        The faintest magnitude for which the signal-to-noise ratio is reached.
+    """
 
-    # The exposure time t is defined by a quadratic equation r^2 + p t + q = 0.
-    p = -(sigma**2) * (rate_source + rate_sky) / (e * rate_source**2)
-    q = -(sigma**2) * r / (e * rate_source**2)
-    t = -(p / 2) + np.sqrt((p / 2) ** 2 - q)
+    wavelength: Quantity
+    magnitudes: np.ndarray
+    snr_values: Quantity
+    snr: float
+    limiting_magnitude: float
 
-    # Add units and return the result.
-    return sigma * u.dimensionless_unscaled, t * u.s
+
+@u.quantity_input
+def magnitude_curve(
+    configuration: Configuration,
+    snr: float,
+    wavelength: u.AA,
+    magnitudes: ArrayLike | None = None,
+) -> MagnitudeCurve:
+    """
+    Calculate the signal-to-noise ratio as a function of the source magnitude.
+
+    The signal-to-noise ratio at the given wavelength is calculated for the exposure
+    time and number of exposures defined in the configuration, and the limiting
+    magnitude for the given signal-to-noise ratio is determined. The source must
+    consist of a single blackbody or galaxy spectrum, and the source and sky are
+    observed only once, for the magnitude defined in the configuration. See the
+    snr_for_magnitudes method of the ObservationPlan class for details.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    snr: float
+        Signal-to-noise ratio for which to calculate the limiting magnitude.
+    wavelength: Quantity
+        Wavelength for which to calculate the signal-to-noise ratios.
+    magnitudes: array-like, optional
+        Magnitudes for which to calculate the signal-to-noise ratio. By default, 101
+        equidistant magnitudes from 5 magnitudes brighter to 5 magnitudes fainter than
+        the limiting magnitude are used.
+
+    Returns
+    -------
+    MagnitudeCurve
+        The signal-to-noise ratios and the limiting magnitude.
+    """
+    plan = ObservationPlan(configuration)
+    limiting_magnitude = cast(float, plan.limiting_magnitude(snr, wavelength))
+    if magnitudes is None:
+        magnitudes = np.linspace(limiting_magnitude - 5, limiting_magnitude + 5, 101)
+    magnitude_values = np.asarray(magnitudes, dtype=float)
+    return MagnitudeCurve(
+        wavelength=wavelength,
+        magnitudes=magnitude_values,
+        snr_values=plan.snr_for_magnitudes(magnitude_values, wavelength),
+        snr=snr,
+        limiting_magnitude=limiting_magnitude,
+    )
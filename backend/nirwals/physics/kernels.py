@@ -0,0 +1,510 @@
+"""
+Unit-free numerical kernels for the signal-to-noise ratio calculations.
+
+The functions in this module work on plain floats and float64 arrays rather than
+astropy quantities, so that they can be used in inner loops without the overhead of
+unit conversions and validation. All values are in fixed canonical units:
+
+- Wavelengths and grating constants are in Angstrom.
+- Flux densities are in PHOTLAM, and pixel and bin fluxes in PHOTLAM * Angstrom.
+- Areas are in square centimetres.
+- Times are in seconds, and detection rates are in photons per second.
+- Grating angles and zenith distances are in degrees, and angles on the sky (such as
+  the seeing) are in arcseconds.
+
+The functions with quantities in the bandpass and exposure modules are thin wrappers
+around these kernels, and code processing many configurations at once (such as the
+catalogue, sweep and optimisation modules) may call the kernels directly.
+
+All functions accept arrays and broadcast their arguments, unless stated otherwise.
+"""
+
+import math
+from typing import cast, get_args
+
+import numpy as np
+from astropy import units as u
+from numpy.typing import ArrayLike
+
+from constants import (
+    CAMERA_FOCAL_LENGTH,
+    CCD_PIXEL_SIZE,
+    COLLIMATOR_FOCAL_LENGTH,
+    FIBRE_RADIUS,
+    TELESCOPE_FOCAL_LENGTH,
+    TELESCOPE_SEEING,
+    get_maximum_wavelength,
+    get_minimum_wavelength,
+)
+from nirwals.configuration import SourceExtension
+from nirwals.physics.utils import binning_factor
+
+# The instrument constants in canonical units. Lengths are in Angstrom, and angles on
+# the sky are in arcseconds.
+_CAMERA_FOCAL_LENGTH = float(CAMERA_FOCAL_LENGTH.to(u.AA).value)
+_CCD_PIXEL_SIZE = float(CCD_PIXEL_SIZE.to(u.AA).value)
+_COLLIMATOR_FOCAL_LENGTH = float(COLLIMATOR_FOCAL_LENGTH.to(u.AA).value)
+_FIBRE_RADIUS = float(FIBRE_RADIUS.to(u.arcsec).value)
+_TELESCOPE_FOCAL_LENGTH = float(TELESCOPE_FOCAL_LENGTH.to(u.AA).value)
+_TELESCOPE_SEEING = float(TELESCOPE_SEEING.to(u.arcsec).value)
+
+# Conversion factor from the full width half maximum to the standard deviation of a
+# Gaussian.
+_FWHM_TO_SIGMA = 1 / (2 * math.sqrt(2 * math.log(2)))
+
+
+def wavelength_resolution_element(
+    grating_angles: ArrayLike, grating_constant: float
+) -> np.ndarray:
+    """
+    Return the wavelength resolution element for grating angles.
+
+    Parameters
+    ----------
+    grating_angles: array-like
+        Grating angle or array of grating angles, in degrees.
+    grating_constant: float
+        The grating constant, i.e. the groove spacing, in Angstrom.
+
+    Returns
+    -------
+    np.ndarray
+        The wavelength resolution elements, in Angstrom.
+    """
+    # Angle of a fibre on the sky, in radians
+    phi_fibre = 2 * math.radians(_FIBRE_RADIUS / 3600)
+
+    return cast(
+        np.ndarray,
+        phi_fibre
+        * (_TELESCOPE_FOCAL_LENGTH / _COLLIMATOR_FOCAL_LENGTH)
+        * grating_constant
+        * np.cos(np.deg2rad(grating_angles)),
+    )
+
+
+def pixel_wavelength_range(
+    grating_angles: ArrayLike, grating_constant: float
+) -> np.ndarray:
+    """
+    Return the wavelength range covered by a single CCD pixel for grating angles.
+
+    Parameters
+    ----------
+    grating_angles: array-like
+        Grating angle or array of grating angles, in degrees.
+    grating_constant: float
+        The grating constant, i.e. the groove spacing, in Angstrom.
+
+    Returns
+    -------
+    np.ndarray
+        The wavelength ranges covered by a pixel, in Angstrom.
+    """
+    return cast(
+        np.ndarray,
+        grating_constant
+        * _CCD_PIXEL_SIZE
+        * np.cos(np.deg2rad(grating_angles))
+        / _CAMERA_FOCAL_LENGTH,
+    )
+
+
+def binset(pixel_width: float) -> np.ndarray:
+    """
+    Return the pixel wavelengths for a pixel width.
+
+    See the binset function in the exposure module for the covered wavelength range.
+
+    Parameters
+    ----------
+    pixel_width: float
+        The wavelength range covered by a single pixel, in Angstrom.
+
+    Returns
+    -------
+    np.ndarray
+        The pixel wavelengths, in Angstrom.
+    """
+    start = get_minimum_wavelength().to(u.AA).value - 100
+    end = get_maximum_wavelength().to(u.AA).value + 100.1
+    return np.arange(start, end, pixel_width)
+
+
+def fibre_throughput(
+    seeing: float, source_extension: SourceExtension, zenith_distance: float
+) -> float:
+    """
+    Return the fibre throughput.
+
+    See the fibre_throughput function in the bandpass module for details.
+
+    Parameters
+    ----------
+    seeing: float
+        The full width half maximum of the seeing disk for a zenith distance of 0, in
+        arcseconds.
+    source_extension: SourceExtension
+        The source extension ("Point" or "Diffuse").
+    zenith_distance: float
+        The zenith distance of the source, in degrees.
+
+    Returns
+    -------
+    float
+        The fraction of the source flux covered by the fibre.
+    """
+    # Sanity check
+    if source_extension not in get_args(SourceExtension):
+        raise ValueError(f"Unsupported source extension {source_extension}")
+
+    # There is no throughput loss for diffuse sources.
+    if source_extension == "Diffuse":
+        return 1
+
+    # Get the square of the total standard deviation for the seeing disk, which
+    # includes atmospheric and telescope seeing.
+    sec_z = 1 / math.cos(math.radians(zenith_distance))
+    sigma_atm = seeing * sec_z ** (3 / 5) * _FWHM_TO_SIGMA
+    sigma_tel = _TELESCOPE_SEEING * _FWHM_TO_SIGMA
+    sigma_squared = sigma_atm**2 + sigma_tel**2
+
+    # Return the fraction of the seeing disk flux covered by the fibre.
+    return 1 - math.exp(-(_FIBRE_RADIUS**2) / (2 * sigma_squared))
+
+
+def detection_rates(
+    wavelengths: np.ndarray,
+    fluxes: np.ndarray,
+    resolution_element: float,
+    area: float,
+    pixel_fluxes: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the detection rates for detected flux densities at pixel wavelengths.
+
+    The flux densities are integrated over the pixels and binned for the wavelength
+    resolution (see the Rebinner class), and the bin fluxes are multiplied by the
+    area.
+
+    Parameters
+    ----------
+    wavelengths: np.ndarray
+        Equidistant pixel midpoints (in Angstrom), as an array of shape (..., number
+        of pixels).
+    fluxes: np.ndarray
+        Flux densities (in PHOTLAM), as an array of the same shape.
+    resolution_element: float
+        Wavelength resolution element (in Angstrom).
+    area: float
+        Effective mirror area (in square centimetres).
+    pixel_fluxes: np.ndarray, optional
+        Pixel fluxes (in PHOTLAM * Angstrom), as an array of the same shape.
+
+    Returns
+    -------
+    tuple
+        The bin wavelengths (in Angstrom) and the detection rates (in photons per
+        second), as arrays of shape (..., number of bins).
+    """
+    rebinner = Rebinner(wavelengths, resolution_element)
+    return rebinner.bin_wavelength_values, area * rebinner(fluxes, pixel_fluxes)
+
+
+def electrons(
+    rates: ArrayLike, exposures: ArrayLike, exposure_time: ArrayLike
+) -> np.ndarray:
+    """
+    Return the number of electrons accumulated for detection rates.
+
+    Parameters
+    ----------
+    rates: array-like
+        Detection rates, in photons per second.
+    exposures: array-like
+        Numbers of exposures.
+    exposure_time: array-like
+        Exposure times per exposure, in seconds.
+
+    Returns
+    -------
+    np.ndarray
+        The electron counts.
+    """
+    return cast(
+        np.ndarray,
+        np.asarray(rates, dtype=float)
+        * np.asarray(exposures)
+        * np.asarray(exposure_time),
+    )
+
+
+def snr(
+    rate_source: ArrayLike,
+    rate_sky: ArrayLike,
+    exposures: ArrayLike,
+    exposure_time: ArrayLike,
+    readout_noise: float,
+) -> np.ndarray:
+    """
+    Return the signal-to-noise ratio for source and sky detection rates.
+
+    The signal-to-noise ratio is S / sqrt(S + B + e r), where S and B are the numbers
+    of source and sky electrons, e is the number of exposures and r is the readout
+    noise for a single exposure. It is undefined (NaN) if there are no electrons and
+    no readout noise.
+
+    Parameters
+    ----------
+    rate_source: array-like
+        Source detection rates, in photons per second.
+    rate_sky: array-like
+        Sky detection rates, in photons per second.
+    exposures: array-like
+        Numbers of exposures.
+    exposure_time: array-like
+        Exposure times per exposure, in seconds.
+    readout_noise: float
+        Readout noise for a single exposure.
+
+    Returns
+    -------
+    np.ndarray
+        The signal-to-noise ratios.
+    """
+    source_counts = electrons(rate_source, exposures, exposure_time)
+    sky_counts = electrons(rate_sky, exposures, exposure_time)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cast(
+            np.ndarray,
+            source_counts
+            / np.sqrt(
+                source_counts + sky_counts + readout_noise * np.asarray(exposures)
+            ),
+        )
+
+
+def exposure_times(
+    sigma: ArrayLike,
+    rate_source: ArrayLike,
+    rate_sky: ArrayLike,
+    exposures: ArrayLike,
+    readout_noise: float,
+) -> np.ndarray:
+    """
+    Return the exposure time required for reaching a signal-to-noise ratio.
+
+    The exposure time (per exposure) t is the solution of the quadratic equation
+    t^2 + p t + q = 0 with p = -sigma^2 (R_source + R_sky) / (e R_source^2) and
+    q = -sigma^2 r / (e R_source^2), where sigma is the signal-to-noise ratio, R_source
+    and R_sky are the source and sky detection rates, e is the number of exposures
+    and r the readout noise. It is infinite if there is no source flux, unless the
+    signal-to-noise ratio is 0.
+
+    Parameters
+    ----------
+    sigma: array-like
+        Signal-to-noise ratios.
+    rate_source: array-like
+        Source detection rates, in photons per second.
+    rate_sky: array-like
+        Sky detection rates, in photons per second.
+    exposures: array-like
+        Numbers of exposures.
+    readout_noise: float
+        Readout noise for a single exposure.
+
+    Returns
+    -------
+    np.ndarray
+        The exposure times, in seconds.
+    """
+    s = np.asarray(sigma, dtype=float)
+    r_source = np.asarray(rate_source, dtype=float)
+    r_sky = np.asarray(rate_sky, dtype=float)
+    e = np.asarray(exposures, dtype=float)
+    # Tiny source rates may lead to an overflow, i.e. an infinite exposure time.
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        p = -(s**2) * (r_source + r_sky) / (e * r_source**2)
+        q = -(s**2) * readout_noise / (e * r_source**2)
+        t = -(p / 2) + np.sqrt((p / 2) ** 2 - q)
+
+    # Without source flux the target SNR can only be reached if it is 0.
+    no_source = np.broadcast_to(r_source <= 0, np.shape(t))
+    return np.where(no_source, np.where(s == 0, 0, np.inf), t)
+
+
+def bin_fluxes(
+    wavelength_values: np.ndarray,
+    flux_values: np.ndarray,
+    resolution_element: float,
+    pixel_flux_values: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Integrate fluxes over pixels and sum them over wavelength resolution elements.
+
+    The wavelengths must be equidistant pixel midpoints along the last axis, and the
+    flux densities must be given for these wavelengths. The pixel fluxes are
+    calculated as explained for the _bin_integrals function, and the pixels are
+    binned together so that each bin covers the wavelength resolution element as
+    tightly as possible. The bin wavelengths are the midpoints of the bins.
+
+    Fluxes which have been integrated over the pixels already, such as those of
+    emission lines, may be passed as pixel fluxes. They are added to the integrated
+    flux densities before the pixels are binned.
+
+    Leading axes are preserved, so that several spectra (possibly with different
+    wavelengths) can be binned at once. The binning is the same for all of them, as
+    the ratio of resolution element and pixel width is taken from the first row.
+
+    Parameters
+    ----------
+    wavelength_values: np.ndarray
+        Wavelengths (in Angstrom), as an array of shape (..., number of pixels).
+    flux_values: np.ndarray
+        Flux densities (in PHOTLAM), as an array of the same shape.
+    resolution_element: float
+        Wavelength resolution element (in Angstrom).
+    pixel_flux_values: np.ndarray, optional
+        Pixel fluxes (in PHOTLAM * Angstrom), as an array of the same shape.
+
+    Returns
+    -------
+    tuple
+        The bin wavelengths (in Angstrom) and the bin fluxes (in PHOTLAM * Angstrom), as
+        arrays of shape (..., number of bins).
+    """
+    rebinner = Rebinner(wavelength_values, resolution_element)
+    return rebinner.bin_wavelength_values, rebinner(flux_values, pixel_flux_values)
+
+
+class Rebinner:
+    """
+    Integration of flux densities over pixels and wavelength resolution elements.
+
+    The rebinner does the binning for the bin_fluxes function, but the binning is
+    worked out only once, when the rebinner is created, so that any number of spectra
+    can be binned for the same pixel wavelengths without repeating the work.
+
+    The pixel integrals are calculated as explained for the _bin_integrals function,
+    and their cumulative sum gives the integral of the flux density from the first
+    pixel edge up to every pixel edge. The bin fluxes are the differences of this
+    cumulative integral at the bin edges, whose pixel edge indices are precomputed.
+    The last bin may extend beyond the last pixel, in which case a flux of 0 is
+    assumed for the "missing" pixels.
+
+    Leading axes are preserved, so that several spectra (possibly with different
+    wavelengths) can be binned at once. The binning is the same for all of them, as
+    the ratio of resolution element and pixel width is taken from the first row.
+
+    Parameters
+    ----------
+    wavelength_values: np.ndarray
+        Equidistant pixel midpoints (in Angstrom), as an array of shape (..., number
+        of pixels).
+    resolution_element: float
+        Wavelength resolution element (in Angstrom).
+    """
+
+    def __init__(self, wavelength_values: np.ndarray, resolution_element: float):
+        self.wavelength_values = wavelength_values
+        delta_lambda_values = wavelength_values[..., 1] - wavelength_values[..., 0]
+
+        # Find the binning so that each bin covers the wavelength resolution element
+        # as tightly as possible.
+        self.binning = binning_factor(
+            resolution_element, float(np.ravel(delta_lambda_values)[0])
+        )
+        pixels = wavelength_values.shape[-1]
+        bins = -(-pixels // self.binning)
+        self._edges = np.minimum(np.arange(bins + 1) * self.binning, pixels)
+
+        # Get the wavelengths in the middle of the bins. The distance between the
+        # midpoints of a bin's outer pixels is the binsize less one pixel.
+        first_pixels = self._edges[:-1]
+        self.bin_wavelength_values = (
+            wavelength_values[..., :1]
+            + (first_pixels + 0.5 * (self.binning - 1))
+            * delta_lambda_values[..., np.newaxis]
+        )
+
+    def __call__(
+        self, flux_values: np.ndarray, pixel_flux_values: np.ndarray | None = None
+    ) -> np.ndarray:
+        """
+        Return the bin fluxes for flux densities at the pixel midpoints.
+
+        Fluxes which have been integrated over the pixels already, such as those of
+        emission lines, may be passed as pixel fluxes. They are added to the
+        integrated flux densities.
+
+        Parameters
+        ----------
+        flux_values: np.ndarray
+            Flux densities (in PHOTLAM), as an array of shape (..., number of
+            pixels).
+        pixel_flux_values: np.ndarray, optional
+            Pixel fluxes (in PHOTLAM * Angstrom), as an array of the same shape.
+
+        Returns
+        -------
+        np.ndarray
+            The bin fluxes (in PHOTLAM * Angstrom), as an array of shape (...,
+            number of bins).
+        """
+        integrals = _bin_integrals(
+            np.broadcast_to(self.wavelength_values, np.shape(flux_values)),
+            np.asarray(flux_values),
+        )
+        if pixel_flux_values is not None:
+            integrals = integrals + pixel_flux_values
+        cumulative = np.zeros(integrals.shape[:-1] + (integrals.shape[-1] + 1,))
+        np.cumsum(integrals, axis=-1, out=cumulative[..., 1:])
+        return cast(
+            np.ndarray,
+            cumulative[..., self._edges[1:]] - cumulative[..., self._edges[:-1]],
+        )
+
+
+def _bin_integrals(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Calculate the integral per bin for given x and y values.
+
+    The given x values must be equidistant, i.e. x[k] - x[k - 1] must be the same for
+    all 1 < k < len(k). This is not checked, though. x[k] is the midpoint of the bin
+    [x[k] - dx/2, x[k] + dx/2], where dx is the distance between adjacent x values.
+
+    The given y values are assumed to be function values at the corresponding x value,
+    y[k] = f(x[k]).
+
+    The function calculates the integral over f for each bin using trapezoidal
+    integration and returns the result. For the first and last bin the assumption is
+    made that f(x[0] - dx/2) = f(x[-1] + dx/2) = 0.
+
+    The x and y values may also be given as arrays of shape (..., number of values),
+    in which case the integrals are calculated along the last axis.
+
+    Parameters
+    ----------
+    x: np.ndarray
+        Array of bin midpoints.
+    y: np.ndarray
+        Array of y values corresponding to the bin midpoints.
+
+    Returns
+    -------
+    np.ndarray
+        The integral value for each bin.
+    """
+
+    # Sanity checks
+    if x.shape[-1] < 2:
+        raise ValueError("There must be at least two x values.")
+    if x.shape != y.shape:
+        raise ValueError("The shapes of x and y must be the same.")
+
+    dx = x[..., 1:2] - x[..., :1]
+    n = np.pad(y, [(0, 0)] * (y.ndim - 1) + [(1, 1)])
+    integrals = 0.25 * dx * (n[..., :-2] + 2 * n[..., 1:-1] + n[..., 2:])
+
+    return cast(np.ndarray, integrals)
@@ -0,0 +1,277 @@
+"""Functions for optimising the instrument setup."""
+
+import dataclasses
+from typing import cast
+
+import numpy as np
+from astropy import units as u
+from astropy.units import Quantity
+from synphot import units
+
+from constants import get_minimum_wavelength, get_maximum_wavelength
+from nirwals.configuration import (
+    Configuration,
+    Exposure,
+    Filter,
+    Grating,
+    SNR,
+    Source,
+)
+from nirwals.physics import kernels
+from nirwals.physics.bandpass import (
+    atmospheric_transmission,
+    grating_efficiency_bank,
+    grating_independent_throughput,
+)
+from nirwals.physics.exposure import ObservationPlan
+from nirwals.physics.spectrum import composite_source_spectrum, sky_spectrum
+from nirwals.physics.utils import binning_factor
+
+# Number of grating angles which are processed together.
+_CHUNK_SIZE = 16
+
+
+@dataclasses.dataclass(frozen=True)
+class GratingAngleCurve:
+    """
+    The signal-to-noise ratio or exposure time as a function of the grating angle.
+
+    Only one of snr_values and exposure_times is defined, depending on whether the
+    signal-to-noise ratio or the exposure time has been calculated.
+
+    Parameters
+    ----------
+    wavelength: Quantity
+        Wavelength for which the signal-to-noise ratios or exposure times are given.
+    grating_angles: Angle
+        Grating angles.
+    snr_values: Quantity, optional
+        Signal-to-noise ratio for each grating angle.
+    exposure_times: Quantity, optional
+        Exposure time (per exposure) required for reaching the requested
+        signal-to-noise ratio, for each grating angle.
+    best_grating_angle: Angle
+        The grating angle with the highest signal-to-noise ratio or lowest exposure
+        time.
+    """
+
+    wavelength: Quantity
+    grating_angles: Quantity
+    snr_values: Quantity | None
+    exposure_times: Quantity | None
+    best_grating_angle: Quantity
+
+
+def grating_angle_curve(
+    configuration: Configuration,
+    wavelength: Quantity | None = None,
+    grating_angles: Quantity | None = None,
+) -> GratingAngleCurve:
+    """
+    Calculate the signal-to-noise ratio or exposure time as a function of angle.
+
+    If the configuration defines an exposure time, the signal-to-noise ratio at the
+    given wavelength is calculated for all grating angles, and the best grating angle
+    is the one with the highest signal-to-noise ratio. Otherwise, the exposure time
+    required for reaching the signal-to-noise ratio requested in the configuration is
+    calculated, and the best grating angle is the one with the lowest exposure time.
+    The grating angle defined in the configuration is ignored.
+
+    The calculation is the same as that of the ObservationPlan class, but it is done
+    for many grating angles at once. The source and sky spectra, the
+    grating-independent throughput and the atmospheric transmission are evaluated
+    only once for all grating angles, and the grating efficiencies are taken from the
+    grating efficiency bank. Grating angles are processed in chunks, so that the
+    required memory remains bounded.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    wavelength: Quantity, optional
+        The wavelength for which to calculate the signal-to-noise ratio or exposure
+        time. By default, the wavelength of the requested signal-to-noise ratio is
+        used. The wavelength must be given if the configuration defines an exposure
+        time.
+    grating_angles: Angle, optional
+        The grating angles. By default, 201 equidistant angles covering the whole
+        supported range are used.
+
+    Returns
+    -------
+    GratingAngleCurve
+        The signal-to-noise ratios or exposure times.
+    """
+    exposure = cast(Exposure, configuration.exposure)
+    grating = cast(Grating, configuration.telescope.grating)
+    is_snr_requested = exposure.snr is None
+    if wavelength is None:
+        if exposure.snr is None:
+            raise ValueError("A wavelength is required for calculating the SNR.")
+        wavelength = exposure.snr.wavelength
+    wavelength_value = wavelength.to(u.AA).value
+
+    bank = grating_efficiency_bank(grating.name)
+    if grating_angles is None:
+        grating_angles = (
+            np.linspace(
+                bank.min_grating_angle.to(u.deg).value,
+                bank.max_grating_angle.to(u.deg).value,
+                201,
+            )
+            * u.deg
+        )
+    angle_values = np.atleast_1d(grating_angles.to(u.deg).value)
+
+    # Calculate the source and sky detection rates at the wavelength.
+    plan = ObservationPlan(configuration)
+    sky_rates = np.empty(len(angle_values))
+    source_rates = np.empty(len(angle_values))
+    snr_values = np.empty(len(angle_values))
+    for start in range(0, len(angle_values), _CHUNK_SIZE):
+        chunk = slice(start, start + _CHUNK_SIZE)
+        chunk_rates = _detection_rates(configuration, angle_values[chunk])
+        wavelength_values, rates_source, rates_sky, bins = chunk_rates
+        if is_snr_requested:
+            snrs = kernels.snr(
+                rates_source,
+                rates_sky,
+                exposure.exposures,
+                cast(Quantity, exposure.exposure_time).to(u.s).value,
+                plan.readout_noise,
+            )
+            snr_values[chunk] = _interpolate(
+                wavelength_value, wavelength_values, snrs, bins
+            )
+        else:
+            source_rates[chunk] = _interpolate(
+                wavelength_value, wavelength_values, rates_source, bins
+            )
+            sky_rates[chunk] = _interpolate(
+                wavelength_value, wavelength_values, rates_sky, bins
+            )
+
+    if is_snr_requested:
+        best = int(np.nanargmax(snr_values))
+        return GratingAngleCurve(
+            wavelength=wavelength,
+            grating_angles=angle_values * u.deg,
+            snr_values=snr_values * u.dimensionless_unscaled,
+            exposure_times=None,
+            best_grating_angle=angle_values[best] * u.deg,
+        )
+
+    requested_snr = float(cast(SNR, exposure.snr).snr)
+    exposure_times = kernels.exposure_times(
+        requested_snr, source_rates, sky_rates, exposure.exposures, plan.readout_noise
+    )
+    best = int(np.nanargmin(exposure_times))
+    return GratingAngleCurve(
+        wavelength=wavelength,
+        grating_angles=angle_values * u.deg,
+        snr_values=None,
+        exposure_times=exposure_times * u.s,
+        best_grating_angle=angle_values[best] * u.deg,
+    )
+
+
+def _detection_rates(
+    configuration: Configuration, angle_values: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Returns the bin wavelengths (in Angstrom), source and sky detection rates (in
+    # photons per second) and number of bins for the given grating angles. The
+    # arrays have one row per grating angle, and rows are padded to the same length.
+    grating = cast(Grating, configuration.telescope.grating)
+    grating_constant = grating.grating_constant.to(u.AA).value
+    source = cast(Source, configuration.source)
+    area = (
+        cast(Quantity, configuration.telescope.effective_mirror_area)
+        .to(u.cm**2)
+        .value
+    )
+
+    # Get the pixel wavelengths. These are the same as the bin set used by the
+    # source_observation function. Rows are padded by continuing the wavelength
+    # grid.
+    start = get_minimum_wavelength().to(u.AA).value - 100
+    end = get_maximum_wavelength().to(u.AA).value + 100.1
+    steps = kernels.pixel_wavelength_range(angle_values, grating_constant)
+    pixels = np.ceil((end - start) / steps).astype(int)
+    x = start + np.arange(pixels.max()) * steps[:, np.newaxis]
+    valid = np.arange(pixels.max()) < pixels[:, np.newaxis]
+
+    # Evaluate the spectra and grating-independent throughputs once for all pixel
+    # wavelengths.
+    unique_x, inverse = np.unique(x[valid], return_inverse=True)
+    unique_wavelengths = unique_x * u.AA
+    instrument = grating_independent_throughput(
+        cast(Filter, configuration.telescope.filter)
+    )(unique_wavelengths).value
+    atmosphere = atmospheric_transmission(configuration.zenith_distance)(
+        unique_wavelengths
+    ).value
+    fibre = kernels.fibre_throughput(
+        seeing=configuration.seeing.to(u.arcsec).value,
+        source_extension=source.extension,
+        zenith_distance=configuration.zenith_distance.to(u.deg).value,
+    )
+    source_spectrum = composite_source_spectrum(configuration)
+    source_throughputs = np.zeros(x.shape)
+    source_throughputs[valid] = (atmosphere * instrument * fibre)[inverse]
+    source_fluxes = np.zeros(x.shape)
+    source_fluxes[valid] = source_spectrum.continuum(unique_wavelengths)[inverse]
+    sky_fluxes = np.zeros(x.shape)
+    sky_fluxes[valid] = (
+        sky_spectrum()(unique_wavelengths, flux_unit=units.PHOTLAM).value * instrument
+    )[inverse]
+
+    # Apply the throughputs and grating efficiencies. Emission lines are integrated
+    # over the pixels rather than sampled.
+    efficiencies = grating_efficiency_bank(grating.name).efficiency_values(
+        grating_angles=angle_values, wavelengths=x
+    )
+    source_fluxes *= source_throughputs * efficiencies
+    line_fluxes = (
+        source_spectrum.line_pixel_fluxes(x * u.AA) * source_throughputs * efficiencies
+    )
+    sky_fluxes *= efficiencies
+
+    # Bin the fluxes. The binning is the same for all grating angles in principle,
+    # but rounding errors might change it.
+    resolution_elements = kernels.wavelength_resolution_element(
+        angle_values, grating_constant
+    )
+    binnings = np.array(
+        [binning_factor(r, s) for r, s in zip(resolution_elements, steps)]
+    )
+    bins = -(-pixels // binnings)
+    bin_wavelengths = np.zeros((len(angle_values), bins.max()))
+    source_rates = np.zeros((len(angle_values), bins.max()))
+    sky_rates = np.zeros((len(angle_values), bins.max()))
+    for binning in np.unique(binnings):
+        rows = binnings == binning
+        resolution_element = resolution_elements[rows][0]
+        rebinner = kernels.Rebinner(x[rows], resolution_element)
+        n = rebinner.bin_wavelength_values.shape[-1]
+        bin_wavelengths[rows, :n] = rebinner.bin_wavelength_values
+        source_rates[rows, :n] = area * rebinner(source_fluxes[rows], line_fluxes[rows])
+        sky_rates[rows, :n] = area * rebinner(sky_fluxes[rows])
+
+    return bin_wavelengths, source_rates, sky_rates, bins
+
+
+def _interpolate(
+    x0: float, x: np.ndarray, y: np.ndarray, lengths: np.ndarray
+) -> np.ndarray:
+    # Linearly interpolates each row of y at x0. The x values of each row must be
+    # equidistant, and only the first lengths[i] values of row i are used. As for
+    # np.interp, the values at the boundaries are used outside the x range.
+    rows = np.arange(len(x))
+    positions = (x0 - x[:, 0]) / (x[:, 1] - x[:, 0])
+    positions = np.clip(positions, 0, lengths - 1)
+    lower = np.minimum(np.floor(positions).astype(int), lengths - 2)
+    fractions = positions - lower
+    return cast(
+        np.ndarray,
+        (1 - fractions) * y[rows, lower] + fractions * y[rows, lower + 1],
+    )
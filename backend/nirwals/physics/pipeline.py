@@ -0,0 +1,584 @@
+"""A memoised dependency graph for the stages of the simulator pipeline."""
+
+import dataclasses
+import functools
+import threading
+from typing import Any, Callable, Hashable, Iterable, cast
+
+import numpy as np
+from astropy import units as u
+from astropy.units import Quantity
+from synphot import SourceSpectrum, units
+
+from nirwals.cache import CacheInfo, LRUCache
+from nirwals.configuration import Configuration, Detector, Grating
+from nirwals.digest import CanonicalConfiguration, canonical_configuration
+from nirwals.physics.exposure import (
+    RATE_UNIT,
+    ObservationPlan,
+    binset,
+    readout_noise,
+    sky_bandpass,
+    source_bandpass,
+    wavelength_resolution_element,
+)
+from nirwals.physics.kernels import Rebinner
+from nirwals.physics.spectrum import (
+    CompositeSpectrum,
+    composite_source_spectrum,
+    sky_spectrum,
+)
+
+DEFAULT_MAXSIZE = 32
+"""Default maximum number of cached values per node."""
+
+
+@dataclasses.dataclass(frozen=True)
+class Node:
+    """
+    A node of the pipeline graph.
+
+    The value of a node is computed from the configuration and the values of the
+    nodes it depends on. It must only depend on the configuration through the
+    parameters, which are obtained from the canonical form of the configuration.
+    The values are shared between requests and must not be modified.
+
+    Parameters
+    ----------
+    name: str
+        Node name.
+    dependencies: tuple of str
+        Names of the nodes whose values are needed for computing the value.
+    parameters: callable
+        Function returning the hashable parameters for a canonical configuration.
+    compute: callable
+        Function computing the value. It is called with the configuration and the
+        values of the dependencies, in the order of the dependencies.
+    """
+
+    name: str
+    dependencies: tuple[str, ...]
+    parameters: Callable[[CanonicalConfiguration], Hashable]
+    compute: Callable[..., Any]
+
+
+@dataclasses.dataclass(frozen=True)
+class PipelineStats:
+    """
+    Statistics for the nodes evaluated for a request.
+
+    Nodes whose value was not needed, because the value of a node depending on them
+    was taken from the cache, are neither hits nor recomputed.
+
+    Parameters
+    ----------
+    hits: tuple of str
+        Names of the nodes whose value was taken from the cache.
+    recomputed: tuple of str
+        Names of the nodes whose value was computed.
+    """
+
+    hits: tuple[str, ...]
+    recomputed: tuple[str, ...]
+
+
+class Pipeline:
+    """
+    A graph of pipeline stages with a memo cache per node.
+
+    The key of a node's value consists of the node name, the node parameters and the
+    keys of its dependencies, so that a value is recomputed if and only if the node
+    parameters or the parameters of any of its (direct or indirect) dependencies
+    change. Keys are cheap to calculate, as they don't require any values. If a value
+    is found in the cache, the dependencies are not evaluated at all.
+
+    Each node has its own least-recently-used cache. The caches are thread-safe, but
+    a value may be computed more than once if it is requested concurrently.
+
+    Parameters
+    ----------
+    nodes: iterable of Node
+        The nodes. The dependencies of every node must be included, and the graph
+        must be acyclic.
+    maxsize: int
+        Maximum number of cached values per node.
+    """
+
+    def __init__(self, nodes: Iterable[Node], maxsize: int = DEFAULT_MAXSIZE) -> None:
+        self.nodes: dict[str, Node] = {}
+        for node in nodes:
+            if node.name in self.nodes:
+                raise ValueError(f"Duplicate node: {node.name}")
+            self.nodes[node.name] = node
+        for node in self.nodes.values():
+            for dependency in node.dependencies:
+                if dependency not in self.nodes:
+                    raise ValueError(
+                        f"Unknown dependency of node {node.name}: {dependency}"
+                    )
+        self._check_acyclic()
+        self._caches: dict[str, LRUCache[Any]] = {
+            name: LRUCache(maxsize=maxsize) for name in self.nodes
+        }
+
+    def run(
+        self,
+        configuration: Configuration,
+        canonical: CanonicalConfiguration | None = None,
+    ) -> "PipelineRun":
+        """
+        Return a run of the pipeline for a configuration.
+
+        Parameters
+        ----------
+        configuration: Configuration
+            The configuration.
+        canonical: CanonicalConfiguration, optional
+            The canonical form of the configuration. By default, it is created from
+            the configuration.
+
+        Returns
+        -------
+        PipelineRun
+            The pipeline run.
+        """
+        if canonical is None:
+            canonical = canonical_configuration(configuration)
+        return PipelineRun(self, configuration, canonical)
+
+    def cached(self, name: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value of a node, computing and caching it if necessary.
+
+        Parameters
+        ----------
+        name: str
+            Node name.
+        key: Hashable
+            The key of the value (see the key method of the PipelineRun class).
+        compute: callable
+            Function without arguments computing the value.
+
+        Returns
+        -------
+        Any
+            The value.
+        """
+        return self._caches[name].get(key, compute)
+
+    def cache_info(self) -> dict[str, CacheInfo]:
+        """
+        Return the cache statistics for every node.
+
+        Returns
+        -------
+        dict
+            The cache statistics, keyed by node name.
+        """
+        return {name: cache.cache_info() for name, cache in self._caches.items()}
+
+    def clear(self) -> None:
+        """Remove all values from the caches and reset the statistics."""
+        for cache in self._caches.values():
+            cache.clear()
+
+    def _check_acyclic(self) -> None:
+        # Depth-first search for a cycle.
+        done: set[str] = set()
+
+        def visit(name: str, path: tuple[str, ...]) -> None:
+            if name in path:
+                raise ValueError(f"Cyclic dependency: {' -> '.join(path + (name,))}")
+            if name in done:
+                return
+            for dependency in self.nodes[name].dependencies:
+                visit(dependency, path + (name,))
+            done.add(name)
+
+        for name in self.nodes:
+            visit(name, ())
+
+
+class PipelineRun:
+    """
+    The evaluation of a pipeline for a single configuration, e.g. for a request.
+
+    Every node is evaluated at most once per run. Whether its value was taken from
+    the cache or recomputed is recorded, and the stats method reports this.
+
+    Use the run method of the Pipeline class for creating a run.
+
+    Parameters
+    ----------
+    pipeline: Pipeline
+        The pipeline.
+    configuration: Configuration
+        The configuration.
+    canonical: CanonicalConfiguration
+        The canonical form of the configuration.
+    """
+
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        configuration: Configuration,
+        canonical: CanonicalConfiguration,
+    ) -> None:
+        self.pipeline = pipeline
+        self.configuration = configuration
+        self.canonical = canonical
+        self._keys: dict[str, Hashable] = {}
+        self._values: dict[str, Any] = {}
+        self._hits: list[str] = []
+        self._recomputed: list[str] = []
+        self._lock = threading.RLock()
+
+    def value(self, name: str) -> Any:
+        """
+        Return the value of a node.
+
+        Parameters
+        ----------
+        name: str
+            Node name.
+
+        Returns
+        -------
+        Any
+            The value.
+        """
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+            node = self.pipeline.nodes[name]
+            computed = False
+
+            def compute() -> Any:
+                nonlocal computed
+                computed = True
+                return node.compute(
+                    self.configuration, *(self.value(d) for d in node.dependencies)
+                )
+
+            value = self.pipeline.cached(name, self.key(name), compute)
+            self._values[name] = value
+            (self._recomputed if computed else self._hits).append(name)
+            return value
+
+    def key(self, name: str) -> Hashable:
+        """
+        Return the cache key for the value of a node.
+
+        Parameters
+        ----------
+        name: str
+            Node name.
+
+        Returns
+        -------
+        Hashable
+            The key.
+        """
+        if name not in self._keys:
+            node = self.pipeline.nodes[name]
+            self._keys[name] = (
+                name,
+                node.parameters(self.canonical),
+                tuple(self.key(d) for d in node.dependencies),
+            )
+        return self._keys[name]
+
+    def stats(self) -> PipelineStats:
+        """
+        Return the statistics for the nodes evaluated so far.
+
+        Returns
+        -------
+        PipelineStats
+            The statistics.
+        """
+        with self._lock:
+            return PipelineStats(
+                hits=tuple(self._hits), recomputed=tuple(self._recomputed)
+            )
+
+
+class PipelinePlan(ObservationPlan):
+    """
+    An observation plan whose rates are taken from a pipeline run.
+
+    The plan works like the ObservationPlan class, but the pixel wavelengths, source
+    throughputs, rebinner, detection rates and readout noise are the values of the
+    corresponding pipeline nodes. Hence they are only recomputed if the configuration
+    parameters they depend on have changed since an earlier request. The
+    signal-to-noise ratios, exposure times and electron counts are cheap to derive
+    from the rates, and they are calculated for every request.
+
+    Parameters
+    ----------
+    run: PipelineRun
+        The pipeline run.
+    """
+
+    def __init__(self, run: PipelineRun) -> None:
+        super().__init__(run.configuration)
+        self.run = run
+
+    @functools.cached_property
+    def source_rates(self) -> tuple[Quantity, Quantity]:
+        """tuple: The wavelengths and detection rates for the source."""
+        wavelengths, rates = self.run.value("source_rates")
+        return wavelengths * u.AA, rates * RATE_UNIT
+
+    @functools.cached_property
+    def sky_rates(self) -> tuple[Quantity, Quantity]:
+        """tuple: The wavelengths and detection rates for the sky background."""
+        wavelengths, rates = self.run.value("sky_rates")
+        return wavelengths * u.AA, rates * RATE_UNIT
+
+    @functools.cached_property
+    def pixel_wavelengths(self) -> Quantity:
+        """Quantity: The pixel wavelengths, which are the bin set of observations."""
+        return self.run.value("pixel_wavelengths") * u.AA
+
+    @functools.cached_property
+    def source_throughputs(self) -> np.ndarray:
+        """np.ndarray: The throughput for the source at the pixel wavelengths."""
+        return cast(np.ndarray, self.run.value("source_throughputs"))
+
+    @functools.cached_property
+    def rebinner(self) -> Rebinner:
+        """Rebinner: The rebinner for the pixel wavelengths."""
+        return cast(Rebinner, self.run.value("rebinner"))
+
+    @functools.cached_property
+    def readout_noise(self) -> float:
+        """float: The readout noise for a single exposure."""
+        return cast(float, self.run.value("readout_noise"))
+
+    def stats(self) -> PipelineStats:
+        """
+        Return the statistics for the pipeline nodes evaluated for the plan.
+
+        Returns
+        -------
+        PipelineStats
+            The statistics.
+        """
+        return self.run.stats()
+
+
+def pipeline_plan(
+    configuration: Configuration,
+    pipeline: Pipeline | None = None,
+    canonical: CanonicalConfiguration | None = None,
+) -> PipelinePlan:
+    """
+    Return an observation plan for a configuration which uses a memoised pipeline.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    pipeline: Pipeline, optional
+        The pipeline. By default, the process-wide pipeline returned by the
+        default_pipeline function is used.
+    canonical: CanonicalConfiguration, optional
+        The canonical form of the configuration. By default, it is created from the
+        configuration.
+
+    Returns
+    -------
+    PipelinePlan
+        The observation plan.
+    """
+    if pipeline is None:
+        pipeline = default_pipeline()
+    return PipelinePlan(pipeline.run(configuration, canonical))
+
+
+@functools.cache
+def default_pipeline() -> Pipeline:
+    """
+    Return the process-wide pipeline of the simulator.
+
+    The pipeline consists of the following nodes, where the arrows point from a node
+    to the nodes depending on it.
+
+    - pixel_wavelengths -> source_throughputs, sky_throughputs, fluxes, rebinner
+    - source_spectrum -> source_fluxes
+    - sky_spectrum -> sky_fluxes
+    - source_throughputs -> source_fluxes
+    - sky_throughputs -> sky_fluxes
+    - source_fluxes -> source_rates
+    - sky_fluxes -> sky_rates
+    - rebinner -> source_rates, sky_rates
+    - readout_noise
+
+    The throughputs are those of the source and sky bandpasses (see the
+    source_bandpass and sky_bandpass functions), and the fluxes are the detected
+    fluxes at the pixel wavelengths. The readout noise forms the noise model.
+
+    Returns
+    -------
+    Pipeline
+        The pipeline.
+    """
+    return Pipeline(_NODES)
+
+
+def _fields(*names: str) -> Callable[[CanonicalConfiguration], Hashable]:
+    # Returns a function for getting parameters from canonical configuration fields.
+    def parameters(canonical: CanonicalConfiguration) -> Hashable:
+        return tuple(getattr(canonical, name) for name in names)
+
+    return parameters
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    values.flags.writeable = False
+    return values
+
+
+def _pixel_wavelengths(configuration: Configuration) -> np.ndarray:
+    grating = cast(Grating, configuration.telescope.grating)
+    wavelengths = binset(grating.grating_angle, grating.grating_constant)
+    return _read_only(wavelengths.to(u.AA).value)
+
+
+def _source_throughputs(
+    configuration: Configuration, wavelengths: np.ndarray
+) -> np.ndarray:
+    bandpass = source_bandpass(configuration)
+    return _read_only(bandpass(wavelengths * u.AA).value)
+
+
+def _sky_throughputs(
+    configuration: Configuration, wavelengths: np.ndarray
+) -> np.ndarray:
+    return _read_only(sky_bandpass(configuration)(wavelengths * u.AA).value)
+
+
+def _source_fluxes(
+    configuration: Configuration,
+    spectrum: CompositeSpectrum,
+    throughputs: np.ndarray,
+    wavelengths: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Emission lines are integrated over the pixels, as for the source_fluxes
+    # function of the exposure module.
+    return (
+        _read_only(spectrum.continuum(wavelengths * u.AA) * throughputs),
+        _read_only(spectrum.line_pixel_fluxes(wavelengths * u.AA) * throughputs),
+    )
+
+
+def _sky_fluxes(
+    configuration: Configuration,
+    spectrum: SourceSpectrum,
+    throughputs: np.ndarray,
+    wavelengths: np.ndarray,
+) -> np.ndarray:
+    sky = spectrum(wavelengths * u.AA, flux_unit=units.PHOTLAM).value
+    return _read_only(sky * throughputs)
+
+
+def _rebinner(configuration: Configuration, wavelengths: np.ndarray) -> Rebinner:
+    grating = cast(Grating, configuration.telescope.grating)
+    resolution_element = wavelength_resolution_element(
+        grating_angle=grating.grating_angle, grating_constant=grating.grating_constant
+    )
+    return Rebinner(wavelengths, resolution_element.to(u.AA).value)
+
+
+def _rates(
+    configuration: Configuration,
+    fluxes: np.ndarray | tuple[np.ndarray, np.ndarray],
+    rebinner: Rebinner,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Fluxes are either flux densities or a tuple of flux densities and pixel fluxes.
+    area = cast(Quantity, configuration.telescope.effective_mirror_area)
+    bin_fluxes = rebinner(*fluxes) if isinstance(fluxes, tuple) else rebinner(fluxes)
+    return (
+        _read_only(rebinner.bin_wavelength_values),
+        _read_only(area.to(u.cm**2).value * bin_fluxes),
+    )
+
+
+def _readout_noise(configuration: Configuration) -> float:
+    detector = cast(Detector, configuration.detector)
+    return readout_noise(
+        read_noise=detector.read_noise,
+        samplings=detector.samplings,
+        sampling_mode=detector.sampling_mode,
+    )
+
+
+_NODES = [
+    Node(
+        name="pixel_wavelengths",
+        dependencies=(),
+        parameters=_fields("grating_name", "grating_angle"),
+        compute=_pixel_wavelengths,
+    ),
+    Node(
+        name="source_spectrum",
+        dependencies=(),
+        parameters=lambda c: c.digest("source"),
+        compute=composite_source_spectrum,
+    ),
+    Node(
+        name="sky_spectrum",
+        dependencies=(),
+        parameters=lambda c: c.digest("sky"),
+        compute=lambda configuration: sky_spectrum(),
+    ),
+    Node(
+        name="source_throughputs",
+        dependencies=("pixel_wavelengths",),
+        parameters=lambda c: c.digest("bandpass"),
+        compute=_source_throughputs,
+    ),
+    Node(
+        name="sky_throughputs",
+        dependencies=("pixel_wavelengths",),
+        parameters=lambda c: c.digest("sky_bandpass"),
+        compute=_sky_throughputs,
+    ),
+    Node(
+        name="source_fluxes",
+        dependencies=("source_spectrum", "source_throughputs", "pixel_wavelengths"),
+        parameters=_fields(),
+        compute=_source_fluxes,
+    ),
+    Node(
+        name="sky_fluxes",
+        dependencies=("sky_spectrum", "sky_throughputs", "pixel_wavelengths"),
+        parameters=_fields(),
+        compute=_sky_fluxes,
+    ),
+    Node(
+        name="rebinner",
+        dependencies=("pixel_wavelengths",),
+        parameters=_fields("grating_name", "grating_angle"),
+        compute=_rebinner,
+    ),
+    Node(
+        name="source_rates",
+        dependencies=("source_fluxes", "rebinner"),
+        parameters=_fields("effective_mirror_area"),
+        compute=_rates,
+    ),
+    Node(
+        name="sky_rates",
+        dependencies=("sky_fluxes", "rebinner"),
+        parameters=_fields("effective_mirror_area"),
+        compute=_rates,
+    ),
+    Node(
+        name="readout_noise",
+        dependencies=(),
+        parameters=lambda c: c.digest("detector"),
+        compute=_readout_noise,
+    ),
+]
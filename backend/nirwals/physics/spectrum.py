@@ -1,9 +1,15 @@
 """Functions for generating the source and sky background spectra."""
 
+import functools
 import pathlib
-from typing import get_args
+from typing import Sequence, get_args, cast
 
-from astropy import units as u
+import numpy as np
+from astropy import constants as const, units as u
+from astropy.stats import gaussian_fwhm_to_sigma
+from astropy.units import Quantity
+from numpy.typing import ArrayLike
+from scipy import special
 from synphot import (
     BlackBodyNorm1D,
     SourceSpectrum,
@@ -23,8 +29,177 @@ from nirwals.configuration import (
     GalaxyType,
     GalaxyAge,
     Galaxy,
+    Source,
 )
-from nirwals.physics.utils import read_from_file
+from nirwals.physics.data import data_version, read_curve
+
+# The factor for converting FLAM to PHOTLAM at a wavelength of 1 A.
+_PHOTLAM_PER_FLAM_AND_AA = float(
+    units.FLAM.to(units.PHOTLAM, 1, u.spectral_density(1 * u.AA))
+)
+
+# The constant hc / k (in A K), as used in the Planck function.
+_HC_OVER_K = float((const.h * const.c / const.k_B).to(u.AA * u.K).value)
+
+
+class JohnsonJNormaliser:
+    """
+    Normalisation of spectra to Johnson J magnitudes.
+
+    The Johnson J bandpass is loaded from synphot once, when the normaliser is
+    created.
+
+    For normalising arrays of spectra, the normaliser defines a fixed wavelength grid,
+    which covers the bandpass and has a spacing of at most 1 A, and it precomputes the
+    weights for integrating flux densities on that grid. The total J band flux of any
+    number of spectra sampled on the grid then is obtained with a single matrix
+    product.
+    """
+
+    _MAX_GRID_SPACING = 1
+
+    def __init__(self) -> None:
+        self.bandpass = SpectralElement.from_filter("johnson_j")
+        bandpass_wavelengths = self.bandpass.waveset.to(u.AA).value
+
+        # Subdivide the bandpass wavelength intervals as necessary.
+        subdivisions = np.maximum(
+            np.ceil(np.diff(bandpass_wavelengths) / self._MAX_GRID_SPACING), 1
+        ).astype(int)
+        grid = [
+            np.linspace(start, end, n, endpoint=False)
+            for start, end, n in zip(
+                bandpass_wavelengths[:-1], bandpass_wavelengths[1:], subdivisions
+            )
+        ]
+        grid.append(bandpass_wavelengths[-1:])
+        self._wavelengths = np.concatenate(grid)
+        self._wavelengths.flags.writeable = False
+        self._weights = self.weights(self._wavelengths * u.AA)
+        self._weights.flags.writeable = False
+
+    @property
+    def wavelengths(self) -> Quantity:
+        """Quantity: The wavelengths of the fixed grid."""
+        return self._wavelengths * u.AA
+
+    def weights(self, wavelengths: Quantity) -> np.ndarray:
+        """
+        Return the weights for integrating flux densities over the J bandpass.
+
+        The weights are those of the trapezoidal rule, multiplied by the bandpass
+        throughput, so that the integral of a flux density f (in FLAM) over the
+        bandpass is given by the sum of weights * f(wavelengths). The resulting
+        integral is in erg / (cm^2 s).
+
+        Parameters
+        ----------
+        wavelengths: Quantity
+            Wavelengths (in ascending order) for which to calculate the weights.
+
+        Returns
+        -------
+        np.ndarray
+            The integration weights.
+        """
+        x = wavelengths.to(u.AA).value
+        dx = np.diff(x)
+        trapezoid_weights = np.zeros(len(x))
+        trapezoid_weights[:-1] += dx / 2
+        trapezoid_weights[1:] += dx / 2
+        throughputs = self.bandpass(wavelengths).to(u.dimensionless_unscaled).value
+        return cast(np.ndarray, trapezoid_weights * throughputs)
+
+    def flux(self, spectrum: SourceSpectrum) -> Quantity:
+        """
+        Return the total flux of a spectrum in the J band.
+
+        The flux is integrated over the union of the wavesets of the bandpass and the
+        spectrum, which gives the same result as synphot's integrate method for the
+        product of bandpass and spectrum.
+
+        The `waveset` property must be defined for the given source spectrum.
+
+        Parameters
+        ----------
+        spectrum: SourceSpectrum
+            The spectrum.
+
+        Returns
+        -------
+        Quantity
+            The total flux in the J band.
+        """
+        wavelengths = (
+            np.union1d(
+                self.bandpass.waveset.to(u.AA).value, spectrum.waveset.to(u.AA).value
+            )
+            * u.AA
+        )
+        flux_densities = spectrum(wavelengths, flux_unit=units.FLAM).value
+        return float(np.sum(self.weights(wavelengths) * flux_densities)) * FLUX
+
+    def fluxes(
+        self, flux_densities: np.ndarray, wavelengths: Quantity | None = None
+    ) -> Quantity:
+        """
+        Return the total J band fluxes for an array of spectra.
+
+        The flux densities must be given in FLAM, and the last axis of the array must
+        correspond to the wavelengths. If no wavelengths are given, the flux densities
+        must be given for the fixed grid, and the precomputed weights are used.
+
+        Parameters
+        ----------
+        flux_densities: np.ndarray
+            Flux densities (in FLAM), as an array of shape (..., number of
+            wavelengths).
+        wavelengths: Quantity, optional
+            Wavelengths for which the flux densities are given.
+
+        Returns
+        -------
+        Quantity
+            The total J band fluxes, as an array of shape (...).
+        """
+        weights = self._weights if wavelengths is None else self.weights(wavelengths)
+        return np.asarray(flux_densities) @ weights * FLUX
+
+    def normalisation_factors(
+        self, fluxes: Quantity, magnitudes: ArrayLike
+    ) -> np.ndarray:
+        """
+        Return the factors for normalising spectra to given J magnitudes.
+
+        Parameters
+        ----------
+        fluxes: Quantity
+            Total J band fluxes of the non-normalised spectra.
+        magnitudes: array-like
+            Magnitudes the normalised spectra should have.
+
+        Returns
+        -------
+        np.ndarray
+            The normalisation factors, broadcast over the fluxes and magnitudes.
+        """
+        # Get the total (normalised) flux for the given magnitudes.
+        F_m = 10 ** (-0.4 * np.asarray(magnitudes, dtype=float)) * ZERO_MAGNITUDE_FLUX
+
+        return cast(np.ndarray, (F_m / fluxes).to(u.dimensionless_unscaled).value)
+
+
+@functools.cache
+def johnson_j_normaliser() -> JohnsonJNormaliser:
+    """
+    Return the process-wide Johnson J normaliser.
+
+    Returns
+    -------
+    JohnsonJNormaliser
+        The normaliser.
+    """
+    return JohnsonJNormaliser()
 
 
 def normalize(spectrum: SourceSpectrum, magnitude: float) -> SourceSpectrum:
@@ -46,21 +221,29 @@ def normalize(spectrum: SourceSpectrum, magnitude: float) -> SourceSpectrum:
         The normalized spectrum.
     """
     # Get the total non-normalised flux in the J band.
-    J = SpectralElement.from_filter("johnson_j")
-    F = (J * spectrum).integrate(flux_unit=units.FLAM)
-
-    # Get the total (normalised) flux for the given magnitude.
-    F_m = 10 ** (-0.4 * magnitude) * ZERO_MAGNITUDE_FLUX
+    normaliser = johnson_j_normaliser()
+    F = normaliser.flux(spectrum)
 
     # Normalise the spectrum.
-    normalisation_factor = float(F_m / F)
+    normalisation_factor = float(normaliser.normalisation_factors(F, magnitude))
     return normalisation_factor * spectrum
 
 
 @u.quantity_input
 def _blackbody(temperature: u.K, magnitude: float) -> SourceSpectrum:
     spectrum = SourceSpectrum(BlackBodyNorm1D, temperature=temperature)
-    return normalize(spectrum, magnitude)
+
+    # The spectrum is proportional to the Planck function, so that its J band flux
+    # follows from the blackbody bank. The proportionality factor is obtained by
+    # evaluating the spectrum at a single wavelength.
+    reference_wavelength = 12500 * u.AA
+    planck = _planck_flam(
+        np.array([reference_wavelength.value]),
+        np.array([temperature.to(u.K, equivalencies=u.temperature()).value]),
+    )[0, 0]
+    scale = float(spectrum(reference_wavelength, flux_unit=units.FLAM).value) / planck
+    factor = float(blackbody_bank().normalisation_factors(temperature, magnitude))
+    return (factor / scale) * spectrum
 
 
 @u.quantity_input
@@ -80,6 +263,563 @@ def _emission_line(
     )
 
 
+@u.quantity_input
+def emission_line_fluxes(
+    central_wavelength: u.AA,
+    fwhm: u.AA,
+    total_flux: FLUX,
+    redshifts: ArrayLike,
+    wavelengths: u.AA,
+) -> np.ndarray:
+    """
+    Return the flux densities of an emission line for an array of redshifts.
+
+    The line is the same Gaussian as the one created by the _emission_line function,
+    so that its total flux is conserved when it is redshifted, but it is evaluated
+    directly rather than as a synphot model.
+
+    Parameters
+    ----------
+    central_wavelength: Quantity
+        Rest frame central wavelength of the line.
+    fwhm: Quantity
+        Rest frame full width at half maximum of the line.
+    total_flux: Quantity
+        Total flux of the line.
+    redshifts: array-like
+        The redshifts.
+    wavelengths: Quantity
+        Wavelengths for which to calculate the flux densities.
+
+    Returns
+    -------
+    np.ndarray
+        The flux densities (in PHOTLAM), as an array of shape (..., number of
+        wavelengths), where ... is the shape of the redshifts.
+    """
+    mean = central_wavelength.to(u.AA).value
+    sigma = fwhm.to(u.AA).value * gaussian_fwhm_to_sigma
+    amplitude = (total_flux / (np.sqrt(2 * np.pi) * sigma * u.AA)).to(
+        units.PHOTLAM, u.spectral_density(central_wavelength)
+    )
+    z = np.asarray(redshifts, dtype=float)[..., np.newaxis]
+    rest_wavelengths = wavelengths.to(u.AA).value / (1 + z)
+    return cast(
+        np.ndarray,
+        amplitude.value
+        * np.exp(-0.5 * ((rest_wavelengths - mean) / sigma) ** 2)
+        / (1 + z),
+    )
+
+
+def emission_lines_fluxes(
+    lines: Sequence[EmissionLine], wavelengths: Quantity
+) -> np.ndarray:
+    """
+    Return the flux densities of a list of emission lines.
+
+    The lines are the same Gaussians as those created by the _emission_line function,
+    but all of them are evaluated in a single vectorised expression, without creating
+    any synphot models. A line redshifted to z is a Gaussian with mean and standard
+    deviation scaled by (1 + z) and amplitude divided by (1 + z).
+
+    Parameters
+    ----------
+    lines: sequence of EmissionLine
+        The emission lines.
+    wavelengths: Quantity
+        Wavelengths for which to calculate the flux densities.
+
+    Returns
+    -------
+    np.ndarray
+        The flux densities (in PHOTLAM), as an array of shape (number of lines,
+        number of wavelengths).
+    """
+    if not lines:
+        return np.zeros((0, len(wavelengths)))
+    photon_fluxes, means, sigmas = _line_parameters(lines)
+    x = wavelengths.to(u.AA).value
+    offsets = (x - means[:, np.newaxis]) / sigmas[:, np.newaxis]
+    amplitudes = photon_fluxes / (np.sqrt(2 * np.pi) * sigmas)
+    return cast(np.ndarray, amplitudes[:, np.newaxis] * np.exp(-0.5 * offsets**2))
+
+
+def emission_lines_pixel_fluxes(
+    lines: Sequence[EmissionLine], wavelengths: Quantity
+) -> np.ndarray:
+    """
+    Return the fluxes of a list of emission lines, integrated over pixels.
+
+    The wavelengths must be equidistant pixel midpoints along the last axis, as for
+    the bin_fluxes function in the kernels module. The lines are the same Gaussians
+    as for the emission_lines_fluxes function, but rather than sampling them at the
+    pixel midpoints, they are integrated exactly over the pixels with the error
+    function. Hence the total line flux is conserved however narrow the lines are
+    compared to the pixels.
+
+    Parameters
+    ----------
+    lines: sequence of EmissionLine
+        The emission lines.
+    wavelengths: Quantity
+        Pixel midpoints, as an array of shape (..., number of pixels).
+
+    Returns
+    -------
+    np.ndarray
+        The pixel fluxes (in PHOTLAM * Angstrom), as an array of shape (number of
+        lines, ..., number of pixels).
+    """
+    x = wavelengths.to(u.AA).value
+    if not lines:
+        return np.zeros((0, *x.shape))
+    photon_fluxes, means, sigmas = _line_parameters(lines)
+    index = (slice(None),) + (np.newaxis,) * x.ndim
+    return _gaussian_pixel_fluxes(photon_fluxes[index], means[index], sigmas[index], x)
+
+
+@u.quantity_input
+def emission_line_pixel_fluxes(
+    central_wavelength: u.AA,
+    fwhm: u.AA,
+    total_flux: FLUX,
+    redshifts: ArrayLike,
+    wavelengths: u.AA,
+) -> np.ndarray:
+    """
+    Return the fluxes of an emission line integrated over pixels, for many redshifts.
+
+    This is the pixel-integrated counterpart of the emission_line_fluxes function.
+    See the emission_lines_pixel_fluxes function for details.
+
+    Parameters
+    ----------
+    central_wavelength: Quantity
+        Rest frame central wavelength of the line.
+    fwhm: Quantity
+        Rest frame full width at half maximum of the line.
+    total_flux: Quantity
+        Total flux of the line.
+    redshifts: array-like
+        The redshifts.
+    wavelengths: Quantity
+        Equidistant pixel midpoints.
+
+    Returns
+    -------
+    np.ndarray
+        The pixel fluxes (in PHOTLAM * Angstrom), as an array of shape (..., number of
+        pixels), where ... is the shape of the redshifts.
+    """
+    line = EmissionLine(
+        central_wavelength=central_wavelength,
+        fwhm=fwhm,
+        redshift=0,
+        total_flux=total_flux,
+    )
+    photon_fluxes, means, sigmas = _line_parameters([line])
+    stretches = 1 + np.asarray(redshifts, dtype=float)[..., np.newaxis]
+    return _gaussian_pixel_fluxes(
+        photon_fluxes, means * stretches, sigmas * stretches, wavelengths.to(u.AA).value
+    )
+
+
+def _line_parameters(
+    lines: Sequence[EmissionLine],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Returns the total photon fluxes (in PHOTLAM * Angstrom), means and standard
+    # deviations (in Angstrom) of the observed, i.e. redshifted, Gaussians. The total
+    # fluxes are converted from energy to photon fluxes at the rest frame central
+    # wavelengths, as for GaussianFlux1D, and they do not change with redshift.
+    rest_means = np.array([line.central_wavelength.to(u.AA).value for line in lines])
+    rest_sigmas = gaussian_fwhm_to_sigma * np.array(
+        [line.fwhm.to(u.AA).value for line in lines]
+    )
+    total_fluxes = np.array([line.total_flux.to(FLUX).value for line in lines])
+    stretches = 1 + np.array([line.redshift for line in lines], dtype=float)
+    photon_fluxes = total_fluxes * _PHOTLAM_PER_FLAM_AND_AA * rest_means
+    return photon_fluxes, rest_means * stretches, rest_sigmas * stretches
+
+
+def _gaussian_pixel_fluxes(
+    photon_fluxes: np.ndarray, means: np.ndarray, sigmas: np.ndarray, x: np.ndarray
+) -> np.ndarray:
+    # Integrates Gaussians with the given total fluxes, means and standard deviations
+    # over the pixels with the equidistant midpoints x. The Gaussian parameters must
+    # have a trailing axis of length 1, and they are broadcast against x. The
+    # cumulative distribution function is evaluated once per pixel edge, so that the
+    # pixel fluxes add up exactly to the flux between the outermost edges.
+    dx = x[..., 1:2] - x[..., :1]
+    edges = np.concatenate((x - dx / 2, x[..., -1:] + dx / 2), axis=-1)
+    cdf = special.erf((edges - means) / (np.sqrt(2) * sigmas))
+    return cast(np.ndarray, 0.5 * photon_fluxes * np.diff(cdf, axis=-1))
+
+
+class CompositeSpectrum:
+    """
+    A sum of spectrum components, which is evaluated without synphot models.
+
+    The components are grouped by kind when the composite spectrum is created. When
+    the spectrum is evaluated, all blackbodies are calculated with the
+    blackbody_fluxes function, all galaxies with the galaxy_fluxes function and all
+    emission lines with the emission_lines_fluxes function, so that the cost does not
+    depend on the number of components of a kind beyond the array arithmetic.
+    Emission lines are evaluated in chunks of lines, so that line lists with hundreds
+    of lines need a bounded amount of memory.
+
+    The flux densities are the same as those of the corresponding synphot spectrum,
+    except that galaxy flux densities are zero outside the template range.
+
+    For binning the spectrum into pixels, the continuum (i.e. all components other
+    than the emission lines) should be sampled with the continuum method, and the
+    emission lines should be integrated over the pixels with the line_pixel_fluxes
+    method, so that narrow lines do not require a fine wavelength grid.
+
+    Parameters
+    ----------
+    spectra: sequence of Spectrum
+        The spectrum components.
+    """
+
+    # Number of emission lines which are evaluated together.
+    _LINE_CHUNK_SIZE = 64
+
+    def __init__(self, spectra: Sequence[Spectrum]) -> None:
+        for s in spectra:
+            if type(s) not in (Blackbody, EmissionLine, Galaxy):
+                raise ValueError(f"Unsupported spectrum type: {type(s)}")
+        self.blackbodies = [s for s in spectra if type(s) is Blackbody]
+        self.galaxies = [s for s in spectra if type(s) is Galaxy]
+        self.emission_lines = [s for s in spectra if type(s) is EmissionLine]
+
+    @u.quantity_input
+    def __call__(self, wavelengths: u.AA) -> np.ndarray:
+        """
+        Return the flux densities of the spectrum.
+
+        Parameters
+        ----------
+        wavelengths: Quantity
+            Wavelengths for which to calculate the flux densities.
+
+        Returns
+        -------
+        np.ndarray
+            The flux densities (in PHOTLAM).
+        """
+        fluxes = cast(np.ndarray, self.continuum(wavelengths))
+        for start in range(0, len(self.emission_lines), self._LINE_CHUNK_SIZE):
+            fluxes += emission_lines_fluxes(
+                self.emission_lines[start : start + self._LINE_CHUNK_SIZE],
+                wavelengths,
+            ).sum(axis=0)
+        return fluxes
+
+    @u.quantity_input
+    def continuum(self, wavelengths: u.AA) -> np.ndarray:
+        """
+        Return the flux densities of all components except the emission lines.
+
+        Parameters
+        ----------
+        wavelengths: Quantity
+            Wavelengths for which to calculate the flux densities.
+
+        Returns
+        -------
+        np.ndarray
+            The flux densities (in PHOTLAM).
+        """
+        fluxes = np.zeros(len(wavelengths))
+        if self.blackbodies:
+            fluxes += blackbody_fluxes(
+                temperatures=u.Quantity([b.temperature for b in self.blackbodies]),
+                magnitudes=[b.magnitude for b in self.blackbodies],
+                wavelengths=wavelengths,
+            ).sum(axis=0)
+        if self.galaxies:
+            bank = galaxy_template_bank()
+            fluxes += galaxy_fluxes(
+                indices=[
+                    bank.index(g.age, g.galaxy_type, g.with_emission_lines)
+                    for g in self.galaxies
+                ],
+                redshifts=[g.redshift for g in self.galaxies],
+                magnitudes=[g.magnitude for g in self.galaxies],
+                wavelengths=wavelengths,
+            ).sum(axis=0)
+        return fluxes
+
+    @u.quantity_input
+    def line_pixel_fluxes(self, wavelengths: u.AA) -> np.ndarray:
+        """
+        Return the total flux of the emission lines, integrated over pixels.
+
+        See the emission_lines_pixel_fluxes function for details.
+
+        Parameters
+        ----------
+        wavelengths: Quantity
+            Pixel midpoints, as an array of shape (..., number of pixels).
+
+        Returns
+        -------
+        np.ndarray
+            The pixel fluxes (in PHOTLAM * Angstrom), with the shape of the
+            wavelengths.
+        """
+        fluxes = np.zeros(wavelengths.shape)
+        for start in range(0, len(self.emission_lines), self._LINE_CHUNK_SIZE):
+            fluxes += emission_lines_pixel_fluxes(
+                self.emission_lines[start : start + self._LINE_CHUNK_SIZE],
+                wavelengths,
+            ).sum(axis=0)
+        return fluxes
+
+
+class GalaxyTemplateBank:
+    """
+    The galaxy templates, resampled onto a common logarithmic wavelength grid.
+
+    All the galaxy templates (for all ages and galaxy types, with and without emission
+    lines) are read in when the bank is created and are stored in a single array of
+    shape (number of templates, number of wavelengths).
+
+    The wavelength grid is uniform in log(wavelength), so that redshifting a template
+    amounts to shifting the template by ln(1 + z) / (grid spacing) indices. The grid
+    spacing is the smallest spacing in log(wavelength) found in the template files, but
+    the grid has at most 2^17 wavelengths.
+    """
+
+    _MAX_GRID_SIZE = 2**17
+
+    def __init__(self) -> None:
+        self.keys = [
+            (age, galaxy_type, with_emission_lines)
+            for age in get_args(GalaxyAge)
+            for galaxy_type in get_args(GalaxyType)
+            for with_emission_lines in (False, True)
+        ]
+        curves = [read_curve(self._path(*key), unit=units.FLAM) for key in self.keys]
+        log_wavelengths = [np.log(c[0].to(u.AA).value) for c in curves]
+
+        # Define the common grid. The curves are padded with zeros outside the
+        # wavelength range of the template files (see read_from_file in the
+        # nirwals.physics.utils module), and the grid only needs to cover the range
+        # where the templates are non-zero.
+        nonzero = [np.flatnonzero(c[1].value) for c in curves]
+        log_min = min(lw[i[0]] for lw, i in zip(log_wavelengths, nonzero))
+        log_max = max(lw[i[-1]] for lw, i in zip(log_wavelengths, nonzero))
+        step = min(
+            np.diff(lw[i[0] : i[-1] + 1]).min()
+            for lw, i in zip(log_wavelengths, nonzero)
+        )
+        step = max(step, (log_max - log_min) / (self._MAX_GRID_SIZE - 1))
+        size = int(np.ceil((log_max - log_min) / step - 1e-9)) + 1
+        self.log_step = (log_max - log_min) / (size - 1)
+        self._log_wavelengths = np.linspace(log_min, log_max, size)
+        self._log_wavelengths.flags.writeable = False
+
+        # Resample the templates. Templates are zero outside their wavelength range.
+        self._fluxes = np.empty((len(self.keys), size))
+        for i, (lw, (_, fluxes)) in enumerate(zip(log_wavelengths, curves)):
+            self._fluxes[i] = np.interp(
+                self._log_wavelengths, lw, fluxes.value, left=0, right=0
+            )
+        self._fluxes.flags.writeable = False
+
+    @property
+    def wavelengths(self) -> Quantity:
+        """Quantity: The (rest frame) wavelengths of the grid."""
+        return np.exp(self._log_wavelengths) * u.AA
+
+    def index(
+        self, age: GalaxyAge, galaxy_type: GalaxyType, with_emission_lines: bool
+    ) -> int:
+        """
+        Return the index of a template in the bank.
+
+        Parameters
+        ----------
+        age: GalaxyAge
+            The galaxy age.
+        galaxy_type: GalaxyType
+            The galaxy type.
+        with_emission_lines: bool
+            Whether the template includes emission lines.
+
+        Returns
+        -------
+        int
+            The template index.
+        """
+        if age not in get_args(GalaxyAge):
+            raise ValueError(f"Unsupported galaxy age: {age}")
+        if galaxy_type not in get_args(GalaxyType):
+            raise ValueError(f"Unsupported galaxy type: {galaxy_type}")
+        return self.keys.index((age, galaxy_type, with_emission_lines))
+
+    def spectrum(self, index: int, redshift: float) -> SourceSpectrum:
+        """
+        Return a redshifted template as a source spectrum.
+
+        The wavelength grid is stretched by a factor 1 + z and the flux densities are
+        divided by 1 + z, so that the total flux is conserved.
+
+        Parameters
+        ----------
+        index: int
+            The template index.
+        redshift: float
+            The redshift.
+
+        Returns
+        -------
+        SourceSpectrum
+            The redshifted template.
+        """
+        return SourceSpectrum(
+            Empirical1D,
+            points=(1 + redshift) * self.wavelengths,
+            lookup_table=self._fluxes[index] / (1 + redshift) * units.FLAM,
+        )
+
+    def redshifted_fluxes(
+        self, indices: ArrayLike, redshifts: ArrayLike
+    ) -> tuple[Quantity, np.ndarray]:
+        """
+        Return redshifted templates on the (observed frame) wavelength grid.
+
+        The indices and redshifts are broadcast against each other. Each template is
+        shifted by ln(1 + z) / (grid spacing) indices, and linear interpolation is used
+        for the fractional part of the shift. Flux densities are divided by 1 + z, so
+        that the total flux is conserved, and they are zero outside the template
+        range.
+
+        Parameters
+        ----------
+        indices: array-like
+            The template indices.
+        redshifts: array-like
+            The redshifts.
+
+        Returns
+        -------
+        tuple
+            The wavelengths of the grid and an array of shape (..., number of
+            wavelengths) with the flux densities, in FLAM.
+        """
+        indices, redshifts = np.broadcast_arrays(
+            np.asarray(indices, dtype=int), np.asarray(redshifts, dtype=float)
+        )
+        size = len(self._log_wavelengths)
+
+        # Find the rest frame index corresponding to each observed frame index.
+        shifts = np.log1p(redshifts) / self.log_step
+        rest_indices = np.arange(size) - shifts[..., np.newaxis]
+        lower = np.floor(rest_indices).astype(int)
+        fractions = rest_indices - lower
+        inside = (lower >= 0) & (lower < size - 1)
+        lower = np.clip(lower, 0, size - 2)
+
+        # Interpolate.
+        templates = self._fluxes[indices][..., np.newaxis, :]
+        lower_fluxes = np.take_along_axis(templates, lower[..., np.newaxis, :], -1)
+        upper_fluxes = np.take_along_axis(templates, lower[..., np.newaxis, :] + 1, -1)
+        fluxes = (1 - fractions) * lower_fluxes[..., 0, :]
+        fluxes += fractions * upper_fluxes[..., 0, :]
+        fluxes = np.where(inside, fluxes, 0) / (1 + redshifts[..., np.newaxis])
+
+        return self.wavelengths, fluxes
+
+    def fluxes_at(
+        self, indices: ArrayLike, redshifts: ArrayLike, wavelengths: Quantity
+    ) -> np.ndarray:
+        """
+        Return redshifted templates at arbitrary (observed frame) wavelengths.
+
+        The indices and redshifts are broadcast against each other. The templates are
+        evaluated at the rest frame wavelengths lambda / (1 + z) by linear
+        interpolation in log(wavelength), which is the same interpolation as that
+        used by the redshifted_fluxes method. Flux densities are divided by 1 + z, so
+        that the total flux is conserved, and they are zero outside the template
+        range.
+
+        Only the requested wavelengths are evaluated, which is much faster than
+        redshifting the whole template grid if there are few wavelengths.
+
+        Parameters
+        ----------
+        indices: array-like
+            The template indices.
+        redshifts: array-like
+            The redshifts.
+        wavelengths: Quantity
+            One-dimensional array of wavelengths.
+
+        Returns
+        -------
+        np.ndarray
+            An array of shape (..., number of wavelengths) with the flux densities, in
+            FLAM.
+        """
+        indices, redshifts = np.broadcast_arrays(
+            np.asarray(indices, dtype=int), np.asarray(redshifts, dtype=float)
+        )
+        size = len(self._log_wavelengths)
+        grid_positions = (
+            np.log(wavelengths.to(u.AA).value) - self._log_wavelengths[0]
+        ) / self.log_step
+
+        # Find the rest frame (fractional) index for each wavelength.
+        shifts = np.log1p(redshifts) / self.log_step
+        rest_indices = grid_positions - shifts[..., np.newaxis]
+        lower = np.floor(rest_indices).astype(int)
+        fractions = rest_indices - lower
+        inside = (lower >= 0) & (lower < size - 1)
+        lower = np.clip(lower, 0, size - 2)
+
+        # Interpolate.
+        rows = indices[..., np.newaxis]
+        fluxes = (1 - fractions) * self._fluxes[rows, lower]
+        fluxes += fractions * self._fluxes[rows, lower + 1]
+        return cast(
+            np.ndarray,
+            np.where(inside, fluxes, 0) / (1 + redshifts[..., np.newaxis]),
+        )
+
+    @staticmethod
+    def _path(
+        age: GalaxyAge, galaxy_type: GalaxyType, with_emission_lines: bool
+    ) -> pathlib.Path:
+        filename = (
+            f"{age}_{galaxy_type}_type_"
+            f"{'emission' if with_emission_lines else 'no_emission'}.npz"
+        )
+        return get_file_base_dir() / "galaxies" / filename
+
+
+def galaxy_template_bank() -> GalaxyTemplateBank:
+    """
+    Return the process-wide galaxy template bank.
+
+    The bank is created anew if the data version changes.
+
+    Returns
+    -------
+    GalaxyTemplateBank
+        The galaxy template bank.
+    """
+    return _galaxy_template_bank(data_version())
+
+
+@functools.lru_cache(maxsize=1)
+def _galaxy_template_bank(version: str) -> GalaxyTemplateBank:
+    # The galaxy template bank for a data version.
+    return GalaxyTemplateBank()
+
+
 def _galaxy(
     age: GalaxyAge,
     galaxy_type: GalaxyType,
@@ -87,29 +827,284 @@ def _galaxy(
     redshift: float,
     with_emission_lines: bool,
 ) -> SourceSpectrum:
-    # Sanity checks
-    if age not in get_args(GalaxyAge):
-        raise ValueError(f"Unsupported galaxy age: {age}")
-    if galaxy_type not in get_args(GalaxyType):
-        raise ValueError(f"Unsupported galaxy type: {galaxy_type}")
-
-    # Read in the galaxy spectrum from the relevant file.
-    filename = (
-        f"{age}_{galaxy_type}_type_"
-        f"{'emission' if with_emission_lines else 'no_emission'}.npz"
+    bank = galaxy_template_bank()
+    index = bank.index(age, galaxy_type, with_emission_lines)
+    return normalize(bank.spectrum(index, redshift), magnitude)
+
+
+def galaxy_fluxes(
+    indices: ArrayLike,
+    redshifts: ArrayLike,
+    magnitudes: ArrayLike,
+    wavelengths: Quantity,
+) -> np.ndarray:
+    """
+    Return normalised galaxy spectra for arrays of templates, redshifts and magnitudes.
+
+    The template indices (see the index method of the GalaxyTemplateBank class),
+    redshifts and magnitudes are broadcast against each other. The redshifted
+    templates are taken from the galaxy template bank and normalised with the Johnson
+    J normaliser, so that no synphot models are created. Flux densities are zero
+    outside the template range.
+
+    Parameters
+    ----------
+    indices: array-like
+        The template indices.
+    redshifts: array-like
+        The redshifts.
+    magnitudes: array-like
+        The Johnson J magnitudes.
+    wavelengths: Quantity
+        Wavelengths for which to calculate the flux densities.
+
+    Returns
+    -------
+    np.ndarray
+        The flux densities (in PHOTLAM), as an array of shape (..., number of
+        wavelengths).
+    """
+    indices, redshifts, magnitudes = np.broadcast_arrays(
+        np.asarray(indices, dtype=int),
+        np.asarray(redshifts, dtype=float),
+        np.asarray(magnitudes, dtype=float),
     )
-    file_path = get_file_base_dir() / "galaxies" / filename
-    with open(file_path, "rb") as f:
-        wavelengths, fluxes = read_from_file(f, unit=units.FLAM)
-
-    spectrum = SourceSpectrum(
-        Empirical1D,
-        points=wavelengths,
-        lookup_table=fluxes,
-        z=redshift,
-        z_type="conserve_flux",
+    bank = galaxy_template_bank()
+    normaliser = johnson_j_normaliser()
+    j_wavelengths, j_weights = galaxy_j_band_grid()
+    j_fluxes = bank.fluxes_at(indices, redshifts, j_wavelengths) @ j_weights * FLUX
+    factors = normaliser.normalisation_factors(j_fluxes, magnitudes)
+    return cast(
+        np.ndarray,
+        factors[..., np.newaxis]
+        * bank.fluxes_at(indices, redshifts, wavelengths)
+        * _photlam_per_flam(wavelengths),
+    )
+
+
+def galaxy_j_band_grid() -> tuple[Quantity, np.ndarray]:
+    """
+    Return the grid used for normalising galaxy templates.
+
+    The grid consists of the wavelengths of the galaxy template grid for which the
+    Johnson J bandpass is non-zero, and the corresponding integration weights. For
+    z = 0 integrating on this grid gives the same result as integrating on the whole
+    template grid. For z > 0 the redshifted template is sampled at these (rest
+    frame) grid points, so that the J band flux is an approximation of that obtained
+    by integrating the redshifted spectrum on its own grid.
+
+    The grid is created anew if the data version changes.
+
+    Returns
+    -------
+    tuple
+        The wavelengths and the integration weights.
+    """
+    return _galaxy_j_band_grid(data_version())
+
+
+@functools.lru_cache(maxsize=1)
+def _galaxy_j_band_grid(version: str) -> tuple[Quantity, np.ndarray]:
+    # The galaxy J band grid for a data version.
+    wavelengths = galaxy_template_bank().wavelengths
+    weights = johnson_j_normaliser().weights(wavelengths)
+    nonzero = weights != 0
+    return wavelengths[nonzero], weights[nonzero]
+
+
+def _photlam_per_flam(wavelengths: Quantity) -> np.ndarray:
+    # The factor for converting flux densities from FLAM to PHOTLAM, which is
+    # lambda / (h c).
+    return cast(np.ndarray, _PHOTLAM_PER_FLAM_AND_AA * wavelengths.to(u.AA).value)
+
+
+class BlackbodyBank:
+    """
+    Johnson J band fluxes of blackbody spectra for a grid of temperatures.
+
+    The J band flux of a blackbody spectrum only depends on its temperature. The bank
+    integrates the Planck function over the J bandpass once, for a grid of
+    temperatures which is equidistant in log(T), and it stores the logarithm of the
+    integral and its derivative with respect to log(T). The J band fluxes for
+    arbitrary temperatures within the grid range then are obtained by cubic Hermite
+    interpolation, and blackbody spectra can be normalised without any integration.
+    For temperatures outside the grid range, the Planck function is integrated on the
+    fixed grid of the Johnson J normaliser.
+
+    All fluxes refer to the Planck function as returned by the _planck_flam function,
+    which is proportional to the flux density in FLAM.
+    """
+
+    MIN_TEMPERATURE = 100 * u.K
+    MAX_TEMPERATURE = 1e6 * u.K
+
+    # Spacing of the temperature grid, in dex.
+    _GRID_SPACING = 0.005
+
+    # Number of temperatures for which the Planck function is integrated together.
+    _CHUNK_SIZE = 128
+
+    def __init__(self) -> None:
+        min_log_t = np.log10(self.MIN_TEMPERATURE.to(u.K).value)
+        max_log_t = np.log10(self.MAX_TEMPERATURE.to(u.K).value)
+        n = int(round((max_log_t - min_log_t) / self._GRID_SPACING)) + 1
+        self._ln_temperatures = np.log(10) * np.linspace(min_log_t, max_log_t, n)
+        self._step = self._ln_temperatures[1] - self._ln_temperatures[0]
+
+        # The derivative of the Planck function B with respect to T is
+        # B x exp(x) / (T (exp(x) - 1)) with x = hc / (lambda k T), so that
+        # d ln(F) / d ln(T) = (integral of B x / (1 - exp(-x))) / F for the J band
+        # flux F.
+        normaliser = johnson_j_normaliser()
+        wavelengths = normaliser.wavelengths.value
+        temperatures = np.exp(self._ln_temperatures)
+        ln_fluxes = np.empty(n)
+        slopes = np.empty(n)
+        for start in range(0, n, self._CHUNK_SIZE):
+            chunk = slice(start, start + self._CHUNK_SIZE)
+            planck = _planck_flam(wavelengths, temperatures[chunk])
+            x = _HC_OVER_K / (wavelengths * temperatures[chunk, np.newaxis])
+            fluxes = normaliser.fluxes(planck).value
+            ln_fluxes[chunk] = np.log(fluxes)
+            slopes[chunk] = normaliser.fluxes(planck * x / -np.expm1(-x)).value / fluxes
+        self._ln_fluxes = ln_fluxes
+        self._slopes = slopes
+
+    @u.quantity_input
+    def fluxes(self, temperatures: u.K) -> np.ndarray:
+        """
+        Return the J band fluxes of the Planck function for an array of temperatures.
+
+        Parameters
+        ----------
+        temperatures: Quantity
+            The temperatures.
+
+        Returns
+        -------
+        np.ndarray
+            The J band fluxes, in the units of the Johnson J normaliser's fluxes
+            method, with the same shape as the temperatures.
+        """
+        t = np.asarray(
+            temperatures.to(u.K, equivalencies=u.temperature()).value, dtype=float
+        )
+        fluxes = np.empty(t.shape)
+
+        # Interpolate within the grid range.
+        inside = (t >= self.MIN_TEMPERATURE.to(u.K).value) & (
+            t <= self.MAX_TEMPERATURE.to(u.K).value
+        )
+        positions = (np.log(t[inside]) - self._ln_temperatures[0]) / self._step
+        lower = np.minimum(positions.astype(int), len(self._ln_temperatures) - 2)
+        s = positions - lower
+        h00 = (1 + 2 * s) * (1 - s) ** 2
+        h10 = s * (1 - s) ** 2
+        h01 = s**2 * (3 - 2 * s)
+        h11 = s**2 * (s - 1)
+        fluxes[inside] = np.exp(
+            h00 * self._ln_fluxes[lower]
+            + h10 * self._step * self._slopes[lower]
+            + h01 * self._ln_fluxes[lower + 1]
+            + h11 * self._step * self._slopes[lower + 1]
+        )
+
+        # Integrate outside the grid range.
+        if not np.all(inside):
+            normaliser = johnson_j_normaliser()
+            fluxes[~inside] = normaliser.fluxes(
+                _planck_flam(normaliser.wavelengths.value, t[~inside])
+            ).value
+        return fluxes
+
+    @u.quantity_input
+    def normalisation_factors(
+        self, temperatures: u.K, magnitudes: ArrayLike
+    ) -> np.ndarray:
+        """
+        Return the factors for normalising the Planck function to given J magnitudes.
+
+        Parameters
+        ----------
+        temperatures: Quantity
+            The temperatures.
+        magnitudes: array-like
+            Magnitudes the normalised spectra should have.
+
+        Returns
+        -------
+        np.ndarray
+            The normalisation factors, broadcast over the temperatures and
+            magnitudes.
+        """
+        return johnson_j_normaliser().normalisation_factors(
+            self.fluxes(temperatures) * FLUX, magnitudes
+        )
+
+
+@functools.cache
+def blackbody_bank() -> BlackbodyBank:
+    """
+    Return the process-wide blackbody bank.
+
+    Returns
+    -------
+    BlackbodyBank
+        The blackbody bank.
+    """
+    return BlackbodyBank()
+
+
+@u.quantity_input
+def blackbody_fluxes(
+    temperatures: u.K, magnitudes: ArrayLike, wavelengths: u.AA
+) -> np.ndarray:
+    """
+    Return normalised blackbody spectra for arrays of temperatures and magnitudes.
+
+    The temperatures and magnitudes are broadcast against each other. The spectra are
+    the same as those created by the _blackbody function, but they are calculated
+    with the Planck function and normalised with the J band fluxes of the blackbody
+    bank, so that neither synphot models are created nor integrations are carried
+    out.
+
+    Parameters
+    ----------
+    temperatures: Quantity
+        The temperatures.
+    magnitudes: array-like
+        The Johnson J magnitudes.
+    wavelengths: Quantity
+        Wavelengths for which to calculate the flux densities.
+
+    Returns
+    -------
+    np.ndarray
+        The flux densities (in PHOTLAM), as an array of shape (..., number of
+        wavelengths).
+    """
+    temperature_values, magnitude_values = np.broadcast_arrays(
+        temperatures.to(u.K, equivalencies=u.temperature()).value,
+        np.asarray(magnitudes, dtype=float),
+    )
+    factors = blackbody_bank().normalisation_factors(
+        temperature_values * u.K, magnitude_values
     )
-    return normalize(spectrum, magnitude)
+    return cast(
+        np.ndarray,
+        factors[..., np.newaxis]
+        * _planck_flam(wavelengths.to(u.AA).value, temperature_values)
+        * _photlam_per_flam(wavelengths),
+    )
+
+
+def _planck_flam(wavelengths: np.ndarray, temperatures: np.ndarray) -> np.ndarray:
+    # The Planck function for the given wavelengths (in Angstrom) and temperatures
+    # (in Kelvin), up to a constant factor, as an array of shape (..., number of
+    # wavelengths). Only the shape matters, as the spectra are normalised.
+    exponents = _HC_OVER_K / (wavelengths * temperatures[..., np.newaxis])
+    with np.errstate(over="ignore"):
+        return cast(np.ndarray, (wavelengths / 1e4) ** -5 / np.expm1(exponents))
 
 
 def _spectrum(spectrum: Spectrum) -> SourceSpectrum:
@@ -160,6 +1155,143 @@ def source_spectrum(configuration: Configuration) -> SourceSpectrum:
     return summed_spectrum
 
 
+def composite_source_spectrum(configuration: Configuration) -> CompositeSpectrum:
+    """
+    Return the source spectrum for a given configuration as a composite spectrum.
+
+    The composite spectrum has the same flux densities as the spectrum returned by
+    the source_spectrum function (except outside the galaxy template range), but
+    evaluating it does not involve any synphot models. See the CompositeSpectrum
+    class for details.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+
+    Returns
+    -------
+    CompositeSpectrum
+        The source spectrum.
+    """
+    if configuration.source is None:
+        raise ValueError("Source missing in configuration")
+
+    return CompositeSpectrum(configuration.source.spectrum)
+
+
+def redshifted_source_fluxes(
+    configuration: Configuration,
+    redshifts: ArrayLike,
+    wavelengths: Quantity,
+    emission_lines: bool = True,
+) -> np.ndarray:
+    """
+    Return the source flux densities for an array of redshifts.
+
+    The redshift of all galaxy and emission line components of the source is replaced
+    with each of the given redshifts in turn, while any other components are the same
+    for all redshifts. Galaxy templates are taken from the galaxy template bank and
+    normalised with the Johnson J normaliser, and emission lines are evaluated with
+    the emission_line_fluxes function, so that no synphot models need to be created
+    for the individual redshifts. Galaxy flux densities are zero outside the template
+    range.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    redshifts: array-like
+        Redshift or one-dimensional array of redshifts.
+    wavelengths: Quantity
+        Wavelengths for which to calculate the flux densities.
+    emission_lines: bool
+        Whether to include the emission line components. They can be excluded and
+        integrated over pixels with the redshifted_line_pixel_fluxes function instead.
+
+    Returns
+    -------
+    np.ndarray
+        The flux densities (in PHOTLAM), as an array of shape (number of redshifts,
+        number of wavelengths).
+    """
+    z = _redshift_values(configuration, redshifts)
+    fluxes = np.zeros((len(z), len(wavelengths)))
+    others = []
+    for s in cast(Source, configuration.source).spectrum:
+        if type(s) is Galaxy:
+            index = galaxy_template_bank().index(
+                s.age, s.galaxy_type, s.with_emission_lines
+            )
+            fluxes += galaxy_fluxes(index, z, s.magnitude, wavelengths)
+        elif type(s) is EmissionLine:
+            if emission_lines:
+                fluxes += emission_line_fluxes(
+                    central_wavelength=s.central_wavelength,
+                    fwhm=s.fwhm,
+                    total_flux=s.total_flux,
+                    redshifts=z,
+                    wavelengths=wavelengths,
+                )
+        else:
+            others.append(s)
+    if others:
+        fluxes += CompositeSpectrum(others)(wavelengths)
+
+    return fluxes
+
+
+def redshifted_line_pixel_fluxes(
+    configuration: Configuration, redshifts: ArrayLike, wavelengths: Quantity
+) -> np.ndarray:
+    """
+    Return the pixel-integrated emission line fluxes for an array of redshifts.
+
+    The redshift of all emission line components of the source is replaced with each
+    of the given redshifts in turn, and the lines are integrated over the pixels with
+    the emission_line_pixel_fluxes function.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    redshifts: array-like
+        Redshift or one-dimensional array of redshifts.
+    wavelengths: Quantity
+        Equidistant pixel midpoints.
+
+    Returns
+    -------
+    np.ndarray
+        The pixel fluxes (in PHOTLAM * Angstrom), as an array of shape (number of
+        redshifts, number of pixels).
+    """
+    z = _redshift_values(configuration, redshifts)
+    fluxes = np.zeros((len(z), len(wavelengths)))
+    for s in cast(Source, configuration.source).spectrum:
+        if type(s) is EmissionLine:
+            fluxes += emission_line_pixel_fluxes(
+                central_wavelength=s.central_wavelength,
+                fwhm=s.fwhm,
+                total_flux=s.total_flux,
+                redshifts=z,
+                wavelengths=wavelengths,
+            )
+
+    return fluxes
+
+
+def _redshift_values(configuration: Configuration, redshifts: ArrayLike) -> np.ndarray:
+    # Checks the source and redshifts, and returns the redshifts as a one-dimensional
+    # array.
+    if configuration.source is None:
+        raise ValueError("Source missing in configuration")
+    z = np.atleast_1d(np.asarray(redshifts, dtype=float))
+    if z.ndim != 1:
+        raise ValueError("The redshifts must be a scalar or one-dimensional.")
+    return z
+
+
 def sky_spectrum() -> SourceSpectrum:
     """
     Return the sky background.
@@ -173,7 +1305,6 @@ def sky_spectrum() -> SourceSpectrum:
         The sky background, as received at the telescope.
     """
     path = pathlib.Path(get_file_base_dir() / "nirsky.npz")
-    with open(path, "rb") as f:
-        wavelengths, fluxes = read_from_file(f, units.PHOTLAM)
+    wavelengths, fluxes = read_curve(path, units.PHOTLAM)
 
-    return SourceSpectrum(Empirical1D, points=wavelengths, lookup_table=fluxes)
+    return SourceSpectrum(Empirical1D, points=wavelengths, lookup_table=fluxes.copy())
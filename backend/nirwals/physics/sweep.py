@@ -0,0 +1,110 @@
+"""Functions for calculating signal-to-noise ratios for ranges of source parameters."""
+
+import dataclasses
+from typing import cast
+
+import numpy as np
+from astropy import units as u
+from astropy.units import Quantity
+from numpy.typing import ArrayLike
+
+from nirwals.configuration import Configuration, Exposure
+from nirwals.physics import kernels
+from nirwals.physics.exposure import ObservationPlan
+from nirwals.physics.spectrum import (
+    redshifted_line_pixel_fluxes,
+    redshifted_source_fluxes,
+)
+
+# Number of redshifts which are processed together.
+_CHUNK_SIZE = 32
+
+
+@dataclasses.dataclass(frozen=True)
+class RedshiftSweep:
+    """
+    Signal-to-noise ratios and electron counts for a range of redshifts.
+
+    Parameters
+    ----------
+    redshifts: np.ndarray
+        The redshifts.
+    wavelengths: Quantity
+        The wavelengths of the resolution element bins.
+    snr_values: Quantity
+        Signal-to-noise ratios, as an array of shape (number of redshifts, number of
+        wavelengths).
+    source_electrons: Quantity
+        Number of electrons due to source photons, as an array of shape (number of
+        redshifts, number of wavelengths).
+    """
+
+    redshifts: np.ndarray
+    wavelengths: Quantity
+    snr_values: Quantity
+    source_electrons: Quantity
+
+
+def redshift_sweep(configuration: Configuration, redshifts: ArrayLike) -> RedshiftSweep:
+    """
+    Calculate the signal-to-noise ratio and source electrons for a range of redshifts.
+
+    The redshift of all galaxy and emission line components of the source is replaced
+    with each of the given redshifts in turn (see the redshifted_source_fluxes
+    function), and the signal-to-noise ratios and source electron counts are
+    calculated as by the ObservationPlan class. The throughput and the sky rates are
+    calculated only once and are shared by all redshifts, and the source flux
+    densities are calculated and binned for chunks of redshifts at a time (see the
+    source_rate_values method of the ObservationPlan class).
+
+    The exposure time and number of exposures defined in the configuration are used.
+
+    Parameters
+    ----------
+    configuration: Configuration
+        The configuration.
+    redshifts: array-like
+        Redshift or one-dimensional array of redshifts.
+
+    Returns
+    -------
+    RedshiftSweep
+        The signal-to-noise ratios and electron counts.
+    """
+    z = np.atleast_1d(np.asarray(redshifts, dtype=float))
+    if z.ndim != 1:
+        raise ValueError("The redshifts must be a scalar or one-dimensional.")
+    exposure = cast(Exposure, configuration.exposure)
+    if exposure.exposure_time is None:
+        raise ValueError("The configuration must define an exposure time.")
+    e = exposure.exposures
+    t = exposure.exposure_time.to(u.s).value
+
+    # The throughput and the sky rates do not depend on the redshift, and the plan
+    # calculates them only once.
+    plan = ObservationPlan(configuration)
+    bin_wavelengths, sky_rates = plan.sky_rates
+    sky_rate_values = sky_rates.to(u.photon / u.s).value
+
+    snr_values = np.empty((len(z), len(bin_wavelengths)))
+    source_counts = np.empty((len(z), len(bin_wavelengths)))
+    for start in range(0, len(z), _CHUNK_SIZE):
+        chunk = slice(start, start + _CHUNK_SIZE)
+        fluxes = redshifted_source_fluxes(
+            configuration, z[chunk], plan.pixel_wavelengths, emission_lines=False
+        )
+        line_fluxes = redshifted_line_pixel_fluxes(
+            configuration, z[chunk], plan.pixel_wavelengths
+        )
+        _, rates = plan.source_rate_values(fluxes, line_fluxes)
+        source_counts[chunk] = kernels.electrons(rates, e, t)
+        snr_values[chunk] = kernels.snr(
+            rates, sky_rate_values, e, t, plan.readout_noise
+        )
+
+    return RedshiftSweep(
+        redshifts=z,
+        wavelengths=bin_wavelengths,
+        snr_values=snr_values * u.dimensionless_unscaled,
+        source_electrons=source_counts * u.photon,
+    )
@@ -1,6 +1,7 @@
 """Utility functions."""
 
-from typing import Tuple, BinaryIO
+import math
+from typing import Tuple, BinaryIO, cast
 
 import numpy as np
 from astropy import units as u
@@ -19,8 +20,9 @@ def read_from_file(
     by the unit parameter. If no unit is given, the values are assumed to be
     dimensionless.
 
-    The wavelengths in the x array are supposed to be sorted in ascending order, but
-    this is not checked.
+    The wavelengths in the x array must be finite and strictly increasing, and the
+    values in the y array must be finite. This is not checked by this function, but
+    the numpyfy.py script checks it when it creates the data files.
 
     If the minimum wavelength defined in the file is greater than 1 A (or, more
     precisely, greater than 1.02 A), it is assumed that below the minimum wavelength in
@@ -99,3 +101,93 @@ def shift(a: np.ndarray, k: int) -> np.ndarray:
         shifted_a[:k] = 0
 
     return shifted_a
+
+
+def binning_factor(resolution_element: float, pixel_width: float) -> int:
+    """
+    Return the number of pixels required to cover a resolution element.
+
+    This is the smallest positive integer n with n * pixel_width >= resolution_element.
+
+    Parameters
+    ----------
+    resolution_element: float
+        Width of the resolution element.
+    pixel_width: float
+        Width of a pixel, in the same unit as the resolution element.
+
+    Returns
+    -------
+    int
+        The binning factor.
+    """
+    binning = max(math.ceil(resolution_element / pixel_width), 1)
+
+    # Guard against rounding errors in the division.
+    if binning > 1 and (binning - 1) * pixel_width >= resolution_element:
+        binning -= 1
+    if binning * pixel_width < resolution_element:
+        binning += 1
+
+    return binning
+
+
+def sum_bins(values: np.ndarray, binning: int) -> np.ndarray:
+    """
+    Sum consecutive values along the last axis in bins of equal size.
+
+    The first bin contains the first `binning` values, the second bin contains the
+    next `binning` values, and so on. If the number of values is not a multiple of
+    the binning, the last bin is padded with zeros.
+
+    Parameters
+    ----------
+    values: np.ndarray
+        Values to sum, as an array of shape (..., number of values).
+    binning: int
+        Number of values per bin.
+
+    Returns
+    -------
+    np.ndarray
+        The bin sums, as an array of shape (..., number of bins).
+    """
+    if binning < 1:
+        raise ValueError("The binning must be positive.")
+    n = values.shape[-1]
+    bins = -(-n // binning)
+    padding = [(0, 0)] * (values.ndim - 1) + [(0, bins * binning - n)]
+    padded_values = np.pad(values, padding)
+    return cast(
+        np.ndarray,
+        padded_values.reshape(values.shape[:-1] + (bins, binning)).sum(axis=-1),
+    )
+
+
+def sum_bins_at(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Sum values along the last axis in bins of arbitrary size.
+
+    Bin k contains the values from index starts[k] up to (but excluding) index
+    starts[k + 1], and the last bin contains the values from index starts[-1] to the
+    end of the array. The start indices must be strictly increasing and less than
+    the number of values.
+
+    Parameters
+    ----------
+    values: np.ndarray
+        Values to sum, as an array of shape (..., number of values).
+    starts: np.ndarray
+        Index of the first value in each bin.
+
+    Returns
+    -------
+    np.ndarray
+        The bin sums, as an array of shape (..., number of bins).
+    """
+    starts = np.asarray(starts)
+    if len(starts) == 0 or starts[0] < 0 or starts[-1] >= values.shape[-1]:
+        raise ValueError("The start indices must be valid indices of the values.")
+    if np.any(np.diff(starts) <= 0):
+        raise ValueError("The start indices must be strictly increasing.")
+    return np.add.reduceat(values, starts, axis=-1)
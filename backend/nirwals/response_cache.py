@@ -0,0 +1,395 @@
+"""A persistent cache for API responses, which is shared between worker processes."""
+
+import contextlib
+import dataclasses
+import hashlib
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterator
+
+DEFAULT_TTL = 7 * 24 * 3600
+"""The default time (in seconds) for which a response is cached."""
+
+DEFAULT_MAX_BYTES = 256 * 1024**2
+"""The default maximum total size (in bytes) of the cached responses."""
+
+# Seconds to wait for a lock held by another process before giving up.
+_TIMEOUT = 30
+
+# Seconds after which the access time of a response is updated when it is read.
+_ACCESS_RESOLUTION = 60
+
+# Number of hits and misses after which a process adds its counts to the shared
+# counters.
+_FLUSH_COUNT = 100
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO metrics (name, value)
+VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+"""
+
+
+@dataclasses.dataclass(frozen=True)
+class ResponseCacheInfo:
+    """
+    Statistics for a response cache.
+
+    The statistics are those of all processes using the cache file. Hits and misses
+    of other processes are only included once these processes have added them to
+    the shared counters.
+
+    Parameters
+    ----------
+    hits: int
+        Number of requests which were served from the cache.
+    misses: int
+        Number of requests which required computing the response.
+    evictions: int
+        Number of responses which were removed because they expired or because the
+        cache exceeded its maximum size.
+    size: int
+        Number of responses currently in the cache.
+    nbytes: int
+        Total size (in bytes) of the responses currently in the cache.
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    nbytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of requests which were served from the cache."""
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+def response_key(endpoint: str, digest: str) -> str:
+    """
+    Return the cache key for a response.
+
+    Parameters
+    ----------
+    endpoint: str
+        The name of the API endpoint.
+    digest: str
+        The digest of the request, which must include the data version. The digest
+        method of a canonical configuration returns such a digest.
+
+    Returns
+    -------
+    str
+        The cache key.
+    """
+    return hashlib.sha256(f"{endpoint}:{digest}".encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    A cache for serialised responses, which is stored in an SQLite database file.
+
+    All worker processes using the same file share the cached responses and the hit
+    and miss counts. Lookups are plain reads, which don't block and aren't blocked by
+    other processes. Every write is carried out in a single transaction, so that
+    other processes never see a partially written response.
+
+    Responses expire `ttl` seconds after they have been stored. If the total size of
+    the responses exceeds `max_bytes`, the least recently used responses are evicted.
+    A response which is larger than `max_bytes` is not cached. To avoid writes for
+    most lookups, the access time of a response is only updated if it is more than a
+    minute old, and every process counts hits and misses locally and adds them to
+    the shared counters in batches.
+
+    Parameters
+    ----------
+    path: str or Path
+        Path of the database file. The file is created if it does not exist.
+    ttl: float
+        Time (in seconds) after which a cached response expires.
+    max_bytes: int
+        Maximum total size (in bytes) of the cached responses.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        if ttl <= 0:
+            raise ValueError("The time to live must be positive.")
+        if max_bytes < 1:
+            raise ValueError("The maximum cache size must be positive.")
+        self.path = pathlib.Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Return the cached response for a key.
+
+        The hit or miss is counted.
+
+        Parameters
+        ----------
+        key: str
+            The key.
+
+        Returns
+        -------
+        bytes, optional
+            The response, or None if there is no unexpired response for the key.
+        """
+        now = time.time()
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value, accessed FROM responses WHERE key = ? AND created > ?",
+                (key, now - self.ttl),
+            )
+            .fetchone()
+        )
+        if row is None:
+            self._count("misses")
+            return None
+        value, accessed = row
+        if now - accessed > _ACCESS_RESOLUTION:
+            self._touch(key, now)
+        self._count("hits")
+        return bytes(value)
+
+    def set(self, key: str, value: bytes) -> None:
+        """
+        Store a response.
+
+        Expired responses and, if need be, the least recently used responses are
+        evicted in the same transaction, and the hits and misses counted by this
+        process are added to the shared counters.
+
+        Parameters
+        ----------
+        key: str
+            The key.
+        value: bytes
+            The response.
+        """
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._flushed_counts() as counts, self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(connection, now)
+            for metric, count in counts.items():
+                self._increment(connection, metric, count)
+
+    def get_or_compute(
+        self, key: str, compute: Callable[[], bytes]
+    ) -> tuple[bytes, bool]:
+        """
+        Return the response for a key, computing and caching it if necessary.
+
+        The response is computed outside a transaction, so that other processes are
+        not blocked. Concurrent requests for the same missing key may hence compute
+        the response more than once.
+
+        The cache is only an optimisation. If reading from or writing to the database
+        fails, the error is logged and the response is computed without the cache.
+
+        Parameters
+        ----------
+        key: str
+            The key.
+        compute: callable
+            Function without arguments computing the response.
+
+        Returns
+        -------
+        tuple
+            The response, and whether it was taken from the cache.
+        """
+        try:
+            value = self.get(key)
+        except sqlite3.Error:
+            logger.exception("Reading from the response cache %s failed.", self.path)
+            value = None
+        if value is not None:
+            return value, True
+        value = compute()
+        try:
+            self.set(key, value)
+        except sqlite3.Error:
+            logger.exception("Writing to the response cache %s failed.", self.path)
+        return value, False
+
+    def cache_info(self) -> ResponseCacheInfo:
+        """
+        Return the statistics of the cache.
+
+        The hits and misses counted by this process are added to the shared counters
+        first.
+
+        Returns
+        -------
+        ResponseCacheInfo
+            The cache statistics.
+        """
+        self.flush()
+        connection = self._connection()
+        metrics = dict(connection.execute("SELECT name, value FROM metrics"))
+        size, nbytes = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return ResponseCacheInfo(
+            hits=metrics["hits"],
+            misses=metrics["misses"],
+            evictions=metrics["evictions"],
+            size=size,
+            nbytes=nbytes,
+        )
+
+    def flush(self) -> None:
+        """Add the hits and misses counted by this process to the shared counters."""
+        with self._flushed_counts() as counts:
+            if any(counts.values()):
+                with self._transaction() as connection:
+                    for metric, count in counts.items():
+                        self._increment(connection, metric, count)
+
+    def clear(self) -> None:
+        """Remove all responses from the cache and reset the statistics."""
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM responses")
+            connection.execute("UPDATE metrics SET value = 0")
+        with self._lock:
+            self._counts = {"hits": 0, "misses": 0}
+
+    def _count(self, metric: str) -> None:
+        # Counts a hit or miss, and adds the counts to the shared counters if there
+        # are enough of them. The cache remains usable if this fails.
+        with self._lock:
+            self._counts[metric] += 1
+            is_flush_due = sum(self._counts.values()) >= _FLUSH_COUNT
+        if is_flush_due:
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.warning("Updating the response cache metrics failed.")
+
+    @contextlib.contextmanager
+    def _flushed_counts(self) -> Iterator[dict[str, int]]:
+        # Takes the local hit and miss counts for adding them to the shared counters.
+        # The counts are restored if this fails.
+        with self._lock:
+            counts = self._counts
+            self._counts = {"hits": 0, "misses": 0}
+        try:
+            yield counts
+        except BaseException:
+            with self._lock:
+                for metric, count in counts.items():
+                    self._counts[metric] += count
+            raise
+
+    def _touch(self, key: str, now: float) -> None:
+        # Updates the access time of a response. The cache remains usable if this
+        # fails.
+        try:
+            with self._transaction() as connection:
+                connection.execute(
+                    "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+                )
+        except sqlite3.Error:
+            logger.warning("Updating the access time of a cached response failed.")
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        # Removes the expired responses and then the least recently used ones until
+        # the total size is at most max_bytes.
+        evictions = connection.execute(
+            "DELETE FROM responses WHERE created <= ?", (now - self.ttl,)
+        ).rowcount
+        (nbytes,) = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if nbytes > self.max_bytes:
+            keys = []
+            for key, size in connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed"
+            ):
+                if nbytes <= self.max_bytes:
+                    break
+                keys.append((key,))
+                nbytes -= size
+            connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+            evictions += len(keys)
+        if evictions:
+            self._increment(connection, "evictions", evictions)
+
+    @staticmethod
+    def _increment(
+        connection: sqlite3.Connection, metric: str, increment: int = 1
+    ) -> None:
+        # Increments a shared counter.
+        connection.execute(
+            "UPDATE metrics SET value = value + ? WHERE name = ?", (increment, metric)
+        )
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # A write transaction, which takes the write lock at the start and commits on
+        # success or rolls back on failure.
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        # Returns the database connection for the current thread and process. The
+        # connection is in autocommit mode, so that reads don't open a transaction
+        # and writes must use the _transaction method. Connections are not shared
+        # between threads, and a connection inherited from a parent process is not
+        # reused after forking.
+        connection: sqlite3.Connection | None = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=_TIMEOUT, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
@@ -0,0 +1,13 @@
+from typing import Iterator
+
+import pytest
+
+from nirwals.physics.bandpass import clear_instrument_bandpass_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> Iterator[None]:
+    # Cached results might have been calculated with mocked functions.
+    clear_instrument_bandpass_cache()
+    yield
+    clear_instrument_bandpass_cache()
@@ -1,5 +1,5 @@
 import math
-from typing import get_args, cast
+from typing import get_args, cast, Any
 from unittest.mock import MagicMock
 
 import numpy as np
@@ -14,12 +14,19 @@ from constants import TELESCOPE_SEEING, FIBRE_RADIUS
 from nirwals.configuration import GratingName, Filter, SourceExtension, Source, Grating
 from nirwals.physics.bandpass import (
     grating_efficiency,
+    grating_efficiency_bank,
+    GratingEfficiencyBank,
     atmospheric_transmission,
+    atmospheric_transmissions,
     filter_transmission,
     telescope_throughput,
     detector_quantum_efficiency,
     fibre_throughput,
     throughput,
+    compiled_throughput,
+    instrument_bandpass,
+    instrument_bandpass_cache_info,
+    grating_independent_throughput,
 )
 from nirwals.tests.utils import create_matplotlib_figure, get_default_configuration
 
@@ -51,6 +58,21 @@ def test_atmospheric_transmission_zenith_distance_dependency() -> None:
     assert pytest.approx(ratio1) == ratio2
 
 
+def test_atmospheric_transmissions() -> None:
+    # The vectorised transmissions must agree with the transmission curves for the
+    # individual zenith distances.
+    zs = np.array([0, 28, 42, 60]) * u.deg
+    wavelengths = np.array([9000, 12000, 15500]) * u.AA
+    _, transmissions = atmospheric_transmissions(
+        zenith_distances=zs, wavelengths=wavelengths
+    )
+
+    assert transmissions.shape == (4, 3)
+    for i, z in enumerate(zs):
+        expected = atmospheric_transmission(zenith_distance=z)(wavelengths)
+        assert np.allclose(transmissions[i], expected.value)
+
+
 @pytest.mark.mpl_image_compare
 def test_detector_quantum_efficiency() -> Figure:
     efficiency = detector_quantum_efficiency()
@@ -128,7 +150,7 @@ def test_fibre_throughput_for_infinite_seeing() -> None:
 def test_fibre_throughput_without_seeing(monkeypatch: MonkeyPatch) -> None:
     # If there is no seeing, the throughput is one for both point and diffuse sources.
     seeing = 1e-10 * u.arcsec
-    monkeypatch.setattr("nirwals.physics.bandpass.TELESCOPE_SEEING", 0 * u.arcsec)
+    monkeypatch.setattr("nirwals.physics.kernels._TELESCOPE_SEEING", 0)
     zenith_distance = 35 * u.deg
     throughput = fibre_throughput(seeing, "Point", zenith_distance)
     assert pytest.approx(float(throughput(12000))) == 1
@@ -212,6 +234,65 @@ def test_grating_efficiency_interpolation() -> None:
     assert pytest.approx(float(eff_max_43)) == float(eff_max_43_expected)
 
 
+def test_grating_efficiency_bank_shifts(monkeypatch: MonkeyPatch) -> None:
+    # Use "efficiency curves" which are equal to the wavelength (plus an offset
+    # identifying the curve), so that the shift can be read off directly.
+    def mock_read_curve(path: Any) -> tuple[Quantity, Quantity]:
+        offset = float(str(path).split("_")[-1][:2])
+        wavelengths = np.array([1, 50000])
+        return wavelengths * u.AA, (wavelengths + offset) * u.dimensionless_unscaled
+
+    monkeypatch.setattr("nirwals.physics.bandpass.read_curve", mock_read_curve)
+    bank = GratingEfficiencyBank("950")
+    wavelengths = np.array([10000, 12000]) * u.AA
+    _, efficiencies = bank.efficiencies(
+        grating_angles=[30, 41, 43, 50] * u.deg, wavelengths=wavelengths
+    )
+
+    # 41 degrees: The curve for 40 degrees is shifted by 1/5 of the distance between
+    # the maxima for 40 and 45 degrees.
+    # 43 degrees: The curve for 45 degrees is shifted by 2/5 of that distance.
+    lambda_max_40 = 13400.4
+    lambda_max_45 = 14700.0
+    shift_41 = -0.2 * (lambda_max_45 - lambda_max_40)
+    shift_43 = 0.4 * (lambda_max_45 - lambda_max_40)
+    assert np.allclose(efficiencies[0], [10030, 12030])
+    assert np.allclose(efficiencies[1], [10040 + shift_41, 12040 + shift_41])
+    assert np.allclose(efficiencies[2], [10045 + shift_43, 12045 + shift_43])
+    assert np.allclose(efficiencies[3], [10050, 12050])
+
+
+@pytest.mark.parametrize("alpha", [29.9 * u.deg, 50.1 * u.deg])
+def test_grating_efficiency_bank_rejects_unsupported_angles(alpha: Quantity) -> None:
+    with pytest.raises(ValueError, match="Only grating angles between"):
+        grating_efficiency_bank("950").efficiencies(grating_angles=alpha)
+
+
+def test_grating_efficiency_bank_depends_on_data_version(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("nirwals.physics.bandpass.data_version", lambda: "v1")
+    bank = grating_efficiency_bank("950")
+    assert grating_efficiency_bank("950") is bank
+
+    monkeypatch.setattr("nirwals.physics.bandpass.data_version", lambda: "v2")
+    assert grating_efficiency_bank("950") is not bank
+
+
+def test_grating_efficiency_bank_batch() -> None:
+    # The batched efficiencies must agree with the efficiencies for the individual
+    # grating angles.
+    alphas = [30, 33.3, 37.5, 44.95, 50] * u.deg
+    wavelengths, efficiencies = grating_efficiency_bank("950").efficiencies(
+        grating_angles=alphas
+    )
+
+    assert efficiencies.shape == (len(alphas), len(wavelengths))
+    for i, alpha in enumerate(alphas):
+        expected = grating_efficiency(grating_angle=alpha, grating_name="950")
+        assert np.allclose(efficiencies[i], expected(wavelengths).value)
+
+
 @pytest.mark.mpl_image_compare
 def test_telescope_throughput() -> Figure:
     throughput = telescope_throughput()
@@ -284,6 +365,97 @@ def test_throughput_value(monkeypatch: MonkeyPatch) -> None:
     assert pytest.approx(float(actual_throughput(12345 * u.AA))) == expected_throughput
 
 
+def test_compiled_throughput() -> None:
+    # The compiled throughput must agree with the compound synphot model.
+    components = [
+        atmospheric_transmission(zenith_distance=31 * u.deg),
+        telescope_throughput(),
+        filter_transmission(filter_name="LWBF"),
+        grating_efficiency(grating_angle=40 * u.deg, grating_name="950"),
+        SpectralElement(ConstFlux1D, amplitude=0.5),
+    ]
+    compound = components[0]
+    for component in components[1:]:
+        compound = compound * component
+
+    compiled = compiled_throughput(*components)
+
+    wavelengths = np.linspace(8000, 17000, 1001) * u.AA
+    assert compiled(wavelengths).value == pytest.approx(
+        compound(wavelengths).value, rel=1e-6, abs=1e-9
+    )
+
+
+def test_instrument_bandpass_is_cached(monkeypatch: MonkeyPatch) -> None:
+    grating_mock = MagicMock(wraps=grating_efficiency)
+    monkeypatch.setattr("nirwals.physics.bandpass.grating_efficiency", grating_mock)
+    parameters: dict[str, Any] = dict(
+        filter_name="LWBF",
+        grating_name="950",
+        grating_angle=40 * u.deg,
+        seeing=1.5 * u.arcsec,
+        zenith_distance=31 * u.deg,
+    )
+
+    point = instrument_bandpass(source_extension="Point", **parameters)
+    instrument_bandpass(source_extension="Point", **parameters)
+    diffuse = instrument_bandpass(source_extension="Diffuse", **parameters)
+
+    # The grating efficiency is shared between point and diffuse sources.
+    grating_mock.assert_called_once()
+    info = instrument_bandpass_cache_info()
+    assert info.hits == 1
+    assert info.misses == 2
+    assert info.size == 2
+
+    # The bandpasses differ by the fibre throughput.
+    fibre = fibre_throughput(
+        seeing=parameters["seeing"],
+        source_extension="Point",
+        zenith_distance=parameters["zenith_distance"],
+    )
+    wavelengths = np.linspace(9000, 16000, 71) * u.AA
+    assert point(wavelengths).value == pytest.approx(
+        fibre(wavelengths).value * diffuse(wavelengths).value
+    )
+
+
+def test_instrument_bandpass_depends_on_data_version(monkeypatch: MonkeyPatch) -> None:
+    grating_mock = MagicMock(wraps=grating_efficiency)
+    monkeypatch.setattr("nirwals.physics.bandpass.grating_efficiency", grating_mock)
+    parameters: dict[str, Any] = dict(
+        filter_name="LWBF",
+        grating_name="950",
+        grating_angle=40 * u.deg,
+        seeing=1.5 * u.arcsec,
+        zenith_distance=31 * u.deg,
+        source_extension="Point",
+    )
+
+    monkeypatch.setattr("nirwals.physics.bandpass.data_version", lambda: "v1")
+    instrument_bandpass(**parameters)
+    monkeypatch.setattr("nirwals.physics.bandpass.data_version", lambda: "v2")
+    instrument_bandpass(**parameters)
+
+    assert grating_mock.call_count == 2
+    assert instrument_bandpass_cache_info().misses == 2
+
+
+def test_grating_independent_throughput_depends_on_data_version(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    filter_mock = MagicMock(wraps=filter_transmission)
+    monkeypatch.setattr("nirwals.physics.bandpass.filter_transmission", filter_mock)
+
+    monkeypatch.setattr("nirwals.physics.bandpass.data_version", lambda: "v1")
+    grating_independent_throughput("LWBF")
+    grating_independent_throughput("LWBF")
+    monkeypatch.setattr("nirwals.physics.bandpass.data_version", lambda: "v2")
+    grating_independent_throughput("LWBF")
+
+    assert filter_mock.call_count == 2
+
+
 @pytest.mark.mpl_image_compare
 def test_throughput() -> Figure:
     configuration = get_default_configuration()
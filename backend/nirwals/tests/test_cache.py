@@ -0,0 +1,75 @@
+from typing import Any
+
+import numpy as np
+import pytest
+
+from nirwals.cache import LRUCache, array_nbytes
+
+
+def test_lru_cache_caches_values() -> None:
+    cache: LRUCache[str] = LRUCache(maxsize=2)
+    calls: list[str] = []
+
+    def compute(value: str) -> Any:
+        def f() -> str:
+            calls.append(value)
+            return value
+
+        return f
+
+    assert cache.get("a", compute("A")) == "A"
+    assert cache.get("a", compute("B")) == "A"
+    assert calls == ["A"]
+    info = cache.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.size == 1
+
+
+def test_lru_cache_evicts_least_recently_used_values() -> None:
+    cache: LRUCache[int] = LRUCache(maxsize=2)
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: 1)
+    cache.get("c", lambda: 3)
+
+    # "b" has been evicted, but "a" is still cached.
+    assert cache.get("a", lambda: 10) == 1
+    assert cache.get("b", lambda: 20) == 20
+    assert cache.cache_info().size == 2
+
+
+def test_lru_cache_respects_byte_limit() -> None:
+    cache: LRUCache[np.ndarray] = LRUCache(
+        maxsize=10, max_bytes=2000, sizeof=array_nbytes
+    )
+    cache.get("a", lambda: np.zeros(100))
+    cache.get("b", lambda: np.zeros(100))
+    cache.get("c", lambda: np.zeros(100))
+
+    info = cache.cache_info()
+    assert info.size == 2
+    assert info.nbytes == 1600
+
+    # Values exceeding the byte limit are not cached.
+    cache.get("d", lambda: np.zeros(1000))
+    assert cache.cache_info().size == 2
+
+
+def test_lru_cache_clear() -> None:
+    cache: LRUCache[int] = LRUCache(maxsize=2)
+    cache.get("a", lambda: 1)
+    cache.get("a", lambda: 1)
+
+    cache.clear()
+
+    info = cache.cache_info()
+    assert info.hits == 0
+    assert info.misses == 0
+    assert info.size == 0
+    assert info.nbytes == 0
+
+
+def test_lru_cache_requires_size_function() -> None:
+    with pytest.raises(ValueError, match="size function"):
+        LRUCache(maxsize=2, max_bytes=1000)
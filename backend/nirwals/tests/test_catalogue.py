@@ -0,0 +1,111 @@
+import dataclasses
+import itertools
+from pathlib import Path
+from typing import Iterator, cast
+
+import pytest
+from astropy import units as u
+
+from nirwals.configuration import (
+    Blackbody,
+    Configuration,
+    EmissionLine,
+    Galaxy,
+    GalaxyAge,
+    Source,
+    Spectrum,
+    UserDefinedSpectrum,
+)
+from nirwals.physics.catalogue import catalogue_results, validate_target
+from nirwals.physics.exposure import ObservationPlan
+from nirwals.tests.utils import get_default_configuration
+
+_TARGETS: list[Spectrum] = [
+    Blackbody(magnitude=16, temperature=5000 * u.K),
+    Galaxy(
+        age="Young",
+        galaxy_type="Sa",
+        magnitude=18,
+        redshift=0.2,
+        with_emission_lines=False,
+    ),
+    EmissionLine(
+        central_wavelength=11000 * u.AA,
+        fwhm=30 * u.AA,
+        redshift=0.1,
+        total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+    ),
+    Blackbody(magnitude=2, temperature=9000 * u.K),
+]
+
+
+def _with_target(configuration: Configuration, target: Spectrum) -> Configuration:
+    source = dataclasses.replace(cast(Source, configuration.source), spectrum=[target])
+    return dataclasses.replace(configuration, source=source)
+
+
+def test_catalogue_results() -> None:
+    # Use the midpoint of a bin as the reference wavelength, so that no interpolation
+    # is needed for the expected values.
+    configuration = get_default_configuration()
+    bin_wavelengths, _ = ObservationPlan(configuration).sky_rates
+    wavelength = bin_wavelengths[600]
+    results = list(catalogue_results(configuration, _TARGETS, wavelength, snr=10))
+
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    for target, result in zip(_TARGETS, results):
+        plan = ObservationPlan(_with_target(configuration, target))
+        _, snr_values = plan.snr()
+        _, exposure_times = plan.exposure_time_map(10)
+        assert result.snr == pytest.approx(snr_values[600].value, rel=1e-3)
+        assert result.exposure_time.to(u.s).value == pytest.approx(
+            exposure_times[0, 600].to(u.s).value, rel=1e-3
+        )
+
+    assert [r.saturated for r in results] == [False, False, False, True]
+
+
+def test_catalogue_results_do_not_depend_on_block_size() -> None:
+    configuration = get_default_configuration()
+    results = list(catalogue_results(configuration, _TARGETS, 12100 * u.AA, snr=10))
+    small_block_results = list(
+        catalogue_results(configuration, _TARGETS, 12100 * u.AA, snr=10, max_bytes=1)
+    )
+
+    assert small_block_results == results
+
+
+def test_catalogue_results_are_streamed() -> None:
+    consumed = 0
+
+    def targets() -> Iterator[Spectrum]:
+        nonlocal consumed
+        for target in itertools.cycle(_TARGETS):
+            consumed += 1
+            yield target
+
+    results = catalogue_results(
+        get_default_configuration(), targets(), 12100 * u.AA, snr=10, max_bytes=1
+    )
+    first_results = list(itertools.islice(results, 3))
+
+    assert [r.index for r in first_results] == [0, 1, 2]
+    assert consumed == 3
+
+
+def test_catalogue_results_reject_unsupported_targets() -> None:
+    targets = [UserDefinedSpectrum(file=Path("spectrum.csv"))]
+    with pytest.raises(ValueError, match="Unsupported spectrum type"):
+        list(catalogue_results(get_default_configuration(), targets, 12100 * u.AA, 10))
+
+
+def test_validate_target() -> None:
+    for target in _TARGETS:
+        validate_target(target)
+    with pytest.raises(ValueError, match="Unsupported spectrum type"):
+        validate_target(UserDefinedSpectrum(file=Path("spectrum.csv")))
+    galaxy = dataclasses.replace(
+        cast(Galaxy, _TARGETS[1]), age=cast(GalaxyAge, "Ancient")
+    )
+    with pytest.raises(ValueError, match="galaxy age"):
+        validate_target(galaxy)
@@ -0,0 +1,149 @@
+import os
+import pathlib
+
+import numpy as np
+import pytest
+from astropy import units as u
+from synphot import units
+
+from nirwals.physics.data import CurveRegistry, build_bundle, CurveBundle
+from nirwals.physics.utils import read_from_file
+
+
+def _write_datafile(path: pathlib.Path, y: float) -> None:
+    x = np.array([1000, 2000, 3000])
+    np.savez(path, x=x, y=y * np.ones(3))
+
+
+def test_curve_registry_caches_curves(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+    registry = CurveRegistry()
+
+    wavelengths1, values1 = registry.get(path, units.FLAM)
+    wavelengths2, values2 = registry.get(path, units.FLAM)
+
+    assert wavelengths1 is wavelengths2
+    assert values1 is values2
+    assert pytest.approx(values1[2].to(units.FLAM).value) == 2
+    info = registry.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.size == 1
+
+
+def test_curve_registry_distinguishes_units(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+    registry = CurveRegistry()
+
+    _, flam_values = registry.get(path, units.FLAM)
+    _, photlam_values = registry.get(path, units.PHOTLAM)
+
+    assert flam_values.unit == units.FLAM
+    assert photlam_values.unit == units.PHOTLAM
+    assert registry.cache_info().misses == 2
+
+
+def test_curve_registry_returns_read_only_arrays(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+    registry = CurveRegistry()
+
+    wavelengths, values = registry.get(path)
+
+    with pytest.raises(ValueError):
+        wavelengths[0] = 5 * u.AA
+    with pytest.raises(ValueError):
+        values[0] = 5
+
+
+def test_curve_registry_invalidates_changed_files(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+    registry = CurveRegistry()
+    registry.get(path)
+
+    # Make sure the modification time changes, even on file systems with a coarse
+    # time resolution.
+    _write_datafile(path, 3)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    _, values = registry.get(path)
+
+    assert pytest.approx(values[2].value) == 3
+    assert registry.cache_info().misses == 2
+
+
+def test_curve_registry_clear(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+    registry = CurveRegistry()
+    registry.get(path)
+    registry.get(path)
+
+    registry.clear()
+
+    info = registry.cache_info()
+    assert info.hits == 0
+    assert info.misses == 0
+    assert info.size == 0
+
+
+def test_build_bundle(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "filters").mkdir()
+    _write_datafile(tmp_path / "a.npz", 2)
+    _write_datafile(tmp_path / "filters" / "b.npz", 3)
+
+    bundle_path = build_bundle(tmp_path)
+    bundle = CurveBundle(bundle_path)
+
+    assert sorted(bundle.names) == ["a.npz", "filters/b.npz"]
+    for name in ("a.npz", "filters/b.npz"):
+        with open(tmp_path / name, "rb") as f:
+            expected_wavelengths, expected_values = read_from_file(f)
+        wavelengths, values = bundle.curve(name)
+        assert np.array_equal(wavelengths, expected_wavelengths.to(u.AA).value)
+        assert np.array_equal(values, expected_values.value)
+        assert not wavelengths.flags.writeable
+        assert not values.flags.writeable
+
+
+def test_curve_registry_uses_bundle(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+    bundle_path = build_bundle(tmp_path)
+    registry = CurveRegistry(bundle_path=bundle_path)
+
+    # Change the data file, but make it look older than the bundle. The registry
+    # should then use the bundle content.
+    _write_datafile(path, 3)
+    stat = os.stat(bundle_path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+    _, values = registry.get(path, units.FLAM)
+
+    assert values.unit == units.FLAM
+    assert pytest.approx(values[2].to(units.FLAM).value) == 2
+
+
+def test_curve_registry_ignores_outdated_bundle(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+    bundle_path = build_bundle(tmp_path)
+    registry = CurveRegistry(bundle_path=bundle_path)
+
+    # Update the data file after the bundle has been created.
+    _write_datafile(path, 3)
+    stat = os.stat(bundle_path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    _, values = registry.get(path)
+
+    assert pytest.approx(values[2].value) == 3
+
+
+def test_curve_bundle_rejects_other_files(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "curve.npz"
+    _write_datafile(path, 2)
+
+    with pytest.raises(ValueError, match="Not a curve bundle"):
+        CurveBundle(path)
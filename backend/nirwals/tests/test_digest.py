@@ -0,0 +1,137 @@
+import dataclasses
+from typing import Callable, cast
+
+import pytest
+from astropy import units as u
+
+from nirwals.configuration import (
+    Configuration,
+    EmissionLine,
+    Exposure,
+    Galaxy,
+    Grating,
+    Source,
+    Spectrum,
+)
+from nirwals.digest import (
+    CanonicalBlackbody,
+    CanonicalConfiguration,
+    canonical_configuration,
+)
+from nirwals.tests.utils import get_default_configuration
+
+
+def test_canonical_configuration_normalises_units() -> None:
+    configuration1 = get_default_configuration()
+    configuration2 = get_default_configuration()
+    configuration2.seeing = (2 / 3600) * u.deg
+    configuration2.telescope.effective_mirror_area = 46 * u.m**2
+    grating = cast(Grating, configuration2.telescope.grating)
+    grating.grating_angle = (45 * u.deg).to(u.rad)
+    cast(Exposure, configuration2.exposure).exposure_time = 100000 * u.ms
+
+    canonical1 = canonical_configuration(configuration1, "v1")
+    canonical2 = canonical_configuration(configuration2, "v1")
+
+    assert canonical1 == canonical2
+    assert hash(canonical1) == hash(canonical2)
+    assert canonical1.digest() == canonical2.digest()
+    assert canonical1.grating_angle == 45
+    assert canonical1.spectrum == (CanonicalBlackbody(magnitude=19, temperature=4000),)
+
+
+def test_canonical_configuration_quantises_floats() -> None:
+    configuration1 = get_default_configuration()
+    configuration2 = get_default_configuration()
+    configuration2.zenith_distance = (37 + 1e-12) * u.deg
+
+    assert canonical_configuration(configuration1, "v1") == canonical_configuration(
+        configuration2, "v1"
+    )
+
+
+def test_canonical_configuration_is_frozen_and_slotted() -> None:
+    canonical = canonical_configuration(get_default_configuration(), "v1")
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        canonical.seeing = 3  # type: ignore
+    assert not hasattr(canonical, "__dict__")
+
+
+def test_canonical_configuration_uses_data_version(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("nirwals.digest.data_version", lambda: "abc")
+    canonical = canonical_configuration(get_default_configuration())
+
+    assert canonical.data_version == "abc"
+    assert canonical.digest("sky") != dataclasses.replace(
+        canonical, data_version="def"
+    ).digest("sky")
+
+
+@pytest.mark.parametrize(
+    "change,changed_stages",
+    [
+        (lambda c: setattr(c.exposure, "exposure_time", 5 * u.s), set()),
+        (
+            lambda c: setattr(c, "seeing", 1.5 * u.arcsec),
+            {"bandpass", "sky_bandpass"},
+        ),
+        (lambda c: setattr(c.source, "extension", "Diffuse"), {"bandpass"}),
+        (
+            lambda c: setattr(c.telescope.grating, "grating_angle", 40 * u.deg),
+            {"bandpass", "sky_bandpass"},
+        ),
+        (lambda c: setattr(c.detector, "read_noise", 10.0), {"detector"}),
+        (lambda c: setattr(c.source.spectrum[0], "magnitude", 18), {"source"}),
+    ],
+)
+def test_stage_digests_depend_on_stage_inputs(
+    change: Callable[[Configuration], None], changed_stages: set[str]
+) -> None:
+    configuration = get_default_configuration()
+    digests = canonical_configuration(configuration, "v1").stage_digests()
+    change(configuration)
+    new_digests = canonical_configuration(configuration, "v1").stage_digests()
+
+    assert {s for s in digests if digests[s] != new_digests[s]} == changed_stages
+
+
+def test_digest_distinguishes_spectra() -> None:
+    configuration = get_default_configuration()
+    source = cast(Source, configuration.source)
+    line = EmissionLine(
+        central_wavelength=12000 * u.AA,
+        fwhm=20 * u.AA,
+        redshift=0,
+        total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+    )
+    galaxy = Galaxy(
+        age="Old", galaxy_type="E", magnitude=19, redshift=0, with_emission_lines=False
+    )
+    spectra: list[list[Spectrum]] = [[line], [galaxy], [line, galaxy], [galaxy, line]]
+    digests = {
+        canonical_configuration(
+            dataclasses.replace(
+                configuration, source=dataclasses.replace(source, spectrum=spectrum)
+            ),
+            "v1",
+        ).digest("source")
+        for spectrum in spectra
+    }
+
+    assert len(digests) == 4
+
+
+def test_digest_is_stable() -> None:
+    canonical = canonical_configuration(get_default_configuration(), "v1")
+
+    assert isinstance(canonical, CanonicalConfiguration)
+    assert len(canonical.digest("source")) == 64
+    assert canonical.digest("source") == canonical_configuration(
+        get_default_configuration(), "v1"
+    ).digest("source")
+    assert canonical.digest("source") != canonical.digest("sky")
+    with pytest.raises(ValueError, match="Unsupported stage"):
+        canonical.digest("observation")  # type: ignore
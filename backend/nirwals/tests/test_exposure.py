@@ -19,7 +19,16 @@ from synphot import (
 )
 
 from constants import get_minimum_wavelength, get_maximum_wavelength
-from nirwals.configuration import Source, Grating, Exposure, SNR, GratingName
+from nirwals.configuration import (
+    Configuration,
+    Source,
+    Grating,
+    Exposure,
+    SNR,
+    Blackbody,
+    EmissionLine,
+    Spectrum,
+)
 from nirwals.physics.exposure import (
     wavelength_resolution_element,
     pixel_wavelength_range,
@@ -31,6 +40,10 @@ from nirwals.physics.exposure import (
     exposure_time,
     electrons,
     source_electrons,
+    ObservationPlan,
+    snr_grid,
+    exposure_time_map,
+    magnitude_curve,
 )
 from nirwals.tests.utils import get_default_configuration, create_matplotlib_figure
 
@@ -77,9 +90,15 @@ def _patch(monkeypatch: MonkeyPatch) -> dict[str, MagicMock]:
         _MOCK_DETECTOR_QUANTUM_EFFICIENCY,
     ):
         mock = MagicMock(return_value=SpectralElement(ConstFlux1D, amplitude=m[1]))
-        monkeypatch.setattr(f"nirwals.physics.exposure.{m[0]}", mock)
+        monkeypatch.setattr(f"nirwals.physics.bandpass.{m[0]}", mock)
         mocks[m[0]] = mock
 
+    # The exposure module applies the atmospheric transmission itself.
+    monkeypatch.setattr(
+        "nirwals.physics.exposure.atmospheric_transmission",
+        mocks["atmospheric_transmission"],
+    )
+
     return mocks
 
 
@@ -180,10 +199,39 @@ class _MockConstantObservation:
         return np.arange(8000, 17000, 1) * u.AA
 
 
+def _patch_fluxes(
+    monkeypatch: MonkeyPatch, source_flux: float, sky_flux: float
+) -> tuple[MagicMock, MagicMock]:
+    """
+    Mock the detected source and sky fluxes used by the observation plan.
+
+    The mocked fluxes are constant flux densities (in PHOTLAM), and the pixel
+    wavelengths are mocked to have a spacing of 1 A.
+    """
+    source_mock = MagicMock(
+        side_effect=lambda configuration, wavelengths: (
+            source_flux * np.ones(len(wavelengths)),
+            np.zeros(len(wavelengths)),
+        )
+    )
+    monkeypatch.setattr("nirwals.physics.exposure.source_fluxes", source_mock)
+    sky_mock = MagicMock(
+        side_effect=lambda configuration, wavelengths: sky_flux
+        * np.ones(len(wavelengths))
+    )
+    monkeypatch.setattr("nirwals.physics.exposure.sky_fluxes", sky_mock)
+    monkeypatch.setattr(
+        "nirwals.physics.exposure.pixel_wavelength_range",
+        MagicMock(return_value=1 * u.AA),
+    )
+    return source_mock, sky_mock
+
+
 def test_wavelength_resolution_element(monkeypatch: MonkeyPatch) -> None:
-    monkeypatch.setattr("nirwals.physics.exposure.FIBRE_RADIUS", 2 * u.arcsec)
-    monkeypatch.setattr("nirwals.physics.exposure.TELESCOPE_FOCAL_LENGTH", 50 * u.m)
-    monkeypatch.setattr("nirwals.physics.exposure.COLLIMATOR_FOCAL_LENGTH", 0.75 * u.m)
+    # The kernels use constants in canonical units (arcseconds and Angstrom).
+    monkeypatch.setattr("nirwals.physics.kernels._FIBRE_RADIUS", 2)
+    monkeypatch.setattr("nirwals.physics.kernels._TELESCOPE_FOCAL_LENGTH", 50e10)
+    monkeypatch.setattr("nirwals.physics.kernels._COLLIMATOR_FOCAL_LENGTH", 0.75e10)
     grating_constant = 2 * u.um
     grating_angle = 60 * u.deg
 
@@ -192,8 +240,9 @@ def test_wavelength_resolution_element(monkeypatch: MonkeyPatch) -> None:
 
 
 def test_pixel_wavelength_range(monkeypatch: MonkeyPatch) -> None:
-    monkeypatch.setattr("nirwals.physics.exposure.CAMERA_FOCAL_LENGTH", 0.2 * u.m)
-    monkeypatch.setattr("nirwals.physics.exposure.CCD_PIXEL_SIZE", 15 * u.um)
+    # The kernels use constants in canonical units (Angstrom).
+    monkeypatch.setattr("nirwals.physics.kernels._CAMERA_FOCAL_LENGTH", 0.2e10)
+    monkeypatch.setattr("nirwals.physics.kernels._CCD_PIXEL_SIZE", 15e4)
     grating_constant = 3 * u.um
     grating_angle = 60 * u.deg
 
@@ -476,53 +525,111 @@ def test_source_electron_values(monkeypatch: MonkeyPatch) -> None:
     area = 543210 * u.cm**2
     exposures = 7
     exposure_time = 712 * u.s
-    grating_angle = 56 * u.deg
-    grating_constant = 1e-3 * u.mm
     configuration = get_default_configuration()
     configuration.telescope.effective_mirror_area = area
-    grating = cast(Grating, configuration.telescope.grating)
-    grating.grating_angle = grating_angle
-    grating.name = cast(GratingName, "1000")
     exposure = cast(Exposure, configuration.exposure)
     exposure.exposures = exposures
     exposure.exposure_time = exposure_time
-    wavelength_values = np.array([9000, 15000])
-    electron_count_values = np.array([167, 89])
 
-    # Patch the relevant functions.
-    observation = _MockConstantObservation(flux=7 * units.PHOTLAM)
-    source_observation = MagicMock(return_value=observation)
+    # Mock a constant flux of 7 PHOTLAM and bins of 10 pixels with 1 A each.
+    source_mock, _ = _patch_fluxes(monkeypatch, source_flux=7, sky_flux=3)
+    wre_mock = MagicMock(return_value=10 * u.AA)
     monkeypatch.setattr(
-        "nirwals.physics.exposure.source_observation", source_observation
-    )
-    electrons = MagicMock(
-        return_value=(
-            wavelength_values * u.AA,
-            electron_count_values * u.dimensionless_unscaled,
-        )
+        "nirwals.physics.exposure.wavelength_resolution_element", wre_mock
     )
-    monkeypatch.setattr("nirwals.physics.exposure.electrons", electrons)
 
-    # Sanity check: The relevant functions are called with the correct values.
+    # Sanity check: The source fluxes are requested for the pixel wavelengths.
     wavelengths, electron_counts = source_electrons(configuration)
-    source_observation.assert_called_once_with(configuration)
-    electrons.assert_called_once_with(
-        area=area,
-        exposures=exposures,
-        exposure_time=exposure_time,
-        grating_angle=grating_angle,
-        grating_constant=grating_constant,
-        observation=observation,
-    )
-
-    # Check that the calculated values are correct, i.e. the ones returned by the
-    # electrons function.
-    assert np.allclose(wavelengths.to(u.AA).value, wavelength_values)
+    source_mock.assert_called_once()
+    assert source_mock.call_args.args[0] is configuration
+    pixel_wavelengths = source_mock.call_args.args[1].to(u.AA).value
+    assert np.allclose(np.diff(pixel_wavelengths), 1)
+
+    # Check that the calculated values are correct, i.e. the rates of 7 PHOTLAM *
+    # 10 A * area multiplied by the total exposure time. The first and last bin are
+    # affected by boundary effects.
+    assert np.allclose(np.diff(wavelengths.to(u.AA).value), 10)
     assert np.allclose(
-        electron_counts.to(u.dimensionless_unscaled).value, electron_count_values
+        electron_counts[1:-1].to(u.photon).value,
+        exposures * 712 * 7 * 10 * 543210,
     )
 
 
+def test_observation_plan_observes_once(monkeypatch: MonkeyPatch) -> None:
+    source_mock, sky_mock = _patch_fluxes(monkeypatch, source_flux=7, sky_flux=3)
+
+    configuration = get_default_configuration()
+    plan = ObservationPlan(configuration)
+    plan.snr()
+    plan.source_electrons()
+    cast(Exposure, configuration.exposure).snr = SNR(snr=10, wavelength=12000 * u.AA)
+    plan.exposure_time()
+
+    source_mock.assert_called_once()
+    sky_mock.assert_called_once()
+
+
+def test_observation_plan_matches_observations() -> None:
+    # The natively calculated rates must be the same as those of the synphot
+    # observations.
+    configuration = get_default_configuration()
+    grating = cast(Grating, configuration.telescope.grating)
+    plan = ObservationPlan(configuration)
+
+    for (wavelengths, rates), observation in [
+        (plan.source_rates, source_observation(configuration)),
+        (plan.sky_rates, sky_observation(configuration)),
+    ]:
+        expected_wavelengths, expected_rates = detection_rates(
+            area=configuration.telescope.effective_mirror_area,
+            grating_angle=grating.grating_angle,
+            grating_constant=grating.grating_constant,
+            observation=observation,
+        )
+        assert np.allclose(wavelengths.value, expected_wavelengths.value)
+        assert rates.to(u.photon / u.s).value == pytest.approx(
+            expected_rates.to(u.photon / u.s).value, rel=1e-6
+        )
+
+
+def test_observation_plan_conserves_narrow_line_flux() -> None:
+    # Emission lines are integrated over the pixels, so that the detected flux of a
+    # line much narrower than a pixel does not depend on its position relative to the
+    # pixel midpoints.
+    def total_rate(central_wavelength: Quantity) -> float:
+        configuration = get_default_configuration()
+        cast(Source, configuration.source).spectrum = [
+            EmissionLine(
+                central_wavelength=central_wavelength,
+                fwhm=0.2 * u.AA,
+                redshift=0,
+                total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+            )
+        ]
+        _, rates = ObservationPlan(configuration).source_rates
+        return float(np.sum(rates.to(u.photon / u.s).value))
+
+    grating = cast(Grating, get_default_configuration().telescope.grating)
+    pixel = pixel_wavelength_range(grating.grating_angle, grating.grating_constant)
+    rates = np.array([total_rate(12000 * u.AA + f * pixel) for f in (0, 0.25, 0.5)])
+
+    assert rates == pytest.approx(rates[0], rel=5e-3)
+
+
+def test_observation_plan_uses_current_exposure() -> None:
+    configuration = get_default_configuration()
+    exposure = cast(Exposure, configuration.exposure)
+    plan = ObservationPlan(configuration)
+    _, electrons1 = plan.source_electrons()
+
+    # Changing the exposure time after the rates have been calculated must be taken
+    # into account.
+    exposure.exposure_time = 2 * cast(Quantity, exposure.exposure_time)
+    _, electrons2 = plan.source_electrons()
+
+    assert np.allclose(electrons2.value, 2 * electrons1.value)
+
+
 @pytest.mark.mpl_image_compare
 def test_source_electrons() -> Figure:
     configuration = get_default_configuration()
@@ -547,15 +654,9 @@ def test_readout_noise() -> None:
 
 
 def test_snr_value(monkeypatch: MonkeyPatch) -> None:
-    # Mock the source observation to have a constant flux of 7 PHOTLAM and a bin set
-    # spacing of 1 A.
-    source_mock = MagicMock(return_value=_MockConstantObservation(7 * units.PHOTLAM))
-    monkeypatch.setattr("nirwals.physics.exposure.source_observation", source_mock)
-
-    # Mock the source observation to have a constant flux of 3 PHOTLAM and a bin set
-    # spacing of 1 A.
-    sky_mock = MagicMock(return_value=_MockConstantObservation(3 * units.PHOTLAM))
-    monkeypatch.setattr("nirwals.physics.exposure.sky_observation", sky_mock)
+    # Mock the source and sky to have a constant flux of 7 and 3 PHOTLAM,
+    # respectively, and the pixels to have a width of 1 A.
+    _patch_fluxes(monkeypatch, source_flux=7, sky_flux=3)
 
     # Choose the wavelength resolution element so that the detection rate bins will have
     # a size of 10 A.
@@ -583,6 +684,32 @@ def test_snr_value(monkeypatch: MonkeyPatch) -> None:
     assert pytest.approx(snr_values[20]) == 16.8
 
 
+def test_snr_grid() -> None:
+    # The SNR grid must agree with the SNR calculated for the individual exposure
+    # times and numbers of exposures.
+    configuration = get_default_configuration()
+    exposure_times = np.array([10, 100, 1000]) * u.s
+    exposures = np.array([1, 4])
+
+    wavelengths, snr_values = snr_grid(configuration, exposure_times, exposures)
+
+    assert snr_values.shape == (3, 2, len(wavelengths))
+    for i, t in enumerate(exposure_times):
+        for j, e in enumerate(exposures):
+            exposure = cast(Exposure, configuration.exposure)
+            exposure.exposure_time = t
+            exposure.exposures = int(e)
+            expected_wavelengths, expected_snr_values = snr(configuration)
+            assert np.array_equal(wavelengths, expected_wavelengths)
+            assert np.allclose(snr_values[i, j], expected_snr_values, equal_nan=True)
+
+
+def test_snr_grid_rejects_multidimensional_arrays() -> None:
+    plan = ObservationPlan(get_default_configuration())
+    with pytest.raises(ValueError, match="one-dimensional"):
+        plan.snr_grid(np.ones((2, 2)) * u.s, 1)
+
+
 @pytest.mark.mpl_image_compare
 def test_snr() -> Figure:
     configuration = get_default_configuration()
@@ -631,6 +758,92 @@ def test_exposure_time_value() -> None:
     assert pytest.approx(snr_value) == requested_snr_value
 
 
+def test_exposure_time_map() -> None:
+    # The SNR for the exposure times must be the target SNR.
+    configuration = get_default_configuration()
+    exposure = cast(Exposure, configuration.exposure)
+    exposure.exposures = 3
+    plan = ObservationPlan(configuration)
+    snrs = np.array([0, 5, 20])
+
+    wavelengths, exposure_times = exposure_time_map(configuration, snrs)
+
+    assert exposure_times.shape == (3, len(wavelengths))
+    assert np.all(exposure_times[0] == 0)
+    bins = np.arange(len(wavelengths))[np.isfinite(exposure_times[2])][10:-10:50]
+    for i in (1, 2):
+        for k in bins:
+            _, snr_values = plan.snr_grid(exposure_times[i, k], 3)
+            assert pytest.approx(float(snr_values[0, 0, k])) == snrs[i]
+
+
+def test_exposure_time_map_without_source_flux(monkeypatch: MonkeyPatch) -> None:
+    _patch_fluxes(monkeypatch, source_flux=0, sky_flux=3)
+
+    _, exposure_times = exposure_time_map(get_default_configuration(), [0, 10])
+
+    assert np.all(exposure_times[0] == 0)
+    assert np.all(np.isinf(exposure_times[1]))
+
+
+def _with_magnitude(configuration: Configuration, magnitude: float) -> Configuration:
+    source = cast(Source, configuration.source)
+    spectrum = dataclasses.replace(
+        cast(Blackbody, source.spectrum[0]), magnitude=magnitude
+    )
+    return dataclasses.replace(
+        configuration, source=dataclasses.replace(source, spectrum=[spectrum])
+    )
+
+
+def test_snr_for_magnitudes() -> None:
+    configuration = get_default_configuration()
+    wavelengths, _ = snr(configuration)
+    wavelength = wavelengths[400]
+
+    snr_values = ObservationPlan(configuration).snr_for_magnitudes([16, 21], wavelength)
+
+    for magnitude, snr_value in zip([16, 21], snr_values):
+        _, expected = snr(_with_magnitude(configuration, magnitude))
+        assert snr_value.value == pytest.approx(expected[400].value, rel=1e-6)
+
+
+def test_limiting_magnitude() -> None:
+    configuration = get_default_configuration()
+    wavelengths, _ = snr(configuration)
+    wavelength = wavelengths[400]
+
+    curve = magnitude_curve(configuration, snr=3, wavelength=wavelength)
+
+    _, snr_values = snr(_with_magnitude(configuration, curve.limiting_magnitude))
+    assert snr_values[400].value == pytest.approx(3, rel=1e-6)
+    assert len(curve.magnitudes) == 101
+    assert curve.magnitudes[50] == pytest.approx(curve.limiting_magnitude)
+    assert curve.snr_values[50].value == pytest.approx(3, rel=1e-6)
+    assert np.all(np.diff(curve.snr_values.value) < 0)
+
+
+def test_magnitude_curve_requires_single_normalised_spectrum() -> None:
+    configuration = get_default_configuration()
+    source = cast(Source, configuration.source)
+    emission_line = EmissionLine(
+        central_wavelength=12000 * u.AA,
+        fwhm=20 * u.AA,
+        redshift=0,
+        total_flux=1e-16 * u.erg / (u.cm**2 * u.s),
+    )
+    spectra: list[list[Spectrum]] = [
+        [emission_line],
+        [source.spectrum[0], source.spectrum[0]],
+    ]
+    for spectrum in spectra:
+        configuration = dataclasses.replace(
+            configuration, source=dataclasses.replace(source, spectrum=spectrum)
+        )
+        with pytest.raises(ValueError, match="single blackbody or galaxy"):
+            magnitude_curve(configuration, snr=3, wavelength=12000 * u.AA)
+
+
 @pytest.mark.mpl_image_compare
 def test_exposure_time() -> Figure:
     # Create the required configuration.
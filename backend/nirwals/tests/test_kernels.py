@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from astropy import units as u
+
+from nirwals.physics import kernels
+from nirwals.physics.bandpass import fibre_throughput, grating_efficiency_bank
+from nirwals.physics.exposure import (
+    binset,
+    pixel_wavelength_range,
+    wavelength_resolution_element,
+)
+
+
+def test_grating_kernels_match_quantity_functions() -> None:
+    grating_angles = np.array([30, 37.5, 50])
+    grating_constant = 1 / 950 * u.mm
+
+    resolution_elements = kernels.wavelength_resolution_element(
+        grating_angles, grating_constant.to(u.AA).value
+    )
+    pixel_widths = kernels.pixel_wavelength_range(
+        grating_angles, grating_constant.to(u.AA).value
+    )
+    for i, angle in enumerate(grating_angles):
+        assert resolution_elements[i] == pytest.approx(
+            wavelength_resolution_element(angle * u.deg, grating_constant)
+            .to(u.AA)
+            .value
+        )
+        assert pixel_widths[i] == pytest.approx(
+            pixel_wavelength_range(angle * u.deg, grating_constant).to(u.AA).value
+        )
+        assert kernels.binset(pixel_widths[i]) == pytest.approx(
+            binset(angle * u.deg, grating_constant).to(u.AA).value
+        )
+
+
+@pytest.mark.parametrize("source_extension", ["Point", "Diffuse"])
+def test_fibre_throughput_kernel(source_extension: str) -> None:
+    expected = fibre_throughput(
+        seeing=1.5 * u.arcsec,
+        source_extension=source_extension,
+        zenith_distance=37 * u.deg,
+    )(12000 * u.AA)
+    assert kernels.fibre_throughput(
+        seeing=1.5, source_extension=source_extension, zenith_distance=37  # type: ignore
+    ) == pytest.approx(float(expected))
+
+
+def test_fibre_throughput_kernel_rejects_invalid_extension() -> None:
+    with pytest.raises(ValueError, match="Unsupported"):
+        kernels.fibre_throughput(
+            seeing=1, source_extension="Huge", zenith_distance=0  # type: ignore
+        )
+
+
+def test_grating_efficiency_values() -> None:
+    bank = grating_efficiency_bank("950")
+    wavelengths = np.linspace(9000, 17000, 50)
+    expected_wavelengths, expected = bank.efficiencies(
+        grating_angles=[33, 41] * u.deg, wavelengths=wavelengths * u.AA
+    )
+    assert bank.efficiency_values([33, 41], wavelengths) == pytest.approx(expected)
+
+
+def test_detection_rates_conserve_flux() -> None:
+    # A constant flux density of 3 PHOTLAM over 20 pixels of 2 A, binned into bins of
+    # 5 pixels and multiplied by an area of 7 cm^2.
+    wavelengths = 10000 + 2 * np.arange(20)
+    bin_wavelengths, rates = kernels.detection_rates(
+        wavelengths, 3 * np.ones(20), resolution_element=9.5, area=7
+    )
+
+    assert bin_wavelengths == pytest.approx([10004, 10014, 10024, 10034])
+    assert rates[1:-1] == pytest.approx(3 * 10 * 7)
+
+    # The total flux is conserved, apart from a quarter of a pixel at either end, as
+    # the flux density is assumed to drop to 0 at the outer pixel edges.
+    assert rates.sum() == pytest.approx(3 * 2 * 19.5 * 7)
+
+
+def test_snr_and_exposure_times_are_consistent() -> None:
+    rate_source = np.array([0.5, 2, 10])
+    rate_sky = np.array([1, 0.1, 30])
+    exposures = 3
+    readout_noise = 25
+
+    exposure_times = kernels.exposure_times(
+        10, rate_source, rate_sky, exposures, readout_noise
+    )
+    snr_values = kernels.snr(
+        rate_source, rate_sky, exposures, exposure_times, readout_noise
+    )
+
+    assert snr_values == pytest.approx(10)
+    assert kernels.electrons(rate_source, exposures, exposure_times) == pytest.approx(
+        rate_source * exposures * exposure_times
+    )
+
+
+def test_exposure_times_without_source_flux() -> None:
+    exposure_times = kernels.exposure_times([0, 5], 0, 1, 2, 10)
+
+    assert exposure_times[0] == 0
+    assert exposure_times[1] == np.inf
@@ -0,0 +1,84 @@
+import os
+import pathlib
+
+import numpy as np
+import pytest
+
+from nirwals.physics.data import data_version, UNVERSIONED_DATA
+from numpyfy import convert_all
+
+
+def _write_csv(path: pathlib.Path, rows: list[tuple[float, float]]) -> None:
+    with open(path, "w") as f:
+        f.write("x,y\n")
+        for x, y in rows:
+            f.write(f"{x},{y}\n")
+
+
+def test_convert_all(tmp_path: pathlib.Path) -> None:
+    (tmp_path / "filters").mkdir()
+    _write_csv(tmp_path / "a.csv", [(1000, 1), (2000, 2)])
+    _write_csv(tmp_path / "filters" / "b.csv", [(1000, 3), (2000, 4)])
+
+    manifest = convert_all(tmp_path)
+
+    assert sorted(manifest["files"].keys()) == ["a.csv", "filters/b.csv"]
+    assert manifest["files"]["filters/b.csv"]["output"] == "filters/b.npz"
+    npzfile = np.load(tmp_path / "filters" / "b.npz")
+    assert np.array_equal(npzfile["x"], [1000, 2000])
+    assert np.array_equal(npzfile["y"], [3, 4])
+    assert data_version(tmp_path) == manifest["data_version"]
+
+
+def test_convert_all_is_incremental(tmp_path: pathlib.Path) -> None:
+    _write_csv(tmp_path / "a.csv", [(1000, 1), (2000, 2)])
+    _write_csv(tmp_path / "b.csv", [(1000, 3), (2000, 4)])
+    manifest1 = convert_all(tmp_path)
+    stat_a = os.stat(tmp_path / "a.npz")
+    stat_b = os.stat(tmp_path / "b.npz")
+
+    # Nothing has changed, so nothing should be converted.
+    manifest2 = convert_all(tmp_path)
+    assert manifest2 == manifest1
+    assert os.stat(tmp_path / "a.npz").st_mtime_ns == stat_a.st_mtime_ns
+    assert os.stat(tmp_path / "b.npz").st_mtime_ns == stat_b.st_mtime_ns
+
+    # Only the changed file should be converted.
+    _write_csv(tmp_path / "b.csv", [(1000, 5), (2000, 6)])
+    manifest3 = convert_all(tmp_path)
+    assert os.stat(tmp_path / "a.npz").st_mtime_ns == stat_a.st_mtime_ns
+    assert np.array_equal(np.load(tmp_path / "b.npz")["y"], [5, 6])
+    assert manifest3["files"]["a.csv"] == manifest1["files"]["a.csv"]
+    assert manifest3["data_version"] != manifest1["data_version"]
+
+
+def test_convert_all_replaces_missing_output(tmp_path: pathlib.Path) -> None:
+    _write_csv(tmp_path / "a.csv", [(1000, 1), (2000, 2)])
+    convert_all(tmp_path)
+    os.remove(tmp_path / "a.npz")
+
+    convert_all(tmp_path)
+
+    assert (tmp_path / "a.npz").exists()
+
+
+@pytest.mark.parametrize(
+    "rows",
+    [
+        [(1000, 1), (3000, 2), (2000, 3)],
+        [(1000, 1), (1000, 2)],
+        [(1000, 1), (float("nan"), 2)],
+        [(1000, 1), (2000, float("inf"))],
+    ],
+)
+def test_convert_all_rejects_invalid_data(
+    rows: list[tuple[float, float]], tmp_path: pathlib.Path
+) -> None:
+    _write_csv(tmp_path / "a.csv", rows)
+
+    with pytest.raises(ValueError):
+        convert_all(tmp_path)
+
+
+def test_data_version_without_manifest(tmp_path: pathlib.Path) -> None:
+    assert data_version(tmp_path) == UNVERSIONED_DATA
@@ -0,0 +1,85 @@
+import dataclasses
+from typing import cast
+
+import numpy as np
+import pytest
+from astropy import units as u
+
+from nirwals.configuration import Configuration, Exposure, Grating, SNR
+from nirwals.physics.exposure import exposure_time, snr
+from nirwals.physics.optimisation import grating_angle_curve
+from nirwals.tests.utils import get_default_configuration
+
+
+def _with_grating_angle(
+    configuration: Configuration, grating_angle: u.Quantity
+) -> Configuration:
+    grating = dataclasses.replace(
+        cast(Grating, configuration.telescope.grating), grating_angle=grating_angle
+    )
+    telescope = dataclasses.replace(configuration.telescope, grating=grating)
+    return dataclasses.replace(configuration, telescope=telescope)
+
+
+def test_grating_angle_curve_for_snr() -> None:
+    configuration = get_default_configuration()
+    grating_angles = np.array([30, 37.3, 42, 48]) * u.deg
+    wavelength = 13000 * u.AA
+    curve = grating_angle_curve(
+        configuration, wavelength=wavelength, grating_angles=grating_angles
+    )
+
+    assert curve.exposure_times is None
+    assert curve.snr_values is not None
+    expected = []
+    for grating_angle in grating_angles:
+        wavelengths, snr_values = snr(_with_grating_angle(configuration, grating_angle))
+        expected.append(
+            np.interp(
+                wavelength.to(u.AA).value,
+                wavelengths.to(u.AA).value,
+                snr_values.value,
+            )
+        )
+    assert curve.snr_values.value == pytest.approx(expected, rel=1e-3)
+    assert curve.best_grating_angle == grating_angles[np.argmax(expected)]
+
+
+def test_grating_angle_curve_for_exposure_time() -> None:
+    configuration = get_default_configuration()
+    exposure = dataclasses.replace(
+        cast(Exposure, configuration.exposure),
+        exposure_time=None,
+        snr=SNR(snr=10, wavelength=13000 * u.AA),
+    )
+    configuration = dataclasses.replace(configuration, exposure=exposure)
+    grating_angles = np.array([30, 37.3, 42, 48]) * u.deg
+    curve = grating_angle_curve(configuration, grating_angles=grating_angles)
+
+    assert curve.snr_values is None
+    assert curve.exposure_times is not None
+    assert curve.wavelength == 13000 * u.AA
+    expected = []
+    for grating_angle in grating_angles:
+        snr_values, exposure_times = exposure_time(
+            _with_grating_angle(configuration, grating_angle)
+        )
+        assert snr_values[50].value == pytest.approx(10)
+        expected.append(exposure_times[50].to(u.s).value)
+    assert curve.exposure_times.to(u.s).value == pytest.approx(expected, rel=1e-3)
+    assert curve.best_grating_angle == grating_angles[np.argmin(expected)]
+
+
+def test_grating_angle_curve_covers_supported_angles() -> None:
+    configuration = get_default_configuration()
+    curve = grating_angle_curve(configuration, wavelength=13000 * u.AA)
+
+    assert len(curve.grating_angles) == 201
+    assert curve.snr_values is not None
+    assert len(curve.snr_values) == 201
+    assert curve.best_grating_angle in curve.grating_angles
+
+
+def test_grating_angle_curve_requires_wavelength_for_snr() -> None:
+    with pytest.raises(ValueError, match="wavelength"):
+        grating_angle_curve(get_default_configuration())
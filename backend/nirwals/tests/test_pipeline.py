@@ -0,0 +1,162 @@
+from typing import cast
+
+import numpy as np
+import pytest
+from astropy import units as u
+
+from nirwals.configuration import Detector, Exposure, Grating
+from nirwals.digest import canonical_configuration
+from nirwals.physics.exposure import ObservationPlan
+from nirwals.physics.pipeline import Node, Pipeline, default_pipeline, pipeline_plan
+from nirwals.tests.utils import get_default_configuration
+
+
+def _pipeline() -> Pipeline:
+    # A pipeline with the default nodes, but with empty caches.
+    return Pipeline(default_pipeline().nodes.values())
+
+
+def test_pipeline_plan_matches_observation_plan() -> None:
+    configuration = get_default_configuration()
+    plan = pipeline_plan(configuration, _pipeline())
+    expected_plan = ObservationPlan(configuration)
+
+    wavelengths, snr_values = plan.snr()
+    expected_wavelengths, expected_snr_values = expected_plan.snr()
+    assert wavelengths.to(u.AA).value == pytest.approx(
+        expected_wavelengths.to(u.AA).value
+    )
+    assert snr_values.value == pytest.approx(expected_snr_values.value)
+    _, electrons = plan.source_electrons()
+    _, expected_electrons = expected_plan.source_electrons()
+    assert electrons.to(u.photon).value == pytest.approx(
+        expected_electrons.to(u.photon).value
+    )
+
+
+def test_pipeline_plan_uses_given_canonical_configuration() -> None:
+    configuration = get_default_configuration()
+    canonical = canonical_configuration(configuration, "v1")
+    plan = pipeline_plan(configuration, _pipeline(), canonical)
+
+    assert plan.run.canonical is canonical
+
+
+def test_pipeline_only_recomputes_affected_nodes() -> None:
+    pipeline = _pipeline()
+    configuration = get_default_configuration()
+    plan = pipeline_plan(configuration, pipeline)
+    plan.snr()
+    assert set(plan.stats().recomputed) == set(pipeline.nodes)
+    assert plan.stats().hits == ()
+
+    # Changing the exposure time requires no recomputation at all.
+    cast(Exposure, configuration.exposure).exposure_time = 500 * u.s
+    plan = pipeline_plan(configuration, pipeline)
+    plan.snr()
+    assert plan.stats().recomputed == ()
+    assert set(plan.stats().hits) == {"source_rates", "sky_rates", "readout_noise"}
+
+    # Changing the read noise only affects the noise model.
+    cast(Detector, configuration.detector).read_noise = 10
+    plan = pipeline_plan(configuration, pipeline)
+    plan.snr()
+    assert plan.stats().recomputed == ("readout_noise",)
+
+    # Changing the grating angle affects everything but the spectra.
+    cast(Grating, configuration.telescope.grating).grating_angle = 40 * u.deg
+    plan = pipeline_plan(configuration, pipeline)
+    plan.snr()
+    assert set(plan.stats().hits) == {
+        "source_spectrum",
+        "sky_spectrum",
+        "readout_noise",
+    }
+
+    # Changing the source spectrum doesn't affect the sky.
+    configuration.source.spectrum[0].magnitude = 17  # type: ignore
+    plan = pipeline_plan(configuration, pipeline)
+    plan.snr()
+    assert set(plan.stats().recomputed) == {
+        "source_spectrum",
+        "source_fluxes",
+        "source_rates",
+    }
+    assert set(plan.stats().hits) == {
+        "source_throughputs",
+        "pixel_wavelengths",
+        "rebinner",
+        "sky_rates",
+        "readout_noise",
+    }
+
+    # Changing the source extension doesn't affect the sky bandpass.
+    configuration.source.extension = "Diffuse"  # type: ignore
+    plan = pipeline_plan(configuration, pipeline)
+    plan.snr()
+    assert set(plan.stats().recomputed) == {
+        "source_throughputs",
+        "source_fluxes",
+        "source_rates",
+    }
+
+
+def test_pipeline_evaluates_nodes_once_per_run() -> None:
+    calls: list[str] = []
+
+    def compute(name: str, value: int) -> Node:
+        def f(configuration: object, *dependencies: int) -> int:
+            calls.append(name)
+            return value + sum(dependencies)
+
+        return Node(
+            name=name,
+            dependencies=() if name == "a" else ("a",),
+            parameters=lambda c: c.seeing,
+            compute=f,
+        )
+
+    pipeline = Pipeline([compute("a", 1), compute("b", 10), compute("c", 100)])
+    configuration = get_default_configuration()
+    run = pipeline.run(configuration)
+    assert run.value("b") == 11
+    assert run.value("c") == 101
+    assert calls == ["a", "b", "c"]
+
+    run = pipeline.run(configuration)
+    assert run.value("c") == 101
+    assert calls == ["a", "b", "c"]
+    assert run.stats().hits == ("c",)
+    assert pipeline.cache_info()["c"].hits == 1
+
+    configuration.seeing = 1 * u.arcsec
+    run = pipeline.run(configuration)
+    assert run.value("c") == 101
+    assert calls == ["a", "b", "c", "a", "c"]
+    assert run.stats().recomputed == ("a", "c")
+
+
+def test_pipeline_rejects_invalid_graphs() -> None:
+    def node(name: str, *dependencies: str) -> Node:
+        return Node(
+            name=name,
+            dependencies=dependencies,
+            parameters=lambda c: None,
+            compute=lambda configuration, *values: None,
+        )
+
+    with pytest.raises(ValueError, match="Duplicate"):
+        Pipeline([node("a"), node("a")])
+    with pytest.raises(ValueError, match="Unknown dependency"):
+        Pipeline([node("a", "b")])
+    with pytest.raises(ValueError, match="Cyclic"):
+        Pipeline([node("a", "c"), node("b", "a"), node("c", "b")])
+
+
+def test_pipeline_values_are_read_only() -> None:
+    plan = pipeline_plan(get_default_configuration(), _pipeline())
+    wavelengths, rates = plan.run.value("source_rates")
+
+    assert not rates.flags.writeable
+    with pytest.raises(ValueError):
+        np.asarray(rates)[0] = 0
@@ -0,0 +1,171 @@
+import multiprocessing
+import pathlib
+import sqlite3
+from typing import cast
+
+import pytest
+
+from nirwals.response_cache import ResponseCache, response_key
+
+
+def _store(path: pathlib.Path, key: str, value: bytes) -> None:
+    ResponseCache(path).set(key, value)
+
+
+def test_response_cache_hits_and_misses(tmp_path: pathlib.Path) -> None:
+    cache = ResponseCache(tmp_path / "cache.sqlite3")
+    calls: list[str] = []
+
+    def compute() -> bytes:
+        calls.append("a")
+        return b'{"a": 1}'
+
+    assert cache.get_or_compute("a", compute) == (b'{"a": 1}', False)
+    assert cache.get_or_compute("a", compute) == (b'{"a": 1}', True)
+    assert cache.get("b") is None
+    assert calls == ["a"]
+
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.size, info.nbytes) == (1, 2, 1, 8)
+    assert info.hit_rate == pytest.approx(1 / 3)
+
+    cache.clear()
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.size, info.nbytes) == (0, 0, 0, 0)
+    assert info.hit_rate == 0
+
+
+def test_response_cache_is_shared_between_processes(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    cache = ResponseCache(path)
+    process = multiprocessing.get_context("spawn").Process(
+        target=_store, args=(path, "a", b"value")
+    )
+    process.start()
+    process.join()
+
+    assert process.exitcode == 0
+    assert cache.get("a") == b"value"
+
+    # Hits and misses are shared once they have been flushed.
+    assert ResponseCache(path).cache_info().hits == 0
+    cache.flush()
+    assert ResponseCache(path).cache_info().hits == 1
+
+
+def test_response_cache_expires_responses(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = 1000.0
+    monkeypatch.setattr("nirwals.response_cache.time.time", lambda: now)
+    cache = ResponseCache(tmp_path / "cache.sqlite3", ttl=60)
+    cache.set("a", b"a")
+
+    now = 1059
+    assert cache.get("a") == b"a"
+
+    # Accessing a response does not extend its lifetime.
+    now = 1060
+    assert cache.get("a") is None
+
+    # Expired responses are removed when a response is stored.
+    cache.set("b", b"b")
+    info = cache.cache_info()
+    assert (info.size, info.evictions) == (1, 1)
+
+
+def test_response_cache_evicts_least_recently_used_responses(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = 1000.0
+    monkeypatch.setattr("nirwals.response_cache.time.time", lambda: now)
+    cache = ResponseCache(tmp_path / "cache.sqlite3", max_bytes=10)
+    cache.set("a", b"aaaa")
+    now += 100
+    cache.set("b", b"bbbb")
+    now += 100
+    cache.get("a")
+    now += 100
+    cache.set("c", b"cccc")
+
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"cccc"
+    assert cache.cache_info().nbytes == 8
+    assert cache.cache_info().evictions == 1
+
+    # Responses larger than the maximum size are not cached.
+    cache.set("d", 11 * b"d")
+    assert cache.get("d") is None
+    assert cache.cache_info().size == 2
+
+
+def test_response_cache_updates_access_times_rarely(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = 1000.0
+    monkeypatch.setattr("nirwals.response_cache.time.time", lambda: now)
+    path = tmp_path / "cache.sqlite3"
+    cache = ResponseCache(path)
+    cache.set("a", b"a")
+
+    def accessed() -> float:
+        connection = sqlite3.connect(path)
+        (value,) = connection.execute("SELECT accessed FROM responses").fetchone()
+        connection.close()
+        return cast(float, value)
+
+    now = 1050
+    cache.get("a")
+    assert accessed() == 1000
+
+    now = 1070
+    cache.get("a")
+    assert accessed() == 1070
+
+
+def test_response_cache_reads_do_not_block(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr("nirwals.response_cache._TIMEOUT", 0.1)
+    path = tmp_path / "cache.sqlite3"
+    cache = ResponseCache(path)
+    cache.set("a", b"a")
+
+    # Another process holds the write lock.
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        assert cache.get_or_compute("a", lambda: b"b") == (b"a", True)
+
+        # The response is computed if it can't be stored.
+        assert cache.get_or_compute("c", lambda: b"c") == (b"c", False)
+    finally:
+        connection.execute("ROLLBACK")
+        connection.close()
+
+    assert cache.get("c") is None
+    assert cache.cache_info().hits == 1
+
+
+def test_response_cache_falls_back_to_computing(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    cache = ResponseCache(path)
+    cache.set("a", b"a")
+    for file in tmp_path.iterdir():
+        file.write_bytes(b"This is not a database." * 1000)
+
+    assert cache.get_or_compute("a", lambda: b"b") == (b"b", False)
+
+
+def test_response_cache_rejects_invalid_limits(tmp_path: pathlib.Path) -> None:
+    with pytest.raises(ValueError, match="time to live"):
+        ResponseCache(tmp_path / "cache.sqlite3", ttl=0)
+    with pytest.raises(ValueError, match="maximum cache size"):
+        ResponseCache(tmp_path / "cache.sqlite3", max_bytes=0)
+
+
+def test_response_key() -> None:
+    assert response_key("exposure", "abc") == response_key("exposure", "abc")
+    assert response_key("exposure", "abc") != response_key("spectra", "abc")
+    assert response_key("exposure", "abc") != response_key("exposure", "abd")
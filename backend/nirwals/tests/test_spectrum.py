@@ -1,14 +1,21 @@
 from itertools import product
-from typing import get_args, cast
+from typing import get_args, cast, Any
 
 import numpy as np
 import pytest
 
 from astropy import units as u
 from matplotlib.figure import Figure
-from synphot import units, SpectralElement, SourceSpectrum
+from synphot import (
+    units,
+    SpectralElement,
+    SourceSpectrum,
+    BlackBodyNorm1D,
+    GaussianFlux1D,
+    Empirical1D,
+)
 
-from constants import ZERO_MAGNITUDE_FLUX, FLUX
+from constants import ZERO_MAGNITUDE_FLUX, FLUX, get_file_base_dir
 from nirwals.configuration import (
     Blackbody,
     EmissionLine,
@@ -17,7 +24,27 @@ from nirwals.configuration import (
     Galaxy,
     Source,
 )
-from nirwals.physics.spectrum import source_spectrum, normalize, sky_spectrum
+from nirwals.physics.spectrum import (
+    source_spectrum,
+    normalize,
+    sky_spectrum,
+    johnson_j_normaliser,
+    galaxy_template_bank,
+    emission_line_fluxes,
+    emission_lines_fluxes,
+    emission_lines_pixel_fluxes,
+    emission_line_pixel_fluxes,
+    composite_source_spectrum,
+    blackbody_fluxes,
+    blackbody_bank,
+    galaxy_fluxes,
+    _blackbody,
+    _galaxy_j_band_grid,
+    _emission_line,
+    _planck_flam,
+    _galaxy,
+)
+from nirwals.physics.utils import read_from_file
 from nirwals.tests.utils import get_default_configuration, create_matplotlib_figure
 
 
@@ -33,6 +60,49 @@ def test_normalize() -> None:
     assert pytest.approx(float(vega_5(14000 * u.AA) / vega_10(14000 * u.AA))) == 100
 
 
+def test_johnson_j_normaliser_flux() -> None:
+    # The flux must be the same as that calculated by synphot.
+    J = SpectralElement.from_filter("johnson_j")
+    blackbody = SourceSpectrum(BlackBodyNorm1D, temperature=5000 * u.K)
+    expected = (J * blackbody).integrate(flux_unit=units.FLAM).to(FLUX).value
+
+    F = johnson_j_normaliser().flux(blackbody)
+
+    assert pytest.approx(F.to(FLUX).value, rel=1e-9) == expected
+
+
+def test_johnson_j_normaliser_fluxes() -> None:
+    # The fluxes for an array of spectra on the fixed grid must agree with those for
+    # the individual spectra.
+    normaliser = johnson_j_normaliser()
+    wavelengths = normaliser.wavelengths
+    temperatures = [3000, 5000, 10000]
+    blackbodies = [
+        SourceSpectrum(BlackBodyNorm1D, temperature=T * u.K) for T in temperatures
+    ]
+    flux_densities = np.array(
+        [b(wavelengths, flux_unit=units.FLAM).value for b in blackbodies]
+    )
+
+    fluxes = normaliser.fluxes(flux_densities)
+
+    assert fluxes.shape == (3,)
+    for F, blackbody in zip(fluxes, blackbodies):
+        expected = normaliser.flux(blackbody).to(FLUX).value
+        assert pytest.approx(F.to(FLUX).value, rel=1e-4) == expected
+
+
+def test_johnson_j_normaliser_normalisation_factors() -> None:
+    normaliser = johnson_j_normaliser()
+    fluxes = np.array([1, 2]) * ZERO_MAGNITUDE_FLUX
+
+    factors = normaliser.normalisation_factors(fluxes[:, np.newaxis], [0, 5, 10])
+
+    assert factors.shape == (2, 3)
+    assert pytest.approx(factors[0]) == [1, 0.01, 0.0001]
+    assert pytest.approx(factors[1]) == [0.5, 0.005, 0.00005]
+
+
 @pytest.mark.mpl_image_compare
 def test_no_source() -> Figure:
     config = get_default_configuration()
@@ -258,6 +328,51 @@ def test_galaxy_redshift() -> None:
     assert pytest.approx(ratio_z1) == ratio_z0
 
 
+def test_galaxy_template_bank_redshift() -> None:
+    # Redshifting the templates on the grid must agree with stretching the grid.
+    bank = galaxy_template_bank()
+    index = bank.index("Old", "Sb", True)
+    redshifts = np.array([0, 0.3, 1])
+    wavelengths, fluxes = bank.redshifted_fluxes(index, redshifts)
+
+    assert fluxes.shape == (3, len(wavelengths))
+    sample = (wavelengths > 9000 * u.AA) & (wavelengths < 16000 * u.AA)
+    for z, f in zip(redshifts, fluxes):
+        expected = bank.spectrum(index, z)(wavelengths[sample], flux_unit=units.FLAM)
+        assert f[sample] == pytest.approx(expected.value, rel=1e-6)
+
+
+def test_galaxy_template_bank_broadcasts() -> None:
+    bank = galaxy_template_bank()
+    indices = np.array([[0], [5]])
+    redshifts = np.array([0.1, 0.2, 0.3])
+
+    _, fluxes = bank.redshifted_fluxes(indices, redshifts)
+
+    assert fluxes.shape == (2, 3, len(bank.wavelengths))
+    _, expected = bank.redshifted_fluxes(5, 0.2)
+    assert np.array_equal(fluxes[1, 1], expected)
+
+
+def test_galaxy_template_bank_depends_on_data_version(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr("nirwals.physics.spectrum.data_version", lambda: "v1")
+    bank = galaxy_template_bank()
+    assert galaxy_template_bank() is bank
+
+    monkeypatch.setattr("nirwals.physics.spectrum.data_version", lambda: "v2")
+    assert galaxy_template_bank() is not bank
+
+
+def test_galaxy_template_bank_rejects_unsupported_templates() -> None:
+    bank = galaxy_template_bank()
+    with pytest.raises(ValueError, match="galaxy age"):
+        bank.index(cast(GalaxyAge, "Ancient"), "Sa", False)
+    with pytest.raises(ValueError, match="galaxy type"):
+        bank.index("Old", cast(GalaxyType, "Irr"), False)
+
+
 @pytest.mark.mpl_image_compare
 def test_composite_spectrum() -> Figure:
     config = get_default_configuration()
@@ -287,3 +402,238 @@ def test_sky_spectrum() -> Figure:
     return create_matplotlib_figure(
         wavelengths, fluxes, left=9000, right=17000, top=8e-5, title="Sky Background"
     )
+
+
+def test_emission_line_fluxes() -> None:
+    wavelengths = np.arange(9000, 15000, 0.5) * u.AA
+    redshifts = np.array([0, 0.2])
+    fluxes = emission_line_fluxes(
+        central_wavelength=10000 * u.AA,
+        fwhm=25 * u.AA,
+        total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+        redshifts=redshifts,
+        wavelengths=wavelengths,
+    )
+
+    assert fluxes.shape == (2, len(wavelengths))
+    for z, f in zip(redshifts, fluxes):
+        expected = SourceSpectrum(
+            GaussianFlux1D,
+            total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+            mean=10000 * u.AA,
+            fwhm=25 * u.AA,
+            z=z,
+            z_type="conserve_flux",
+        )(wavelengths, flux_unit=units.PHOTLAM).value
+        assert f == pytest.approx(expected, rel=1e-9, abs=1e-12 * expected.max())
+
+
+def test_blackbody_fluxes() -> None:
+    wavelengths = np.arange(9000, 17000, 2.5) * u.AA
+    temperatures = [3000, 5000, 10000] * u.K
+    fluxes = blackbody_fluxes(
+        temperatures=temperatures, magnitudes=[14, 16, 18], wavelengths=wavelengths
+    )
+
+    assert fluxes.shape == (3, len(wavelengths))
+    for temperature, magnitude, f in zip(temperatures, [14, 16, 18], fluxes):
+        expected = _blackbody(temperature, magnitude)(
+            wavelengths, flux_unit=units.PHOTLAM
+        ).value
+        assert f == pytest.approx(expected, rel=1e-5)
+
+
+def test_blackbody_bank() -> None:
+    # The interpolated J band fluxes must agree with integrating the Planck
+    # function, also outside the temperature range of the bank.
+    bank = blackbody_bank()
+    normaliser = johnson_j_normaliser()
+    temperatures = np.array([50, 100, 523.7, 3000, 5778, 41234.5, 1e6, 2e6])
+    expected = normaliser.fluxes(
+        _planck_flam(normaliser.wavelengths.value, temperatures)
+    ).value
+
+    assert bank.fluxes(temperatures * u.K) == pytest.approx(expected, rel=1e-7)
+
+
+def test_galaxy_fluxes() -> None:
+    bank = galaxy_template_bank()
+    wavelengths = np.arange(9000, 17000, 2.5) * u.AA
+    indices = [bank.index("Young", "Sa", False), bank.index("Old", "Sb", True)]
+    fluxes = galaxy_fluxes(
+        indices=indices,
+        redshifts=[0.1, 0.5],
+        magnitudes=[17, 19],
+        wavelengths=wavelengths,
+    )
+
+    assert fluxes.shape == (2, len(wavelengths))
+    spectra = [
+        _galaxy(
+            age="Young",
+            galaxy_type="Sa",
+            with_emission_lines=False,
+            redshift=0.1,
+            magnitude=17,
+        ),
+        _galaxy(
+            age="Old",
+            galaxy_type="Sb",
+            with_emission_lines=True,
+            redshift=0.5,
+            magnitude=19,
+        ),
+    ]
+    for spectrum, f in zip(spectra, fluxes):
+        expected = spectrum(wavelengths, flux_unit=units.PHOTLAM).value
+        assert f == pytest.approx(expected, rel=1e-4, abs=1e-6 * expected.max())
+
+
+def test_galaxy_fluxes_depend_on_data_version(monkeypatch: pytest.MonkeyPatch) -> None:
+    _galaxy_j_band_grid.cache_clear()
+    parameters: dict[str, Any] = dict(
+        indices=[0], redshifts=[0.1], magnitudes=[17], wavelengths=[12000] * u.AA
+    )
+
+    monkeypatch.setattr("nirwals.physics.spectrum.data_version", lambda: "v1")
+    galaxy_fluxes(**parameters)
+    galaxy_fluxes(**parameters)
+    monkeypatch.setattr("nirwals.physics.spectrum.data_version", lambda: "v2")
+    galaxy_fluxes(**parameters)
+
+    assert _galaxy_j_band_grid.cache_info().misses == 2
+
+
+@pytest.mark.parametrize("redshift", [0.1, 0.5, 1.2])
+def test_galaxy_fluxes_match_redshifted_synphot_spectrum(redshift: float) -> None:
+    # The J band flux used for normalising is calculated by resampling the redshifted
+    # template on the rest frame template grid. The normalised spectrum should agree
+    # with that obtained by normalising the redshifted synphot spectrum of the
+    # template file; the integrated fluxes should agree to within 0.1 percent.
+    bank = galaxy_template_bank()
+    path = get_file_base_dir() / "galaxies" / "Old_Sb_type_emission.npz"
+    with open(path, "rb") as f:
+        template_wavelengths, template_fluxes = read_from_file(f, unit=units.FLAM)
+    spectrum = SourceSpectrum(
+        Empirical1D,
+        points=template_wavelengths,
+        lookup_table=template_fluxes,
+        z=redshift,
+        z_type="conserve_flux",
+    )
+    wavelengths = np.arange(9000, 17000, 2.5) * u.AA
+    expected = normalize(spectrum, 18)(wavelengths, flux_unit=units.PHOTLAM).value
+
+    fluxes = galaxy_fluxes(
+        indices=bank.index("Old", "Sb", True),
+        redshifts=redshift,
+        magnitudes=18,
+        wavelengths=wavelengths,
+    )
+
+    assert fluxes.sum() == pytest.approx(expected.sum(), rel=1e-3)
+
+
+def test_emission_lines_fluxes() -> None:
+    wavelengths = np.arange(9000, 15000, 0.5) * u.AA
+    lines = [
+        EmissionLine(
+            central_wavelength=10000 * u.AA,
+            fwhm=25 * u.AA,
+            redshift=0,
+            total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+        ),
+        EmissionLine(
+            central_wavelength=9000 * u.AA,
+            fwhm=10 * u.AA,
+            redshift=0.4,
+            total_flux=3e-16 * u.erg / (u.cm**2 * u.s),
+        ),
+    ]
+    fluxes = emission_lines_fluxes(lines, wavelengths)
+
+    assert fluxes.shape == (2, len(wavelengths))
+    for line, f in zip(lines, fluxes):
+        expected = _emission_line(
+            central_wavelength=line.central_wavelength,
+            fwhm=line.fwhm,
+            redshift=line.redshift,
+            total_flux=line.total_flux,
+        )(wavelengths, flux_unit=units.PHOTLAM).value
+        assert f == pytest.approx(expected, rel=1e-9, abs=1e-12 * expected.max())
+
+
+def test_composite_source_spectrum() -> None:
+    # The composite spectrum must agree with the synphot spectrum, also for many
+    # emission lines.
+    config = get_default_configuration()
+    rng = np.random.default_rng(42)
+    lines = [
+        EmissionLine(
+            central_wavelength=c * u.AA,
+            fwhm=f * u.AA,
+            redshift=z,
+            total_flux=t * u.erg / (u.cm**2 * u.s),
+        )
+        for c, f, z, t in zip(
+            rng.uniform(6000, 15000, 150),
+            rng.uniform(5, 50, 150),
+            rng.uniform(0, 0.5, 150),
+            rng.uniform(1e-17, 1e-15, 150),
+        )
+    ]
+    cast(Source, config.source).spectrum = [
+        Blackbody(magnitude=17, temperature=5000 * u.K),
+        Galaxy(
+            age="Young",
+            galaxy_type="Sa",
+            magnitude=18,
+            redshift=0.2,
+            with_emission_lines=True,
+        ),
+        *lines,
+    ]
+    wavelengths = np.arange(9000, 17000, 0.7) * u.AA
+
+    fluxes = composite_source_spectrum(config)(wavelengths)
+
+    expected = source_spectrum(config)(wavelengths, flux_unit=units.PHOTLAM).value
+    assert fluxes == pytest.approx(expected, rel=1e-4)
+
+
+def test_emission_lines_pixel_fluxes() -> None:
+    # The pixel fluxes must agree with integrating the sampled lines on a fine grid,
+    # and they must add up to the total flux, however narrow the lines are.
+    pixels = np.arange(11000, 13000, 4.0) * u.AA
+    lines = [
+        EmissionLine(
+            central_wavelength=c * u.AA,
+            fwhm=f * u.AA,
+            redshift=z,
+            total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+        )
+        for c, f, z in [(12000.7, 0.3, 0), (10000, 20, 0.2)]
+    ]
+    pixel_fluxes = emission_lines_pixel_fluxes(lines, pixels)
+
+    fine = np.arange(10998.0025, 12998, 0.005) * u.AA
+    integrated = emission_lines_fluxes(lines, fine).reshape(2, len(pixels), -1).sum(
+        axis=-1
+    ) * (0.005)
+    assert pixel_fluxes == pytest.approx(integrated, rel=1e-4, abs=1e-12)
+    for line, f in zip(lines, pixel_fluxes):
+        total = line.total_flux.to(FLUX).value * units.FLAM.to(
+            units.PHOTLAM, 1, u.spectral_density(line.central_wavelength)
+        )
+        assert np.sum(f) == pytest.approx(total, rel=1e-9)
+
+    # Lines with an array of redshifts
+    line = lines[1]
+    redshifted = emission_line_pixel_fluxes(
+        central_wavelength=line.central_wavelength,
+        fwhm=line.fwhm,
+        total_flux=line.total_flux,
+        redshifts=[0, 0.2],
+        wavelengths=pixels,
+    )
+    assert redshifted[1] == pytest.approx(pixel_fluxes[1], rel=1e-12)
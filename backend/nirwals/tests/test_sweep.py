@@ -0,0 +1,82 @@
+import dataclasses
+from typing import cast
+
+import numpy as np
+import pytest
+from astropy import units as u
+
+from nirwals.configuration import (
+    Configuration,
+    EmissionLine,
+    Exposure,
+    Galaxy,
+    SNR,
+    Source,
+    Spectrum,
+)
+from nirwals.physics.exposure import snr, source_electrons
+from nirwals.physics.sweep import redshift_sweep
+from nirwals.tests.utils import get_default_configuration
+
+
+def _configuration(redshift: float) -> Configuration:
+    configuration = get_default_configuration()
+    spectrum: list[Spectrum] = [
+        Galaxy(
+            age="Old",
+            galaxy_type="E",
+            magnitude=18,
+            redshift=redshift,
+            with_emission_lines=True,
+        ),
+        EmissionLine(
+            central_wavelength=10000 * u.AA,
+            fwhm=30 * u.AA,
+            redshift=redshift,
+            total_flux=1e-15 * u.erg / (u.cm**2 * u.s),
+        ),
+    ]
+    source = dataclasses.replace(cast(Source, configuration.source), spectrum=spectrum)
+    return dataclasses.replace(configuration, source=source)
+
+
+def test_redshift_sweep() -> None:
+    redshifts = [0, 0.1, 0.35]
+    sweep = redshift_sweep(_configuration(0), redshifts)
+
+    assert sweep.snr_values.shape == (3, len(sweep.wavelengths))
+    assert sweep.source_electrons.shape == (3, len(sweep.wavelengths))
+    for i, redshift in enumerate(redshifts):
+        configuration = _configuration(redshift)
+        wavelengths, snr_values = snr(configuration)
+        _, electrons = source_electrons(configuration)
+        assert sweep.wavelengths.to(u.AA).value == pytest.approx(
+            wavelengths.to(u.AA).value
+        )
+        # Allow for small differences due to the interpolation of the templates.
+        np.testing.assert_allclose(
+            sweep.snr_values[i].value,
+            snr_values.value,
+            atol=3e-3 * snr_values.value.max(),
+        )
+        np.testing.assert_allclose(
+            sweep.source_electrons[i].value,
+            electrons.value,
+            atol=3e-3 * electrons.value.max(),
+        )
+
+
+def test_redshift_sweep_rejects_multidimensional_redshifts() -> None:
+    with pytest.raises(ValueError, match="one-dimensional"):
+        redshift_sweep(_configuration(0), [[0, 0.1]])
+
+
+def test_redshift_sweep_requires_exposure_time() -> None:
+    configuration = _configuration(0)
+    exposure = dataclasses.replace(
+        cast(Exposure, configuration.exposure),
+        exposure_time=None,
+        snr=SNR(snr=10, wavelength=13000 * u.AA),
+    )
+    with pytest.raises(ValueError, match="exposure time"):
+        redshift_sweep(dataclasses.replace(configuration, exposure=exposure), [0])
@@ -4,9 +4,19 @@ from _pytest.monkeypatch import MonkeyPatch
 from astropy import units as u
 from synphot import units
 
-from nirwals.physics.utils import read_from_file, shift
+from nirwals.physics.utils import (
+    read_from_file,
+    shift,
+    binning_factor,
+    sum_bins,
+    sum_bins_at,
+)
 from nirwals.tests.utils import get_default_datafile
-from nirwals.utils import prepare_spectrum_plot_values, MAX_NUM_PLOT_POINTS
+from nirwals.utils import (
+    iter_json_lines,
+    prepare_spectrum_plot_values,
+    MAX_NUM_PLOT_POINTS,
+)
 
 
 def test_read_from_file() -> None:
@@ -41,6 +51,52 @@ def test_shift() -> None:
     assert np.array_equal(shift(a, -3), np.array([4, 5, 6, 7, 8, 9, 10, 0, 0, 0]))
 
 
+@pytest.mark.parametrize(
+    "resolution_element, pixel_width, expected",
+    [(13, 3, 5), (17, 3, 6), (15, 3, 5), (0.3, 0.1, 3), (0.5, 3, 1), (0, 3, 1)],
+)
+def test_binning_factor(
+    resolution_element: float, pixel_width: float, expected: int
+) -> None:
+    # The binning must agree with that found by incrementing it step by step.
+    binning = 1
+    while binning * pixel_width < resolution_element:
+        binning += 1
+    assert binning == expected
+
+    assert binning_factor(resolution_element, pixel_width) == expected
+
+
+def test_sum_bins() -> None:
+    a = np.arange(1, 11)
+    assert np.array_equal(sum_bins(a, 1), a)
+    assert np.array_equal(sum_bins(a, 2), np.array([3, 7, 11, 15, 19]))
+    assert np.array_equal(sum_bins(a, 3), np.array([6, 15, 24, 10]))
+    assert np.array_equal(sum_bins(a, 20), np.array([55]))
+
+    # Leading axes are preserved.
+    b = np.stack([a, 2 * a])
+    assert np.array_equal(sum_bins(b, 4), np.array([[10, 26, 19], [20, 52, 38]]))
+
+    with pytest.raises(ValueError, match="positive"):
+        sum_bins(a, 0)
+
+
+def test_sum_bins_at() -> None:
+    a = np.arange(1, 11)
+    assert np.array_equal(sum_bins_at(a, np.array([0, 1, 4, 9])), [1, 9, 35, 10])
+
+    b = np.stack([a, 2 * a])
+    assert np.array_equal(
+        sum_bins_at(b, np.array([0, 5])), np.array([[15, 40], [30, 80]])
+    )
+
+    with pytest.raises(ValueError, match="strictly increasing"):
+        sum_bins_at(a, np.array([0, 3, 3]))
+    with pytest.raises(ValueError, match="valid indices"):
+        sum_bins_at(a, np.array([0, 10]))
+
+
 def test_prepare_spectrum_plot_values_no_resampling(monkeypatch: MonkeyPatch) -> None:
     monkeypatch.setattr("nirwals.utils.get_minimum_wavelength", lambda: 10000 * u.AA)
     monkeypatch.setattr("nirwals.utils.get_maximum_wavelength", lambda: 14000 * u.AA)
@@ -73,3 +129,15 @@ def test_prepare_spectrum_plot_values_with_resampling(monkeypatch: MonkeyPatch)
     # Check that the points have the right distance from each other.
     assert pytest.approx(xs[1] - xs[0]) == (xs[-1] - xs[0]) / (max_num_points - 1)
     assert np.allclose(ys, expected_ys)
+
+
+def test_iter_json_lines() -> None:
+    lines = [b'{"a": 1}\n', b"\n", b'[2, "b"]\r\n', b"  \n", b"null"]
+    assert list(iter_json_lines(lines)) == [{"a": 1}, [2, "b"], None]
+
+
+def test_iter_json_lines_is_lazy() -> None:
+    values = iter_json_lines(['{"a": 1}\n', "\n", "invalid\n"])
+    assert next(values) == {"a": 1}
+    with pytest.raises(ValueError, match="line 3"):
+        next(values)
@@ -1,3 +1,6 @@
+import json
+from typing import Any, Iterable, Iterator
+
 import numpy as np
 from astropy import units as u
 
@@ -66,3 +69,31 @@ def prepare_spectrum_plot_values(
     else:
         # No resampling is necessary.
         return xs.tolist(), ys.tolist()
+
+
+def iter_json_lines(lines: Iterable[bytes | str]) -> Iterator[Any]:
+    """
+    Iterate over the values of newline-delimited JSON.
+
+    Every line which is not blank must contain one JSON value. The values are decoded
+    one at a time when they are requested, so that the whole input is never held in
+    memory as Python objects.
+
+    Parameters
+    ----------
+    lines: iterable of bytes or str
+        The lines, such as those of an open file.
+
+    Returns
+    -------
+    Iterator
+        The decoded values.
+    """
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON in line {number}: {e}") from e
+        yield value
@@ -1,24 +1,89 @@
+import functools
 import json
-from typing import cast
+import logging
+import math
+import sqlite3
+from typing import Any, Callable, Iterator, cast
 
 import numpy as np
 from astropy import units as u
-from django.http import JsonResponse, HttpRequest
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, HttpRequest, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from synphot import units
 
 from constants import get_minimum_wavelength, get_maximum_wavelength
-from nirwals.configuration import configuration, Exposure
+from nirwals.configuration import (
+    Configuration,
+    configuration,
+    spectrum,
+    Exposure,
+    Spectrum,
+)
+from nirwals.digest import CanonicalConfiguration, canonical_configuration
 from nirwals.physics.bandpass import throughput
-from nirwals.physics.exposure import source_electrons, snr, exposure_time
+from nirwals.physics.catalogue import catalogue_results, validate_target
+from nirwals.physics.exposure import magnitude_curve
+from nirwals.physics.optimisation import grating_angle_curve
+from nirwals.physics.pipeline import PipelinePlan, pipeline_plan
 from nirwals.physics.spectrum import source_spectrum, sky_spectrum
-from nirwals.utils import prepare_spectrum_plot_values
+from nirwals.physics.sweep import redshift_sweep
+from nirwals.response_cache import ResponseCache, response_key
+from nirwals.utils import iter_json_lines, prepare_spectrum_plot_values
+
+logger = logging.getLogger(__name__)
+
+
+@functools.cache
+def _response_cache() -> ResponseCache | None:
+    # The response cache shared by all worker processes, or None if it is disabled or
+    # the database can't be opened.
+    if not settings.RESPONSE_CACHE_PATH:
+        return None
+    try:
+        return ResponseCache(
+            settings.RESPONSE_CACHE_PATH,
+            ttl=settings.RESPONSE_CACHE_TTL,
+            max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+        )
+    except (OSError, sqlite3.Error):
+        logger.exception("The response cache is disabled.")
+        return None
+
+
+def _cached_response(
+    endpoint: str, digest: str, compute: Callable[[], dict[str, Any]]
+) -> HttpResponse:
+    # Returns the JSON response for an endpoint and a request digest, taking it from
+    # the response cache if possible. The X-Response-Cache header tells whether the
+    # response was cached.
+    def content() -> bytes:
+        return json.dumps(compute(), cls=DjangoJSONEncoder).encode("utf-8")
+
+    cache = _response_cache()
+    if cache is None:
+        value, is_hit = content(), False
+    else:
+        value, is_hit = cache.get_or_compute(response_key(endpoint, digest), content)
+    response = HttpResponse(value, content_type="application/json")
+    response["X-Response-Cache"] = "hit" if is_hit else "miss"
+    return response
 
 
 @csrf_exempt
-def throughput_view(request: HttpRequest) -> JsonResponse:
+def throughput_view(request: HttpRequest) -> HttpResponse:
     parameters = json.loads(request.POST.get("data", None))
     config = configuration(parameters)
+    return _cached_response(
+        "throughput",
+        canonical_configuration(config).digest(),
+        lambda: _throughput_data(config),
+    )
+
+
+def _throughput_data(config: Configuration) -> dict[str, Any]:
     throughput_spectrum = throughput(config)
     wavelengths = throughput_spectrum.waveset
     throughputs = throughput_spectrum(wavelengths)
@@ -29,13 +94,24 @@ def throughput_view(request: HttpRequest) -> JsonResponse:
         "wavelengths": plot_wavelengths,
         "throughputs": plot_throughputs,
     }
-    return JsonResponse(data)
+    return data
 
 
 @csrf_exempt
-def spectrum_view(request: HttpRequest) -> JsonResponse:
+def spectrum_view(request: HttpRequest) -> HttpResponse:
     parameters = json.loads(request.POST.get("data", None))
     config = configuration(parameters)
+
+    # The sky spectrum does not depend on the configuration, so that the response
+    # only depends on the inputs of the source stage.
+    return _cached_response(
+        "spectra",
+        canonical_configuration(config).digest("source"),
+        lambda: _spectrum_data(config),
+    )
+
+
+def _spectrum_data(config: Configuration) -> dict[str, Any]:
     source = source_spectrum(config)
     source_wavelengths = source.waveset
     if source_wavelengths is None:
@@ -62,14 +138,36 @@ def spectrum_view(request: HttpRequest) -> JsonResponse:
             "fluxes": plot_sky_fluxes,
         },
     }
-    return JsonResponse(data)
+    return data
 
 
 @csrf_exempt
-def exposure_view(request: HttpRequest) -> JsonResponse:
+def exposure_view(request: HttpRequest) -> HttpResponse:
     # Get plot data based on configuration options
     parameters = json.loads(request.POST.get("data", None))
     config = configuration(parameters)
+    canonical = canonical_configuration(config)
+
+    # Log which pipeline stages were taken from the cache or recomputed. No stages are
+    # run if the whole response is cached.
+    def compute() -> dict[str, Any]:
+        data, plan = _exposure_data(config, canonical)
+        stats = plan.stats()
+        logger.debug(
+            "Pipeline stages: hits %s, recomputed %s", stats.hits, stats.recomputed
+        )
+        return data
+
+    return _cached_response("exposure", canonical.digest(), compute)
+
+
+def _exposure_data(
+    config: Configuration, canonical: CanonicalConfiguration
+) -> tuple[dict[str, Any], PipelinePlan]:
+    # The plan makes sure that the source and sky observations are only carried out
+    # once. Its rates are taken from the memoised pipeline, so that only the stages
+    # affected by changed parameters are recomputed.
+    plan = pipeline_plan(config, canonical=canonical)
 
     # Is the SNR or the exposure time requested?
     exposure = cast(Exposure, config.exposure)
@@ -79,9 +177,9 @@ def exposure_view(request: HttpRequest) -> JsonResponse:
     # are requested, we also set the exposure time in the configuration to the one
     # needed for the requested SNR, as we need to have an exposure time defined for
     # getting the target electron counts.
-    data = {}
+    data: dict[str, Any] = {}
     if is_snr_requested:
-        snr_wavelengths, snr_values = snr(config)
+        snr_wavelengths, snr_values = plan.snr()
         plot_snr_wavelengths, plot_snr_values = prepare_spectrum_plot_values(
             snr_wavelengths, snr_values, u.dimensionless_unscaled
         )
@@ -90,7 +188,7 @@ def exposure_view(request: HttpRequest) -> JsonResponse:
             "snr_values": plot_snr_values,
         }
     else:
-        snr_values, exposure_times = exposure_time(config)
+        snr_values, exposure_times = plan.exposure_time()
         data["exposure_time"] = {
             "snr_values": snr_values.to(u.dimensionless_unscaled).value.tolist(),
             "exposure_times": exposure_times.to(u.s).value.tolist(),
@@ -98,7 +196,7 @@ def exposure_view(request: HttpRequest) -> JsonResponse:
         exposure.exposure_time = exposure_times[50]
 
     # Get the target electron counts.
-    electron_wavelengths, electron_counts = source_electrons(config)
+    electron_wavelengths, electron_counts = plan.source_electrons()
     plot_electron_wavelengths, plot_electron_counts = prepare_spectrum_plot_values(
         electron_wavelengths, electron_counts, u.photon
     )
@@ -107,4 +205,140 @@ def exposure_view(request: HttpRequest) -> JsonResponse:
         "counts": plot_electron_counts,
     }
 
+    return data, plan
+
+
+@csrf_exempt
+def grating_angle_view(request: HttpRequest) -> JsonResponse:
+    parameters = json.loads(request.POST.get("data", None))
+    config = configuration(parameters)
+    target_wavelength = request.POST.get("targetWavelength", None)
+    wavelength = (
+        float(target_wavelength) * u.AA if target_wavelength is not None else None
+    )
+    curve = grating_angle_curve(config, wavelength=wavelength)
+    data = {
+        "wavelength": curve.wavelength.to(u.AA).value,
+        "grating_angles": curve.grating_angles.to(u.deg).value.tolist(),
+        "best_grating_angle": curve.best_grating_angle.to(u.deg).value,
+    }
+    if curve.snr_values is not None:
+        data["snr_values"] = curve.snr_values.to(
+            u.dimensionless_unscaled
+        ).value.tolist()
+    if curve.exposure_times is not None:
+        data["exposure_times"] = curve.exposure_times.to(u.s).value.tolist()
     return JsonResponse(data)
+
+
+@csrf_exempt
+def magnitude_view(request: HttpRequest) -> JsonResponse:
+    parameters = json.loads(request.POST.get("data", None))
+    config = configuration(parameters)
+    snr = float(request.POST["snr"])
+    wavelength = float(request.POST["targetWavelength"]) * u.AA
+    curve = magnitude_curve(config, snr=snr, wavelength=wavelength)
+    data = {
+        "wavelength": curve.wavelength.to(u.AA).value,
+        "magnitudes": curve.magnitudes.tolist(),
+        "snr_values": curve.snr_values.to(u.dimensionless_unscaled).value.tolist(),
+        "snr": curve.snr,
+        "limiting_magnitude": curve.limiting_magnitude,
+    }
+    return JsonResponse(data)
+
+
+@csrf_exempt
+def redshift_sweep_view(request: HttpRequest) -> JsonResponse:
+    parameters = json.loads(request.POST.get("data", None))
+    config = configuration(parameters)
+    redshifts = json.loads(request.POST["redshifts"])
+    sweep = redshift_sweep(config, redshifts)
+    data = {
+        "redshifts": sweep.redshifts.tolist(),
+        "wavelengths": sweep.wavelengths.to(u.AA).value.tolist(),
+        "snr_values": sweep.snr_values.to(u.dimensionless_unscaled).value.tolist(),
+        "source_electrons": sweep.source_electrons.to(u.photon).value.tolist(),
+    }
+    return JsonResponse(data)
+
+
+@csrf_exempt
+def catalogue_view(request: HttpRequest) -> HttpResponse:
+    # The targets are uploaded as a file (form field "targets") with one JSON target
+    # per line. Django writes large uploads to a temporary file, and the targets are
+    # decoded one at a time as the catalogue is processed, so that the catalogue is
+    # never held in memory as a whole. The size of the request body is limited by
+    # the CATALOGUE_MAX_BYTES setting; the size of the uploaded file is checked as
+    # well, as chunked requests have no content length.
+    max_bytes = settings.CATALOGUE_MAX_BYTES
+    if int(request.META.get("CONTENT_LENGTH") or 0) > max_bytes:
+        return _catalogue_too_large(max_bytes)
+    upload = request.FILES["targets"]
+    if upload.size is None or upload.size > max_bytes:
+        return _catalogue_too_large(max_bytes)
+
+    parameters = json.loads(request.POST.get("data", None))
+    config = configuration(parameters)
+
+    # All targets are decoded and checked before the response is started, so that
+    # invalid targets result in an error response rather than a truncated stream.
+    # They are decoded again while the catalogue is processed.
+    try:
+        for _ in _catalogue_targets(upload):
+            pass
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    upload.seek(0)
+    results = catalogue_results(
+        config,
+        _catalogue_targets(upload),
+        wavelength=float(request.POST["targetWavelength"]) * u.AA,
+        snr=float(request.POST["snr"]),
+    )
+
+    # The results are streamed as JSON lines, so that they can be sent to the client
+    # while they are calculated. Non-finite values are sent as null. If the
+    # calculation fails after the response has been started, the last line contains
+    # an error message.
+    def lines() -> Iterator[str]:
+        try:
+            for result in results:
+                line = {
+                    "index": result.index,
+                    "snr": _finite_or_none(result.snr),
+                    "exposure_time": _finite_or_none(
+                        float(result.exposure_time.to(u.s).value)
+                    ),
+                    "saturated": result.saturated,
+                }
+                yield json.dumps(line, allow_nan=False) + "\n"
+        except Exception:
+            logger.exception("The catalogue could not be processed.")
+            yield json.dumps({"error": "The catalogue could not be processed."}) + "\n"
+
+    return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+
+def _catalogue_targets(upload: UploadedFile) -> Iterator[Spectrum]:
+    # Decodes and checks the targets of a catalogue file, with one target per line.
+    for number, data in enumerate(iter_json_lines(upload), start=1):
+        try:
+            target = spectrum(data)
+            validate_target(target)
+        except KeyError as e:
+            raise ValueError(f"Target {number} has no value for {e}.") from e
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid target {number}: {e}") from e
+        yield target
+
+
+def _finite_or_none(value: float) -> float | None:
+    return value if math.isfinite(value) else None
+
+
+def _catalogue_too_large(max_bytes: int) -> JsonResponse:
+    return JsonResponse(
+        {"error": f"The catalogue request must not exceed {max_bytes} bytes."},
+        status=413,
+    )
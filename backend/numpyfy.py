@@ -7,25 +7,79 @@
 # In more detail, each csv file is read in using AstroPy's ASCII reader. The first
 # column is assigned to a variable x, and the second column to a variable y. Any
 # further columns are ignored, and an error is raised if there are less than two
-# columns. The data is then exported with NumPy's savez function, using "x" and "y" as
-# the array names. The file is stored in the same directory as the original csv file,
-# and it has the same name. Existing files are overwritten.
+# columns. The x values must be finite and strictly increasing, and the y values must
+# be finite; otherwise an error is raised. The data is then exported with NumPy's savez
+# function, using "x" and "y" as the array names. The file is stored in the same
+# directory as the original csv file, and it has the same name. Existing files are
+# overwritten.
+#
+# The conversion is incremental. The SHA-256 hashes of all csv files and the files
+# exported from them are recorded in a manifest file (manifest.json) in the base
+# directory, and a csv file is only converted if its hash has changed or if the
+# exported file is missing or has been modified since it was created. The conversions
+# are run in parallel in a process pool.
+#
+# The manifest also includes a data version, which is derived from the hashes of all
+# exported files. It changes whenever any of the exported files changes, and it can
+# hence be used as part of cache keys. See the data_version function in the
+# nirwals.physics.data module.
 
+import hashlib
+import json
 import os
 import pathlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
 
 import numpy as np
 from astropy.io import ascii
 
+from nirwals.physics.data import MANIFEST_FILENAME, MANIFEST_VERSION
+
 
-def main():
+def main() -> None:
     base_dir = pathlib.Path(os.environ["FILE_BASE_DIR"])
-    csv_files = base_dir.glob("**/*.csv")
-    for csv_file in csv_files:
-        _export_to_npy(csv_file)
+    convert_all(base_dir)
+
+
+def convert_all(base_dir: pathlib.Path) -> dict[str, Any]:
+    # Find the csv files which need to be converted.
+    manifest = _read_manifest(base_dir)
+    files: dict[str, Any] = {}
+    outdated: list[tuple[str, pathlib.Path, str]] = []
+    for csv_file in sorted(base_dir.glob("**/*.csv")):
+        name = csv_file.relative_to(base_dir).as_posix()
+        source_hash = _sha256(csv_file)
+        entry = manifest["files"].get(name)
+        if entry is not None and not _is_outdated(base_dir, entry, source_hash):
+            files[name] = entry
+        else:
+            outdated.append((name, csv_file, source_hash))
+
+    # Convert the outdated files. The manifest is updated even if a conversion
+    # fails, so that successful conversions need not be repeated.
+    try:
+        with ProcessPoolExecutor() as executor:
+            output_files = executor.map(_export_to_npy, [o[1] for o in outdated])
+            for (name, _, source_hash), output_file in zip(outdated, output_files):
+                files[name] = {
+                    "source_sha256": source_hash,
+                    "output": output_file.relative_to(base_dir).as_posix(),
+                    "output_sha256": _sha256(output_file),
+                }
+    finally:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "data_version": _data_version(files),
+            "files": files,
+        }
+        _write_manifest(base_dir, manifest)
 
+    return manifest
 
-def _export_to_npy(csv_file: pathlib.Path) -> None:
+
+def _export_to_npy(csv_file: pathlib.Path) -> pathlib.Path:
     # Keep the user informed.
     print(f"Converting {csv_file}...")
 
@@ -47,6 +101,15 @@ def _export_to_npy(csv_file: pathlib.Path) -> None:
     x = np.array(data[data.colnames[0]])
     y = np.array(data[data.colnames[1]])
 
+    # Check the assumptions made by read_from_file in the nirwals.physics.utils
+    # module.
+    if not np.all(np.isfinite(x)) or not np.all(np.isfinite(y)):
+        raise ValueError(f"The data file contains non-finite values: {csv_file}")
+    if np.any(np.diff(x) <= 0):
+        raise ValueError(
+            f"The x values are not strictly increasing for data file: {csv_file}"
+        )
+
     # Get the directory and filename for the file with the exported NumpPy data.
     parent = csv_file.parent
     filename = csv_file.stem + ".npz"
@@ -55,6 +118,54 @@ def _export_to_npy(csv_file: pathlib.Path) -> None:
     export_path = parent / filename
     np.savez(export_path, x=x, y=y)
 
+    return export_path
+
+
+def _is_outdated(
+    base_dir: pathlib.Path, entry: dict[str, Any], source_hash: str
+) -> bool:
+    if entry["source_sha256"] != source_hash:
+        return True
+    output_file = base_dir / entry["output"]
+    if not output_file.exists():
+        return True
+    return bool(_sha256(output_file) != entry["output_sha256"])
+
+
+def _data_version(files: dict[str, Any]) -> str:
+    h = hashlib.sha256()
+    for name in sorted(files.keys()):
+        h.update(f"{files[name]['output']}:{files[name]['output_sha256']}\n".encode())
+    return h.hexdigest()
+
+
+def _read_manifest(base_dir: pathlib.Path) -> dict[str, Any]:
+    path = base_dir / MANIFEST_FILENAME
+    if not path.exists():
+        return {"files": {}}
+    with open(path, "r") as f:
+        manifest: dict[str, Any] = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"files": {}}
+    return manifest
+
+
+def _write_manifest(base_dir: pathlib.Path, manifest: dict[str, Any]) -> None:
+    with tempfile.NamedTemporaryFile(
+        "w", dir=base_dir, prefix=MANIFEST_FILENAME, delete=False
+    ) as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, base_dir / MANIFEST_FILENAME)
+
+
+def _sha256(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
 
 if __name__ == "__main__":
     main()